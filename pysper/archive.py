@@ -0,0 +1,346 @@
+# Copyright 2020 DataStax, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""reads diag tarballs and compressed rotated logs without extracting them.
+A file inside a tarball is addressed by joining the tarball path and the member name,
+for example diag.tar.gz/nodes/node1/logs/cassandra/system.log"""
+
+import os
+import io
+import gzip
+import queue
+import zlib
+import tarfile
+import zipfile
+import threading
+
+# file name endings of rotated logs that are compressed on their own
+COMPRESSED = (".gz", ".zip")
+
+# size of each read from the archive, decompression of the next chunk runs in a
+# reader thread while the current one is parsed
+READ_BUFFER = 1024 * 1024
+READ_AHEAD = 4
+
+# bytes at the start of a file checked for NUL bytes to tell binary files apart
+SNIFF = 8192
+# compressed bytes of a gzipped member decompressed to sniff it
+_SNIFF_COMPRESSED = 64 * 1024
+# members up to this size (configuration files, nodetool output) are kept in memory
+# when the tarball is listed, as long as all those kept fit in SMALL_TOTAL, so
+# reading them later does not decompress the tarball again
+SMALL_MEMBER = 128 * 1024
+SMALL_TOTAL = 8 * 1024 * 1024
+
+_tarballs = {}
+# tarball path -> (members, binary, small) of every tarball listed, so worker
+# processes can be handed them instead of listing the tarball again
+_listings = {}
+
+
+class _Tarball:
+    """an open tarball and its members, the file handle is shared by every open
+    member so reads take the lock. A compressed tarball cannot seek back without
+    decompressing it again from the start, so it is listed, the start of each member
+    sniffed and the small members kept in a single pass, and readers go through the
+    other members in tarball order (see position)"""
+
+    def __init__(self, path, listing=None):
+        self.path = path
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.tar = tarfile.open(path, "r:*")
+        if listing is None:
+            listing = _list(self.tar)
+        # member name -> TarInfo, member name -> True when its start has a NUL
+        # byte (None when that has to be checked by reading the member) and
+        # member name -> content of the small members
+        self.members, self.binary, self.small = listing
+
+    def open(self, name):
+        """binary stream of the member"""
+        name = os.path.normpath(name)
+        if name in self.small:
+            return io.BytesIO(self.small[name])
+        try:
+            member = self.members[name]
+        except KeyError:
+            raise FileNotFoundError("no member %s in %s" % (name, self.path)) from None
+        return io.BufferedReader(_Member(self, member), READ_BUFFER)
+
+
+def _list(tar):
+    """the members of the tarball, whether each is binary and the content of the
+    small ones, in one pass"""
+    members = {}
+    binary = {}
+    small = {}
+    kept = 0
+    for member in tar:
+        if not member.isfile():
+            continue
+        name = os.path.normpath(member.name)
+        members[name] = member
+        with tar.extractfile(member) as data:
+            if member.size <= SMALL_MEMBER and kept + member.size <= SMALL_TOTAL:
+                small[name] = data.read()
+                kept += member.size
+                data = io.BytesIO(small[name])
+            binary[name] = _sniff(data, name)
+    return members, binary, small
+
+
+def _sniff(data, name):
+    """true when the start of the member, decompressed, has a NUL byte or the
+    member cannot be decompressed, None for a zip that is only read from its end"""
+    if name.endswith(".zip"):
+        return None
+    if name.endswith(".gz"):
+        try:
+            head = zlib.decompressobj(zlib.MAX_WBITS | 16).decompress(
+                data.read(_SNIFF_COMPRESSED), SNIFF
+            )
+        except zlib.error:
+            return True
+        return b"\0" in head
+    return b"\0" in data.read(SNIFF)
+
+
+def is_tarball(path):
+    """true when path is a tarball on disk"""
+    if path in _tarballs:
+        return True
+    try:
+        return os.path.isfile(path) and tarfile.is_tarfile(path)
+    except OSError:
+        return False
+
+
+def _tarball(path):
+    # worker processes must not share the file offset of the parent's handle
+    if path not in _tarballs or _tarballs[path].pid != os.getpid():
+        tarball = _Tarball(path, _listings.get(path))
+        _listings[path] = (tarball.members, tarball.binary, tarball.small)
+        _tarballs[path] = tarball
+    return _tarballs[path]
+
+
+def listings():
+    """the listings of the tarballs opened so far, for restore in a worker process"""
+    return dict(_listings)
+
+
+def restore(tarball_listings):
+    """uses the listings made by another process instead of listing the tarballs"""
+    _listings.update(tarball_listings)
+
+
+def split_path(path):
+    """returns the tarball and member name when path points inside a tarball,
+    otherwise None, path"""
+    if os.path.exists(path):
+        return None, path
+    head = path
+    while True:
+        head, _ = os.path.split(head)
+        if not head or head == os.path.dirname(head):
+            return None, path
+        if os.path.isfile(head):
+            if is_tarball(head):
+                return head, os.path.relpath(path, head)
+            return None, path
+
+
+def is_archived(path):
+    """true when the file has to be decompressed or read from a tarball"""
+    return path.endswith(COMPRESSED) or split_path(path)[0] is not None
+
+
+def source(path):
+    """the file on disk holding path, which is the tarball for a member"""
+    tarball, _ = split_path(path)
+    return tarball or path
+
+
+def list_files(tarball):
+    """paths of the regular files in the tarball, in tarball order"""
+    return [os.path.join(tarball, name) for name in _tarball(tarball).members]
+
+
+def sniffed_binary(path):
+    """whether the file in a tarball was found to be binary when the tarball was
+    listed, None when it is not in a tarball or could not be told then"""
+    tarball, name = split_path(path)
+    if tarball is None:
+        return None
+    return _tarball(tarball).binary.get(os.path.normpath(name))
+
+
+def position(path):
+    """stable sort key that puts the files of a tarball in tarball order, where
+    reading them only ever seeks forward. Other files and the members kept in
+    memory keep their order before them"""
+    tarball, name = split_path(path)
+    if tarball is None:
+        return ("", 0)
+    name = os.path.normpath(name)
+    listed = _tarball(tarball)
+    if name in listed.small or name not in listed.members:
+        return ("", 0)
+    return (tarball, listed.members[name].offset)
+
+
+class _Member(io.RawIOBase):
+    """a tarball member, every read holds the tarball lock as the handle is shared"""
+
+    def __init__(self, tarball, member):
+        super().__init__()
+        self.tarball = tarball
+        with self.tarball.lock:
+            self.file_desc = self.tarball.tar.extractfile(member)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        with self.tarball.lock:
+            data = self.file_desc.read(len(buf))
+        buf[: len(data)] = data
+        return len(data)
+
+    def close(self):
+        self.file_desc.close()
+        super().close()
+
+
+class ReadAhead(io.RawIOBase):
+    """reads chunks from raw in a thread so decompression overlaps with parsing"""
+
+    def __init__(self, raw, chunk_size=READ_BUFFER, depth=READ_AHEAD):
+        super().__init__()
+        self.raw = raw
+        self.chunk_size = chunk_size
+        self.chunks = queue.Queue(maxsize=depth)
+        self.pending = b""
+        self.done = False
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._fill, daemon=True)
+        self.thread.start()
+
+    def _fill(self):
+        try:
+            while not self.stopped.is_set():
+                chunk = self.raw.read(self.chunk_size)
+                self._put(chunk)
+                if not chunk:
+                    return
+        except Exception as ex:
+            self._put(ex)
+
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        while not self.pending:
+            if self.done:
+                return 0
+            chunk = self.chunks.get()
+            if isinstance(chunk, Exception):
+                self.done = True
+                raise chunk
+            if not chunk:
+                self.done = True
+                return 0
+            self.pending = chunk
+        size = min(len(buf), len(self.pending))
+        buf[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            self.stopped.set()
+            self.thread.join()
+            self.raw.close()
+        super().close()
+
+
+class _Decompressed(io.RawIOBase):
+    """decompressed stream that also closes the compressed file it reads from"""
+
+    def __init__(self, stream, raw):
+        super().__init__()
+        self.stream = stream
+        self.raw = raw
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        return self.stream.readinto(buf)
+
+    def close(self):
+        if not self.closed:
+            self.stream.close()
+            self.raw.close()
+        super().close()
+
+
+def _decompress(raw, name):
+    """wraps raw in the decompressor matching the file name"""
+    if name.endswith(".gz"):
+        return _Decompressed(gzip.GzipFile(fileobj=raw, mode="rb"), raw)
+    if name.endswith(".zip"):
+        if not raw.seekable():
+            # the zip directory is at the end, a zip inside a tarball is read first
+            raw = io.BytesIO(raw.read())
+        archive = zipfile.ZipFile(raw)
+        names = [n for n in archive.namelist() if not n.endswith("/")]
+        if not names:
+            raise zipfile.BadZipFile("%s has no files" % name)
+        # rotated logs are zipped one per file
+        return _Decompressed(archive.open(names[0]), raw)
+    return raw
+
+
+def open_binary(path):
+    """buffered binary stream of the decompressed file"""
+    tarball, name = split_path(path)
+    if tarball:
+        raw = _tarball(tarball).open(name)
+    else:
+        raw = open(path, "rb")
+    try:
+        return _decompress(raw, path)
+    except Exception:
+        raw.close()
+        raise
+
+
+def open_read_ahead(path):
+    """buffered binary stream of the decompressed file, decompressed by a reader thread"""
+    return io.BufferedReader(ReadAhead(open_binary(path)), READ_BUFFER)
+
+
+def open_text(path, encoding):
+    """text stream of the decompressed file, decompressed by a reader thread"""
+    return io.TextIOWrapper(open_read_ahead(path), encoding=encoding)
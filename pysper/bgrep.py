@@ -1,30 +1,248 @@
-# Copyright 2020 DataStax, Inc
-#
-# Licensed under the Apache License, Version 2.0 (the "License");
-# you may not use this file except in compliance with the License.
-# You may obtain a copy of the License at
-#
-#    http://www.apache.org/licenses/LICENSE-2.0
-#
-# Unless required by applicable law or agreed to in writing, software
-# distributed under the License is distributed on an "AS IS" BASIS,
-# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
-# See the License for the specific language governing permissions and
-# limitations under the License.
-
 """bucketgrep module"""
 
 import re
 import os
+import random
+import datetime
+import functools
+from collections import namedtuple, OrderedDict
 from pysper.parser.rules import date
-from pysper import VERSION, diag
-from pysper.util import bucketize, textbar, extract_node_name
+from pysper import VERSION, checkpoint, diag, env, follow
+from pysper.util import EPOCH, Buckets, textbar, extract_node_name
 from pysper.dates import date_parse
 from pysper.core import OrderedDefaultDict
 
+Grepped = namedtuple("Grepped", "leading counts first last last_time samples")
+
+
+class Reservoir:
+    """keeps a uniform random sample of at most size of the items added"""
+
+    def __init__(self, size, rng=None):
+        self.size = size
+        self.items = []
+        self.seen = 0
+        self.rng = rng or random.Random()
+
+    def add(self, item):
+        """adds an item, replacing a random one when full"""
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+            return
+        slot = self.rng.randrange(self.seen)
+        if slot < self.size:
+            self.items[slot] = item
+
+    def merge(self, items, seen):
+        """merges the sample of another reservoir that saw seen items,
+        drawing from each sample in proportion to the items it stands for"""
+        mine = list(self.items)
+        theirs = list(items)
+        self.rng.shuffle(mine)
+        self.rng.shuffle(theirs)
+        my_seen = self.seen
+        their_seen = seen
+        merged = []
+        while len(merged) < self.size and (mine or theirs):
+            if not theirs or (
+                mine and self.rng.random() * (my_seen + their_seen) < my_seen
+            ):
+                merged.append(mine.pop())
+                my_seen -= 1
+            else:
+                merged.append(theirs.pop())
+                their_seen -= 1
+        self.items = merged
+        self.seen += seen
+
+
+def bucket_start(dt, interval, anchor):
+    """start of the interval second bucket dt falls in, buckets are counted from anchor"""
+    seconds = int((dt - anchor).total_seconds() // interval) * interval
+    return anchor + datetime.timedelta(seconds=seconds)
+
+
+# size of the blocks read when matching the raw bytes of the log
+RAW_BLOCK = 1024 * 1024
+
+
+def _last_log_time(block, begin, stop, valid_log_regex, parse_date):
+    """time of the last valid log line in block[begin:stop], None if there is none"""
+    while stop > begin:
+        line_start = max(block.rfind(b"\n", begin, stop - 1) + 1, begin)
+        found = valid_log_regex.match(block, line_start)
+        if found:
+            return parse_date(found.group("date").decode(env.FILE_ENCODING))
+        stop = line_start
+    return None
+
+
+def raw_lines(log, rawregex, valid_log_regex, parse_date):
+    """reads the log in large blocks of bytes and only decodes the lines rawregex
+    finds a match in. For the lines skipped in between the time of the last valid
+    log line is yielded instead, so the caller can keep track of the log time"""
+    rest = b""
+    while True:
+        block = log.read(RAW_BLOCK)
+        if block:
+            block = rest + block
+            cut = block.rfind(b"\n") + 1
+            block, rest = block[:cut], block[cut:]
+            if not block:
+                continue
+        elif rest:
+            # last line of the file without a line break
+            block, rest = rest, b""
+        else:
+            return
+        pos = 0
+        while pos < len(block):
+            found = rawregex.search(block, pos)
+            hit = found.start() if found else len(block)
+            line_start = max(block.rfind(b"\n", pos, hit) + 1, pos)
+            log_time = _last_log_time(
+                block, pos, line_start, valid_log_regex, parse_date
+            )
+            if log_time is not None:
+                yield log_time
+            if found is None:
+                break
+            line_end = block.find(b"\n", hit)
+            line_end = len(block) if line_end == -1 else line_end + 1
+            line = block[line_start:line_end].decode(env.FILE_ENCODING)
+            yield line.replace("\r\n", "\n")
+            pos = line_end
+
+
+def grep_log(
+    filepath,
+    timeregex,
+    strayregex,
+    valid_log_regex,
+    start=None,
+    end=None,
+    interval=None,
+    samples=0,
+    rawregex=None,
+):
+    """greps a single log, can run in a worker process. Returns the number of matches
+    for each log time, the stray matches found before any log time in the file,
+    the first and last time of a match and the time of the last valid log line.
+    With an interval the matches are counted per bucket of that many seconds,
+    counted from start or else the epoch. A sample of the matching lines
+    is kept when samples is set. With a bytes rawregex the log is read as bytes
+    and only the lines it matches are decoded and checked"""
+    offset = diag.range_start_offset(filepath, start, end)
+    if offset is None:
+        return Grepped([], OrderedDict(), None, None, None, ([], 0))
+    parse_date = date()
+    with diag.FileWithProgress(filepath, binary=rawregex is not None) as log:
+        if offset:
+            log.seek(offset)
+        lines = log
+        if rawregex is not None:
+            raw_valid_log_regex = re.compile(
+                valid_log_regex.pattern.encode(env.FILE_ENCODING)
+            )
+            lines = raw_lines(log, rawregex, raw_valid_log_regex, parse_date)
+        return grep_lines(
+            lines,
+            timeregex,
+            strayregex,
+            valid_log_regex,
+            start,
+            end,
+            interval,
+            samples,
+            parse_date,
+        )
+
+
+def grep_lines(
+    lines,
+    timeregex,
+    strayregex,
+    valid_log_regex,
+    start=None,
+    end=None,
+    interval=None,
+    samples=0,
+    parse_date=None,
+):
+    """greps log lines, lines can also hold the datetime of the last valid log line
+    of lines that were skipped. Returns the same result as grep_log"""
+    leading = []
+    counts = OrderedDict()
+    first = None
+    last = None
+    last_time = None
+    reservoir = Reservoir(samples)
+    anchor = start or EPOCH
+    if parse_date is None:
+        parse_date = date()
+    for line in lines:
+        if isinstance(line, datetime.datetime):
+            # time of the last valid log line of the lines raw_lines skipped
+            if end and line > end + diag.OVERLAP_SLACK:
+                break
+            last_time = line
+            continue
+        # as long as it's a valid log line we want the date,
+        # even if we don't care about the rest of the line so we can set
+        # the last date for any straregex lines that match
+        current_dt = valid_log_regex.match(line)
+        if current_dt:
+            dt = parse_date(current_dt.group("date"))
+            if end and dt > end + diag.OVERLAP_SLACK:
+                break
+            # if the log line is valite we want to set the last_time
+            last_time = dt
+        # we now can validate if our search term matches the log line
+        d = timeregex.match(line)
+        if d:
+            # normal case, well-formatted log line
+            if not in_range(dt, start, end):
+                continue
+            if first is None or dt < first:
+                first = dt
+            if last is None or dt > last:
+                last = dt
+            match_time = dt
+        else:
+            m = strayregex.match(line)
+            # check for a match in an unformatted line, like a traceback
+            if not m:
+                continue
+            if last_time is None:
+                leading.append(line)
+                continue
+            if not in_range(last_time, start, end):
+                continue
+            match_time = last_time
+        if interval:
+            match_time = bucket_start(match_time, interval, anchor)
+        if samples:
+            reservoir.add(line)
+        counts[match_time] = counts.get(match_time, 0) + 1
+    return Grepped(
+        leading, counts, first, last, last_time, (reservoir.items, reservoir.seen)
+    )
+
+
+def in_range(dt, start=None, end=None):
+    """true when dt is between start and end, either can be None"""
+    if start and dt < start:
+        return False
+    if end and dt > end:
+        return False
+    return True
+
 
 class BucketGrep:
-    """greps for custom regex and bucketizes results"""
+    """greps for custom regex and bucketizes results. Only the number of matches for
+    each log time is kept, when streaming the matches are counted straight into
+    interval buckets so memory does not grow with the number of matches"""
 
     strayre = r".*"
     basere = r" *(?P<level>[A-Z]*) *\[(?P<thread_name>[^\]]*?)[:_-]?(?P<thread_id>[0-9]*)\] (?P<date>.{10} .{12}) *.*"
@@ -38,15 +256,25 @@ class BucketGrep:
         end=None,
         ignorecase=True,
         report="summary",
+        interval=3600,
+        stream=False,
+        samples=0,
+        raw=False,
+        checkpoint=None,
     ):
         self.diag_dir = diag_dir
         self.files = files
+        # file the state is saved to, when it exists only new log lines are read
+        self.checkpoint = checkpoint
         self.start = None
         self.end = None
         self.start_time = None
         self.end_time = None
         self.last_time = None
         self.report = report
+        self.interval = interval
+        self.stream = stream
+        self.samples = Reservoir(samples)
         if start:
             self.start_time = date_parse(start)
         if end:
@@ -60,66 +288,154 @@ class BucketGrep:
             self.timeregex = re.compile(self.basere + regex + ".*")
             self.supplied_regex = regex
         self.valid_log_regex = re.compile(self.basere)
-        self.node_matches = OrderedDefaultDict()
-        self.matches = OrderedDefaultDict(list)
+        self.rawregex = None
+        if raw and "\n".encode(env.FILE_ENCODING) == b"\n":
+            # the regex is matched against the raw bytes of the logs
+            self.rawregex = re.compile(
+                regex.encode(env.FILE_ENCODING), re.IGNORECASE if ignorecase else 0
+            )
+        self.node_matches = OrderedDefaultDict(
+            functools.partial(OrderedDefaultDict, int)
+        )
+        self.matches = OrderedDefaultDict(int)
         self.count = 0
         self.unknown = 0
         self.analyzed = False
 
-    def analyze(self):
-        """parses logs for results"""
-        print("bucketgrep version %s" % VERSION)
-        print("search: '%s'" % self.supplied_regex)
-        target = None
+    def targets(self):
+        """logs to read"""
         if self.files:
-            target = self.files
-        elif self.diag_dir:
+            return self.files
+        if self.diag_dir:
             if self.diag_dir == ".":
                 directory_path = os.getcwd()
                 print("from directory '%s':" % directory_path)
             else:
                 print("from directory '%s':" % self.diag_dir)
-            target = diag.find_logs(self.diag_dir)
-        else:
-            raise Exception("no diag dir and no files specified")
-        for file in target:
-            with diag.FileWithProgress(file) as log:
-                node_name = extract_node_name(file, ignore_missing_nodes=True)
-                self.node_matches[node_name] = OrderedDefaultDict(list)
-                for line in log:
-                    # as long as it's a valid log line we want the date,
-                    # even if we don't care about the rest of the line so we can set
-                    # the last date for any straregex lines that match
-                    current_dt = self.valid_log_regex.match(line)
-                    if current_dt:
-                        dt = date()(current_dt.group("date"))
-                        # if the log line is valite we want to set the last_time
-                        self.last_time = dt
-                    # we now can validate if our search term matches the log line
-                    d = self.timeregex.match(line)
-                    if d:
-                        # normal case, well-formatted log line
-                        self.__setdates(dt)
-                        if self.start_time and dt < self.start_time:
-                            continue
-                        if self.end_time and dt > self.end_time:
-                            continue
-                        self.matches[dt].append(line)
-                        self.node_matches[node_name][dt].append(line)
-                        self.count += 1
-                    else:
-                        m = self.strayregex.match(line)
-                        # check for a match in an unformatted line, like a traceback
-                        if m:
-                            if self.last_time is None:
-                                # match, but no previous timestamp to associate with
-                                self.unknown += 1
-                                continue
-                            self.matches[self.last_time].append(line)
-                            self.node_matches[node_name][self.last_time].append(line)
-                            self.count += 1
+            return diag.find_logs(self.diag_dir)
+        raise Exception("no diag dir and no files specified")
+
+    def analyze(self):
+        """parses logs for results"""
+        print("bucketgrep version %s" % VERSION)
+        print("search: '%s'" % self.supplied_regex)
+        if self.checkpoint:
+            self.__resume()
+            return
+        target = self.targets()
+        grep = functools.partial(
+            grep_log,
+            timeregex=self.timeregex,
+            strayregex=self.strayregex,
+            valid_log_regex=self.valid_log_regex,
+            start=self.start_time,
+            end=self.end_time,
+            interval=self.interval if self.stream else None,
+            samples=self.samples.size,
+            rawregex=self.rawregex,
+        )
+        for file, grepped in zip(target, diag.map_files(grep, target)):
+            self.add_grepped(file, grepped)
+        self.analyzed = True
+
+    def __resume(self):
+        """greps the lines the checkpoint has not seen, matched as text"""
+        grep = functools.partial(
+            grep_lines,
+            timeregex=self.timeregex,
+            strayregex=self.strayregex,
+            valid_log_regex=self.valid_log_regex,
+            start=self.start_time,
+            end=self.end_time,
+            interval=self.interval if self.stream else None,
+            samples=self.samples.size,
+        )
+        checkpoint.resume(
+            self,
+            self.checkpoint,
+            (
+                "bgrep",
+                self.timeregex.pattern,
+                self.timeregex.flags,
+                self.start_time,
+                self.end_time,
+                self.interval if self.stream else None,
+                self.samples.size,
+            ),
+            (
+                "node_matches",
+                "matches",
+                "count",
+                "unknown",
+                "start",
+                "end",
+                "last_time",
+                "samples",
+            ),
+            lambda file, lines, notes: grep(lines),
+            self.add_grepped,
+        )
         self.analyzed = True
 
+    def add_grepped(self, file, grepped):
+        """adds the matches grepped from the file"""
+        node_name = extract_node_name(file, ignore_missing_nodes=True)
+        node_matches = self.node_matches[node_name]
+        # stray lines before the first log line of the file belong to the last
+        # time found in the previous file
+        for line in grepped.leading:
+            if self.last_time is None:
+                # match, but no previous timestamp to associate with
+                self.unknown += 1
+                continue
+            if not in_range(self.last_time, self.start_time, self.end_time):
+                continue
+            match_time = self.last_time
+            if self.stream:
+                match_time = bucket_start(
+                    match_time, self.interval, self.start_time or EPOCH
+                )
+            if self.samples.size:
+                self.samples.add(line)
+            self.matches[match_time] += 1
+            node_matches[match_time] += 1
+            self.count += 1
+        if grepped.first is not None:
+            self.__setdates(grepped.first)
+            self.__setdates(grepped.last)
+        for match_time, count in grepped.counts.items():
+            self.matches[match_time] += count
+            node_matches[match_time] += count
+            self.count += count
+        self.samples.merge(*grepped.samples)
+        if grepped.last_time is not None:
+            self.last_time = grepped.last_time
+
+    def follow(self, report, interval=follow.INTERVAL, ticks=None):
+        """reads what is appended to the logs, calling report every interval seconds.
+        The lines are matched as text even when raw was asked for"""
+        print("bucketgrep version %s" % VERSION)
+        print("search: '%s'" % self.supplied_regex)
+        self.analyzed = True
+        grep = functools.partial(
+            grep_lines,
+            timeregex=self.timeregex,
+            strayregex=self.strayregex,
+            valid_log_regex=self.valid_log_regex,
+            start=self.start_time,
+            end=self.end_time,
+            interval=self.interval if self.stream else None,
+            samples=self.samples.size,
+        )
+        follow.follow(
+            self.targets(),
+            lambda file, lines: grep(lines),
+            self.add_grepped,
+            report,
+            interval=interval,
+            ticks=ticks,
+        )
+
     def __setdates(self, dt):
         if not self.start:
             self.start = dt
@@ -130,12 +446,56 @@ class BucketGrep:
         if dt < self.start:
             self.start = dt
 
-    def print_report(self, interval=3600):
+    def buckets(self, counts, interval):
+        """sorted (bucket start, number of matches) for every bucket from the first
+        to the last match, including empty ones"""
+        if self.stream:
+            if interval != self.interval:
+                raise ValueError(
+                    "matches were streamed into %i second buckets" % self.interval
+                )
+            step = datetime.timedelta(seconds=interval)
+            anchor = self.start_time or EPOCH
+            # stray lines can be counted in the bucket of an earlier log line
+            # so the range covers both the matches and the counted buckets
+            keys = list(counts)
+            for dt in (self.start, self.end):
+                if dt is not None:
+                    keys.append(bucket_start(dt, interval, anchor))
+            bucket = min(keys)
+            last_bucket = max(keys)
+            buckets = []
+            while bucket <= last_bucket:
+                buckets.append((bucket, counts.get(bucket, 0)))
+                bucket += step
+            return buckets
+        buckets = Buckets(self.start, self.end, interval, reducer="sum")
+        for time, count in counts.items():
+            buckets.add(time, count)
+        return buckets.items()
+
+    def print_buckets(self, counts, interval):
+        """prints a bar for each bucket"""
+        buckets = self.buckets(counts, interval)
+        maxval = max(buckets, key=lambda t: t[1])[1]
+        for time, count in buckets:
+            pad = ""
+            for x in range(len(str(maxval)) - len(str(count))):
+                pad += " "
+            print(
+                time.strftime("%Y-%m-%d %H:%M:%S") + pad,
+                count,
+                textbar(maxval, count),
+            )
+
+    def print_report(self, interval=None):
         """print bucketized result counts"""
 
         print()
         if not self.analyzed:
             self.analyze()
+        if interval is None:
+            interval = self.interval
         if not self.matches:
             print("No matches found")
             if self.unknown:
@@ -145,22 +505,7 @@ class BucketGrep:
             print()
             print("cluster wide")
             print("------------")
-            buckets = sorted(
-                bucketize(
-                    self.matches, start=self.start, end=self.end, seconds=interval
-                ).items(),
-                key=lambda t: t[0],
-            )
-            maxval = len(max(buckets, key=lambda t: len(t[1]))[1])
-            for time, matches in buckets:
-                pad = ""
-                for x in range(len(str(maxval)) - len(str(len(matches)))):
-                    pad += " "
-                print(
-                    time.strftime("%Y-%m-%d %H:%M:%S") + pad,
-                    len(matches),
-                    textbar(maxval, len(matches)),
-                )
+            self.print_buckets(self.matches, interval)
         else:
             print()
             print()
@@ -173,24 +518,12 @@ class BucketGrep:
                 if not len(self.node_matches[node]):
                     print("No matches for %s found" % node)
                     continue
-                buckets = sorted(
-                    bucketize(
-                        self.node_matches[node],
-                        start=self.start,
-                        end=self.end,
-                        seconds=interval,
-                    ).items(),
-                    key=lambda t: t[0],
-                )
-                maxval = len(max(buckets, key=lambda t: len(t[1]))[1])
-                for time, matches in buckets:
-                    pad = ""
-                    for x in range(len(str(maxval)) - len(str(len(matches)))):
-                        pad += " "
-                    print(
-                        time.strftime("%Y-%m-%d %H:%M:%S") + pad,
-                        len(matches),
-                        textbar(maxval, len(matches)),
-                    )
+                self.print_buckets(self.node_matches[node], interval)
+        if self.samples.items:
+            print()
+            print("sample of %i matching lines" % len(self.samples.items))
+            print("---------------------------")
+            for line in self.samples.items:
+                print(line.rstrip("\n"))
         if self.unknown:
             print(self.unknown, "matches without timestamp")
@@ -0,0 +1,166 @@
+# Copyright 2020 DataStax, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""on disk cache of parsed log files so repeat runs against the same
+diag tarball do not have to parse the logs again"""
+
+import os
+import re
+import sys
+import glob
+import pickle
+import hashlib
+import functools
+from pysper import env, archive, VERSION
+
+_versions = {}
+
+
+def default_cache_dir():
+    """~/.cache/sperf or $XDG_CACHE_HOME/sperf"""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, "sperf")
+
+
+def rules_version(module_name):
+    """hash of the sperf version, the parser rules, the log readers in diag (which fill in
+    the dates of statuslogger rows) and the module doing the parsing.
+    Any change to the rules means the parsed results in the cache are no longer valid.
+    Falls back to the sperf version when the sources are not available (packaged binary)
+    """
+    if module_name in _versions:
+        return _versions[module_name]
+    digest = hashlib.sha1(VERSION.encode("utf-8"))
+    parser_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parser")
+    sources = sorted(glob.glob(os.path.join(parser_dir, "*.py")))
+    sources.append(os.path.join(os.path.dirname(parser_dir), "diag.py"))
+    module = sys.modules.get(module_name)
+    if module is not None and getattr(module, "__file__", None):
+        sources.append(module.__file__)
+    for source in sources:
+        try:
+            with open(source, "rb") as source_file:
+                digest.update(source_file.read())
+        except IOError:
+            continue
+    _versions[module_name] = digest.hexdigest()
+    return _versions[module_name]
+
+
+def _describe_arg(arg):
+    """functions are described by name as their repr includes the memory address,
+    regexes by their whole pattern and flags as their repr is cut short"""
+    if isinstance(arg, re.Pattern):
+        return "re.compile(%r, %i)" % (arg.pattern, arg.flags)
+    if callable(arg) and hasattr(arg, "__qualname__"):
+        return "%s.%s" % (arg.__module__, arg.__qualname__)
+    return repr(arg)
+
+
+def _describe(func):
+    """stable description of the parse function and any arguments bound to it"""
+    if isinstance(func, functools.partial):
+        name, module = _describe(func.func)
+        args = [_describe_arg(a) for a in func.args]
+        args.extend(
+            "%s=%s" % (k, _describe_arg(v)) for k, v in sorted(func.keywords.items())
+        )
+        return "%s(%s)" % (name, ", ".join(args)), module
+    return "%s.%s" % (func.__module__, func.__qualname__), func.__module__
+
+
+def cache_key(func, filepath):
+    """key made of the parse function, the file path, size and mtime and the rules version,
+    returns None if the file cannot be found. Files in a tarball use the tarball's size
+    and mtime"""
+    try:
+        stat = os.stat(archive.source(filepath))
+    except OSError:
+        return None
+    name, module = _describe(func)
+    return "\n".join(
+        [
+            name,
+            os.path.abspath(filepath),
+            str(stat.st_size),
+            str(stat.st_mtime_ns),
+            rules_version(module),
+            env.FILE_ENCODING,
+            str(env.IS_US_FMT),
+            str(env.PERMISSIVE_TIME),
+        ]
+    )
+
+
+def cached(func, filepath):
+    """returns func(filepath), using the cached result when the file has not changed
+    since it was stored. Any problem reading or writing the cache falls back to parsing
+    """
+    key = cache_key(func, filepath)
+    if key is None:
+        return func(filepath)
+    cache_dir = env.CACHE_DIR or default_cache_dir()
+    cache_file = os.path.join(
+        cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".pickle"
+    )
+    if not env.REBUILD_CACHE:
+        try:
+            with open(cache_file, "rb") as cache_desc:
+                stored_key, result = pickle.load(cache_desc)
+            if stored_key == key:
+                # the mtime marks when the entry was last used for eviction
+                os.utime(cache_file)
+                if env.DEBUG:
+                    print("loaded %s from cache %s" % (filepath, cache_file))
+                return result
+        except Exception as ex:
+            if env.DEBUG and not isinstance(ex, FileNotFoundError):
+                print("unable to read cache %s with %s" % (cache_file, ex))
+    result = func(filepath)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # write to a temp file first so readers never see a partial entry
+        tmp_file = "%s.%i.tmp" % (cache_file, os.getpid())
+        with open(tmp_file, "wb") as cache_desc:
+            pickle.dump((key, result), cache_desc, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+        evict(cache_dir, env.CACHE_SIZE)
+    except Exception as ex:
+        if env.DEBUG:
+            print("unable to write cache %s with %s" % (cache_file, ex))
+    return result
+
+
+def evict(cache_dir, max_bytes):
+    """removes the least recently used entries until the cache takes at most max_bytes"""
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if not entry.name.endswith(".pickle"):
+            continue
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
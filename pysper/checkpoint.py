@@ -0,0 +1,145 @@
+# Copyright 2020 DataStax, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""saves what an analyzer found together with how far it read each log, so a later
+run only parses the bytes appended since and the logs that are new"""
+
+import os
+import pickle
+import hashlib
+from pysper import VERSION, archive, env
+
+# bytes at the start of a log that identify it, also once it is rotated and compressed
+HEAD = 4096
+# changes when what is saved changes within a sperf version
+FORMAT = 3
+
+
+def _read(stream, size):
+    """reads size bytes, fewer only at the end of the stream"""
+    chunks = []
+    while size > 0:
+        chunk = stream.read(min(size, archive.READ_BUFFER))
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _digest(head):
+    return hashlib.sha1(head).hexdigest()
+
+
+def _lines(filepath, entry):
+    """decoded complete lines of the log from the offset in entry, which is moved
+    past every line handed out. A line still being written is left for the next run,
+    archived logs no longer grow so their last line is always read"""
+    if archive.is_archived(filepath):
+        final = True
+        stream = archive.open_read_ahead(filepath)
+        _read(stream, entry[2])
+    else:
+        final = False
+        stream = open(filepath, "rb")
+        stream.seek(entry[2])
+    with stream:
+        for raw in stream:
+            if not final and not raw.endswith(b"\n"):
+                return
+            entry[2] += len(raw)
+            yield raw.decode(env.FILE_ENCODING, errors="replace")
+
+
+class Checkpoint:
+    """the state of an analyzer and, for every log it read, a digest of the start of
+    the log, the offset of the first byte it has not read and the notes the analyzer
+    keeps on how far it got with the log. Logs are matched by the start of their
+    content, so a log renamed or compressed by rotation is still known"""
+
+    def __init__(self, path, settings):
+        self.path = path
+        self.settings = settings
+        self.state = None
+        # [length of the head, digest of the head, offset, notes] of each log
+        self.logs = []
+        self.read = []
+
+    def load(self):
+        """true when a checkpoint made with the same version and settings was loaded"""
+        try:
+            with open(self.path, "rb") as checkpoint_file:
+                version, settings, state, logs = pickle.load(checkpoint_file)
+        except FileNotFoundError:
+            return False
+        if version != (VERSION, FORMAT) or settings != self.settings:
+            print(
+                "checkpoint %s was saved by another version or with other settings, "
+                "reading every log again" % self.path
+            )
+            return False
+        self.state = state
+        self.logs = logs
+        return True
+
+    def offset(self, head):
+        """offset already read of the log starting with head and the notes kept on it"""
+        best = None
+        for length, digest, offset, notes in self.logs:
+            if length > len(head) or (best and length <= best[0]):
+                continue
+            if _digest(head[:length]) == digest:
+                best = (length, offset, notes)
+        return (best[1], best[2]) if best else (0, {})
+
+    def lines(self, filepath):
+        """the lines of the log not read yet and the notes on the log, reading the
+        lines records the new offset and the notes are saved as they are then"""
+        with archive.open_binary(filepath) as stream:
+            head = _read(stream, HEAD)
+        offset, notes = self.offset(head)
+        entry = [len(head), _digest(head), offset, notes]
+        self.read.append(entry)
+        return _lines(filepath, entry), notes
+
+    def save(self, state):
+        """writes the state and the offsets of the logs read in this run"""
+        tmp_file = "%s.%i.tmp" % (self.path, os.getpid())
+        with open(tmp_file, "wb") as checkpoint_file:
+            pickle.dump(
+                ((VERSION, FORMAT), self.settings, state, self.read),
+                checkpoint_file,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(tmp_file, self.path)
+
+
+def resume(analyzer, path, settings, state, parse, merge):
+    """restores the attributes named in state from the checkpoint at path, passes
+    the unread lines of each of the analyzer's targets to parse(filepath, lines, notes)
+    and the result to merge(filepath, parsed), then saves the checkpoint again.
+    notes is a dict kept with the log, for what parse needs to carry on from the
+    last line read. A checkpoint saved with other settings is ignored"""
+    checkpoint = Checkpoint(path, settings)
+    if checkpoint.load():
+        for name, value in checkpoint.state.items():
+            setattr(analyzer, name, value)
+    for filepath in analyzer.targets():
+        try:
+            lines, notes = checkpoint.lines(filepath)
+        except OSError as ex:
+            print("unable to read %s: %s" % (filepath, ex))
+            continue
+        merge(filepath, parse(filepath, lines, notes))
+    checkpoint.save({name: getattr(analyzer, name) for name in state})
@@ -14,6 +14,7 @@
 
 """bgrep command"""
 
+import functools
 from pysper.commands import flags
 from pysper.bgrep import BucketGrep
 
@@ -62,8 +63,29 @@ def add_flags(subparsers, run_func):
         default="summary",
         help="change report ('summary' whole cluster, 'perNode')",
     )
+    bgrep_parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="count matches straight into interval buckets counted from --start "
+        + "(or the epoch) so memory does not grow with the number of matches",
+    )
+    bgrep_parser.add_argument(
+        "--samples",
+        type=int,
+        default=0,
+        help="print a random sample of this many matching lines (default 0)",
+    )
+    bgrep_parser.add_argument(
+        "--bytes",
+        dest="raw",
+        action="store_true",
+        help="match the regex against the raw bytes of the logs read in large blocks, "
+        + "much faster when few lines match. Non-ASCII text is matched byte for byte",
+    )
     flags.add_diagdir(bgrep_parser)
     flags.add_files(bgrep_parser)
+    flags.add_follow(bgrep_parser)
+    flags.add_checkpoint(bgrep_parser)
     bgrep_parser.set_defaults(func=run_func)
 
 
@@ -85,5 +107,16 @@ def run(args):
         end=args.end,
         ignorecase=not args.case,
         report=args.report,
+        interval=args.interval,
+        stream=args.stream,
+        samples=args.samples,
+        raw=args.raw,
+        checkpoint=args.checkpoint,
     )
-    b.print_report(interval=args.interval)
+    if args.follow:
+        b.follow(
+            functools.partial(b.print_report, interval=args.interval),
+            interval=args.follow,
+        )
+    else:
+        b.print_report(interval=args.interval)
@@ -14,6 +14,7 @@
 
 """gc command"""
 
+import functools
 from pysper.commands import flags
 from pysper.core.gcinspector import GCInspector
 
@@ -71,6 +72,8 @@ def add_flags(subparsers, run_func):
     )
     flags.add_diagdir(gc_parser)
     flags.add_files(gc_parser)
+    flags.add_follow(gc_parser)
+    flags.add_checkpoint(gc_parser)
     gc_parser.set_defaults(func=run_func)
 
 
@@ -84,10 +87,25 @@ def run(args):
     files = None
     if args.files:
         files = args.files.split(",")
-    g = GCInspector(diag_dir=args.diag_dir, files=files, start=args.start, end=args.end)
+    g = GCInspector(
+        diag_dir=args.diag_dir,
+        files=files,
+        start=args.start,
+        end=args.end,
+        checkpoint=args.checkpoint,
+    )
     if args.reporter == "summary":
-        g.print_report(interval=args.interval, top=args.top_k)
+        report = functools.partial(
+            g.print_report, interval=args.interval, top=args.top_k
+        )
     elif args.reporter == "nodes":
-        g.print_report(interval=args.interval, by_node=True, top=args.top_k)
+        report = functools.partial(
+            g.print_report, interval=args.interval, by_node=True, top=args.top_k
+        )
     else:
         print("Invalid reporter %s: must be either summary or nodes" % args.reporter)
+        return
+    if args.follow:
+        g.follow(report, interval=args.follow)
+    else:
+        report()
@@ -43,7 +43,7 @@ def add_flags(subparsers, run_default_func, is_deprecated=True):
         nargs="?",
         const=3,
         default=3,
-        help="number of top queries to show (default 3)",
+        help="number of slowest query shapes to show (default 3)",
     )
     slowquery_parser.add_argument(
         "-st",
@@ -63,6 +63,7 @@ def add_flags(subparsers, run_default_func, is_deprecated=True):
         default=None,
         help="end date/time to stop parsing (format: YYYY-MM-DD hh:mm:ss,SSS)",
     )
+    flags.add_checkpoint(slowquery_parser)
     slowquery_parser.set_defaults(func=run_default_func)
 
 
@@ -82,6 +83,10 @@ def run_func(args, command_name):
     if args.files:
         files = args.files.split(",")
     sqa = SlowQueryAnalyzer(
-        diag_dir=args.diag_dir, files=files, start=args.start, end=args.end
+        diag_dir=args.diag_dir,
+        files=files,
+        start=args.start,
+        end=args.end,
+        checkpoint=args.checkpoint,
     )
     sqa.print_report(command_name, interval=args.interval, top=args.top)
@@ -37,6 +37,15 @@ def add_flags(subparsers, run_default_func, is_deprecated=False):
         default="summary",
         help="report to run, either summary or histogram (default summary)",
     )
+    statuslogger_parser.add_argument(
+        "-tl",
+        "--timeline",
+        type=int,
+        default=None,
+        metavar="INTERVAL",
+        help="instead of a report, show the max and p99 of each busy stage "
+        + "in INTERVAL second buckets (default off)",
+    )
     statuslogger_parser.add_argument(
         "-s",
         "--stages",
@@ -81,6 +90,8 @@ def add_flags(subparsers, run_default_func, is_deprecated=False):
         + '(default "system.log")',
     )
     flags.files_and_diag(statuslogger_parser)
+    flags.add_follow(statuslogger_parser)
+    flags.add_checkpoint(statuslogger_parser)
     statuslogger_parser.set_defaults(func=run_default_func)
 
 
@@ -102,27 +113,29 @@ def run_func(args, command_name):
         files = args.files.split(",")
     if args.stages != "all":
         wanted = tuple(filter(None, args.stages.split(",")))
-    if args.reporter == "histogram":
-        StatusLogger(
-            args.diag_dir,
-            files=files,
-            wanted_stages=wanted,
-            command_name=command_name,
-            start=args.start,
-            end=args.end,
-            syslog_prefix=args.system_log_prefix,
-        ).print_histogram()
+    status_logger = StatusLogger(
+        args.diag_dir,
+        files=files,
+        wanted_stages=wanted,
+        command_name=command_name,
+        start=args.start,
+        end=args.end,
+        syslog_prefix=args.system_log_prefix,
+        timeline=args.timeline,
+        checkpoint=args.checkpoint,
+    )
+    if args.timeline:
+        report = status_logger.print_timeline
+    elif args.reporter == "histogram":
+        report = status_logger.print_histogram
     elif args.reporter == "summary":
-        StatusLogger(
-            args.diag_dir,
-            files=files,
-            wanted_stages=wanted,
-            command_name=command_name,
-            start=args.start,
-            end=args.end,
-            syslog_prefix=args.system_log_prefix,
-        ).print_summary()
+        report = status_logger.print_summary
     else:
         print(
             "invalid reporter %s, must be either histogram or summary" % args.reporter
         )
+        return
+    if args.follow:
+        status_logger.follow(report, interval=args.follow)
+    else:
+        report()
@@ -27,7 +27,7 @@ def add_diagdir(parser):
         dest="diag_dir",
         default=".",
         help=" where the diag tarball directory is exported, "
-        + 'should be where the nodes folder is located (default ".")',
+        + 'should be where the nodes folder is located, or the diag tarball itself (default ".")',
     )
 
 
@@ -42,6 +42,32 @@ def add_files(parser):
     )
 
 
+def add_follow(parser):
+    """adds --follow for the commands that can report on live logs"""
+    parser.add_argument(
+        "-F",
+        "--follow",
+        type=int,
+        nargs="?",
+        const=10,
+        default=None,
+        metavar="SECONDS",
+        help="keep reading what is appended to the logs, following log rotation, "
+        + "and print the report again every SECONDS (default 10)",
+    )
+
+
+def add_checkpoint(parser):
+    """adds --checkpoint for the commands that can resume from a saved state"""
+    parser.add_argument(
+        "--checkpoint",
+        default=None,
+        metavar="FILE",
+        help="save what was found in FILE, when FILE exists only the lines added to "
+        + "the logs since it was saved and the new logs are read",
+    )
+
+
 def files_and_diag(parser):
     """addes --diag_dir and --files flags to a given parser"""
     add_files(parser)
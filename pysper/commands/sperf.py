@@ -15,7 +15,7 @@
 """main sperf parent command"""
 
 import argparse
-from pysper import env, VERSION
+from pysper import env, cache, diag, VERSION
 from pysper.commands import core, search, sysbottle, flags, ttop, sperf_default, version
 
 
@@ -63,6 +63,35 @@ def _build_sperf_cmd():
         help="allow partial timestamps for commandline arguments "
         + "(time format: YYYY-MM-DD [hh[:mm[:ss[,SSS]]]])",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of processes used to parse log files in parallel. "
+        + "Results are merged in file order so reports match a serial run (default 1)",
+    )
+    parser.add_argument(
+        "--cache",
+        dest="cache",
+        action="store_true",
+        help="store the parsed results of each log so later runs against the same logs "
+        + "skip parsing them. The cache is kept in %s" % cache.default_cache_dir(),
+    )
+    parser.add_argument(
+        "--cache-size",
+        dest="cache_size",
+        type=int,
+        default=env.CACHE_SIZE // (1024 * 1024),
+        help="megabytes the parsed log cache may use, the least recently used "
+        + "entries are removed past it (default %(default)s)",
+    )
+    parser.add_argument(
+        "--rebuild-cache",
+        dest="rebuild_cache",
+        action="store_true",
+        help="ignore the parsed log cache and store freshly parsed results, implies --cache",
+    )
     sperf_default.build(parser)
     return parser, parser.add_subparsers(title="Commands")
 
@@ -90,9 +119,15 @@ def run():
         env.IS_US_FMT = False
     if args.permissive_time:
         env.PERMISSIVE_TIME = True
+    if args.jobs > 1:
+        env.JOBS = args.jobs
+    env.CACHE = args.cache or args.rebuild_cache
+    env.REBUILD_CACHE = args.rebuild_cache
+    env.CACHE_SIZE = args.cache_size * 1024 * 1024
     if hasattr(args, "func"):
         try:
-            args.func(args)
+            with diag.cached_inventories():
+                args.func(args)
         except Exception as ex:
             if env.DEBUG:
                 raise ex
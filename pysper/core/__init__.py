@@ -53,8 +53,8 @@ class OrderedDefaultDict(OrderedDict):
         if self.default_factory is None:
             args = tuple()
         else:
-            args = (self.default_factory, None)
-        return type(self), args, None, None, self.items()
+            args = (self.default_factory,)
+        return type(self), args, None, None, iter(self.items())
 
     def copy(self):
         return self.__copy__()
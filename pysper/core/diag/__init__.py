@@ -64,7 +64,7 @@ def _group_uniq(node_configs):
     return unique_configs
 
 
-def parse_diag(args, transform=_group_uniq):
+def parse_diag(args, transform=_group_uniq, subscribers=None):
     """
     parses the following files to generate a report object:
     - all system.log (GC pause times)
@@ -72,13 +72,22 @@ def parse_diag(args, transform=_group_uniq):
     - all cfsats files (table stats)
     -- node_info.json (drive configuration)
     -- all blockdev_report (read ahead)
+
+    every system.log is parsed only once, any extra subscribers passed in
+    will receive the same system.log events as the gc and configuration collectors
     """
     # find output logs
     node_configs = node_env.initialize_node_configs(args.diag_dir)
     output_logs = diag.find_logs(args.diag_dir, args.output_log_prefix)
     # find system.logs
     system_logs = diag.find_logs(args.diag_dir, args.system_log_prefix)
-    warnings = node_env.find_config_in_logs(node_configs, output_logs, system_logs)
+    config_collector = node_env.read_output_logs(node_configs, output_logs, system_logs)
+    gc_collector = node_env.WorstGCCollector()
+    stream = diag.EventStream(subscribers=[config_collector, gc_collector])
+    for subscriber in subscribers or []:
+        stream.subscribe(subscriber)
+    warnings = stream.run(system_logs)
+    config_collector.apply()
     warn_missing(node_configs, output_logs, warnings, "missing output logs")
     warn_missing(node_configs, system_logs, warnings, "missing system logs")
     # find block dev
@@ -103,8 +112,7 @@ def parse_diag(args, transform=_group_uniq):
     else:
         warnings.append("unable to read '%s'" % args.node_info_prefix)
     transformed_configs = transform(node_configs)
-    for warn in node_env.add_gc_to_configs(transformed_configs, system_logs):
-        warnings.append(warn)
+    node_env.add_gc_to_configs(transformed_configs, gc_collector.worst_gc)
     # add cfstats if present
     cfstats_files = diag.find_logs(args.diag_dir, args.cfstats_prefix)
     warn_missing(node_configs, cfstats_files, warnings, "missing cfstats")
@@ -14,18 +14,17 @@
 
 """gets the node environment from the output log"""
 
-import os
 from collections import OrderedDict
 from pysper import diag, parser, util, env, humanize
+from pysper.parser import outputlog
 
 
 def initialize_node_configs(diag_dir):
     """generates a list of empty configuration for each node directory"""
     matches = OrderedDict()
     files = []
-    node_dir = os.path.join(diag_dir, "nodes")
     try:
-        files = os.listdir(node_dir)
+        files = diag.inventory(diag_dir).node_names()
     except Exception as ex:
         if env.DEBUG:
             print(ex)
@@ -35,24 +34,68 @@ def initialize_node_configs(diag_dir):
     return matches
 
 
+CONFIG_KEYS = [
+    "version",
+    "cassandra_version",
+    "spark_version",
+    "dse_spark_version",
+    "solr_version",
+    "spark_connector_version",
+    "cpu_cores",
+    "threads_per_core",
+    "logged_disk_access_mode",
+    "logged_index_access_mode",
+    "jvm_args",
+    "node_configuration",
+]
+
+
+# messages logged once a node has started, the configuration is logged before them
+STARTUP_COMPLETE = ("Starting listening for CQL clients", "DSE startup complete")
+
+# every startup logs one of these first
+STARTUP_BEGIN = ("node_configuration", "logged_disk_access_mode")
+
+
+def startup_complete(event):
+    """true for the messages logged once a node has started"""
+    message = event.get("message")
+    return bool(message) and message.startswith(STARTUP_COMPLETE)
+
+
+def _until_startup_complete(events):
+    """the events up to the end of the first startup"""
+    for event in events:
+        if startup_complete(event):
+            return
+        yield event
+
+
+def _last_startup(events):
+    """the configuration events of the most recent startup that completed, all of them
+    when no startup is seen completing. The events are sorted by date and the startup
+    complete messages are marked with a startup_complete key"""
+    start = 0
+    last = None
+    for i, event in enumerate(events):
+        if "startup_complete" not in event:
+            continue
+        if any(key in e for e in events[start:i] for key in STARTUP_BEGIN):
+            last = (start, i)
+            start = i + 1
+        elif last is not None:
+            # a second message from the same startup
+            last = (last[0], i)
+            start = i + 1
+    if last is None:
+        return events
+    return events[last[0] : last[1]]
+
+
 def _find_configuration_events(events):
     config = OrderedDict()
-    keys = [
-        "version",
-        "cassandra_version",
-        "spark_version",
-        "dse_spark_version",
-        "solr_version",
-        "spark_connector_version",
-        "cpu_cores",
-        "threads_per_core",
-        "logged_disk_access_mode",
-        "logged_index_access_mode",
-        "jvm_args",
-        "node_configuration",
-    ]
     for event in events:
-        for key in keys:
+        for key in CONFIG_KEYS:
             if key in event:
                 config[key] = event[key]
     cassandra_config = read_cassandra_config(
@@ -67,9 +110,74 @@ def _find_configuration_events(events):
     return config
 
 
-def find_config_in_logs(node_configs, output_logs, system_logs):
-    """read the output logs and extract the configuration from each file"""
-    warnings = []
+class SystemLogConfigCollector:
+    """event stream subscriber that finds the most recent configuration logged in the
+    system logs of nodes that have no readable output.log. The system log events are
+    run through the output.log message rules so we get the same fields the output.log
+    parser would have found. Only the configuration of the most recent startup that
+    completed is used"""
+
+    def __init__(self, node_configs, node_logs):
+        self.node_configs = node_configs
+        self.node_logs = node_logs
+        self.events = OrderedDict((node, []) for node in node_logs)
+        self.current_node = None
+        # node -> when the most recent startup seen completing began, older events of
+        # the node cannot be part of the last startup so they are not looked at
+        self.last_begin = OrderedDict()
+        # when the first startup not yet seen completing in the current file began
+        self.file_begin = None
+
+    def set_file(self, node, filepath):
+        """tracks the node the following events belong to"""
+        self.current_node = node
+        self.file_begin = None
+
+    def add(self, event):
+        """only keeps events that carry configuration and the end of each startup"""
+        if self.current_node not in self.events:
+            return
+        source_file = event.get("source_file")
+        if not source_file or not event.get("date"):
+            return
+        last_begin = self.last_begin.get(self.current_node)
+        if last_begin is not None and event["date"] < last_begin:
+            # the logs are usually read newest first, so once a startup completed
+            # the older logs of the node are only parsed for the other subscribers
+            return
+        if startup_complete(event):
+            if self.file_begin is not None:
+                self.last_begin[self.current_node] = self.file_begin
+                self.file_begin = None
+            self.events[self.current_node].append(
+                OrderedDict([("startup_complete", True), ("date", event["date"])])
+            )
+            return
+        subfields = outputlog.capture_message(source_file[:-5], event.get("message"))
+        if not subfields:
+            return
+        config_event = OrderedDict(
+            (key, value) for key, value in subfields.items() if key in CONFIG_KEYS
+        )
+        if config_event:
+            config_event["date"] = event["date"]
+            self.events[self.current_node].append(config_event)
+            if self.file_begin is None and any(
+                key in config_event for key in STARTUP_BEGIN
+            ):
+                self.file_begin = event["date"]
+
+    def apply(self):
+        """sets the configuration found on each node"""
+        for node, events in self.events.items():
+            # I only one the most recent logs in the system log to be used
+            events = sorted(events, key=lambda e: e["date"], reverse=False)
+            self.node_configs[node] = _find_configuration_events(_last_startup(events))
+
+
+def read_output_logs(node_configs, output_logs, system_logs):
+    """reads the configuration of each node from the output logs. Returns a
+    SystemLogConfigCollector for the nodes that need their system logs read instead"""
     node_logs = OrderedDict()
     for system_log in system_logs:
         node = util.extract_node_name(system_log)
@@ -87,57 +195,56 @@ def find_config_in_logs(node_configs, output_logs, system_logs):
             node_agg["output"] = ""
             node_logs[node] = node_agg
         node_logs[node]["output"] = output_log
+    missing_output = OrderedDict()
     for node, logs in node_logs.items():
         output_log = logs.get("output")
-        system_logs = logs.get("system")
-        events = []
         with diag.FileWithProgress(output_log) as output_log_file:
             if output_log_file.file_desc:
                 events = parser.read_output_log(output_log_file)
-                node_configs[node] = _find_configuration_events(events)
+                node_configs[node] = _find_configuration_events(
+                    _until_startup_complete(events)
+                )
                 continue
-            # try the system logs to find the last configuration found
-            for system_log in system_logs:
-                with diag.FileWithProgress(system_log) as system_log_file:
-                    if system_log_file.error:
-                        # skip files we can't read
-                        continue
-                    # yes I know this looks like I'm crazy but the output log parser is what I'm interested in
-                    events.extend(parser.read_output_log(system_log_file))
-            # I only one the most recent logs in the system log to be used
-            events = sorted(events, key=lambda e: e["date"], reverse=False)
-            node_configs[node] = _find_configuration_events(events)
-    return warnings
+        # try the system logs to find the last configuration found
+        missing_output[node] = logs.get("system")
+    return SystemLogConfigCollector(node_configs, missing_output)
 
 
-def add_gc_to_configs(configs, system_logs):
-    """read the system logs and extract the configuration from each file"""
-    results = OrderedDict()
-    warnings = []
-    for system_log in system_logs:
-        with diag.FileWithProgress(system_log) as system_log_file:
-            if system_log_file.error:
-                warnings.append(system_log_file.error)
-            events = parser.read_system_log(system_log_file)
-            worst_gc = 0
-            for event in events:
-                if (
-                    event.get("event_type") == "pause"
-                    and event.get("event_category") == "garbage_collection"
-                ):
-                    worst_gc = max(event.get("duration"), worst_gc)
-            node = util.extract_node_name(system_log)
-            results[node] = worst_gc
+class WorstGCCollector:
+    """event stream subscriber that tracks the worst gc pause of each node"""
+
+    def __init__(self):
+        self.worst_gc = OrderedDict()
+        self.current_node = None
+
+    def set_file(self, node, filepath):
+        """tracks the node the following events belong to"""
+        self.current_node = node
+        if node not in self.worst_gc:
+            self.worst_gc[node] = 0
+
+    def add(self, event):
+        """records the pause if it is the worst seen so far on the node"""
+        if (
+            event.get("event_type") == "pause"
+            and event.get("event_category") == "garbage_collection"
+        ):
+            self.worst_gc[self.current_node] = max(
+                event.get("duration"), self.worst_gc[self.current_node]
+            )
+
+
+def add_gc_to_configs(configs, worst_gc):
+    """adds the worst gc pause found by the WorstGCCollector to each configuration"""
     for config in configs:
         worst_gc_per_config = 0
         worst_node = ""
         for node in config.get("nodes_list", []):
-            node_worst_gc = results.get(node, 0)
+            node_worst_gc = worst_gc.get(node, 0)
             if node_worst_gc > worst_gc_per_config:
                 worst_gc_per_config = node_worst_gc
                 worst_node = node
         config["worst_gc"] = (worst_gc_per_config, worst_node)
-    return warnings
 
 
 def read_jvm_based_parameters(jvm_args):
@@ -15,15 +15,16 @@
 """pysper gc inspector module"""
 
 import heapq
-import itertools
 import datetime
+import functools
+from array import array
 from pysper import parser
 from pysper.parser import gc
-from pysper import VERSION, diag
+from pysper import VERSION, checkpoint, diag, follow, perc
 from pysper.core import OrderedDefaultDict
+from pysper.diag import map_files
 from pysper.util import (
     extract_node_name,
-    bucketize,
     get_percentiles,
     get_percentile_headers,
 )
@@ -31,13 +32,47 @@ from pysper.dates import date_parse
 from pysper.humanize import pad_table
 
 
+def parse_pauses(filepath, start=None, end=None):
+    """returns (date, duration, gc_type) for each pause in the log, can run in a worker process"""
+    pauses = []
+    offset = diag.range_start_offset(filepath, start, end)
+    if offset is None:
+        return pauses
+    with diag.FileWithProgress(filepath) as log:
+        if offset:
+            log.seek(offset)
+        return read_pauses(log, start, end)
+
+
+def read_pauses(lines, start=None, end=None):
+    """returns (date, duration, gc_type) for each pause in the lines"""
+    pauses = []
+    for event in parser.read_log(filter(gc.keep_line, lines), gc.capture_line):
+        if event["event_type"] == "pause":
+            if start and event["date"] < start:
+                continue
+            if end and event["date"] > end:
+                if event["date"] > end + diag.OVERLAP_SLACK:
+                    break
+                continue
+            pauses.append((event["date"], event["duration"], event["gc_type"]))
+    return pauses
+
+
 class GCInspector:
     """GCInspector class"""
 
-    def __init__(self, diag_dir=None, files=None, start=None, end=None):
+    def __init__(
+        self, diag_dir=None, files=None, start=None, end=None, checkpoint=None
+    ):
         self.diag_dir = diag_dir
         self.files = files
-        self.pauses = OrderedDefaultDict(lambda: OrderedDefaultDict(list))
+        # file the state is saved to, when it exists only new log lines are read
+        self.checkpoint = checkpoint
+        # node -> the duration and the epoch seconds of each pause in the order read,
+        # kept as machine numbers in parallel arrays
+        self.pauses = OrderedDefaultDict(functools.partial(array, "q"))
+        self.pause_times = OrderedDefaultDict(functools.partial(array, "d"))
         self.gc_types = OrderedDefaultDict(int)
         self.start = None
         self.end = None
@@ -51,29 +86,66 @@ class GCInspector:
         if end:
             self.end_time = date_parse(end)
 
+    def targets(self):
+        """logs to read"""
+        if self.files:
+            return self.files
+        if self.diag_dir:
+            return diag.find_logs(self.diag_dir)
+        raise Exception("no diag dir and no files specified")
+
     def analyze(self):
         """analyze files"""
-        target = None
-        if self.files:
-            target = self.files
-        elif self.diag_dir:
-            target = diag.find_logs(self.diag_dir)
-        else:
-            raise Exception("no diag dir and no files specified")
-        for file in target:
-            node = extract_node_name(file)
-            with diag.FileWithProgress(file) as log:
-                for event in parser.read_log(log, gc.capture_line):
-                    if event["event_type"] == "pause":
-                        if self.start_time and event["date"] < self.start_time:
-                            continue
-                        if self.end_time and event["date"] > self.end_time:
-                            continue
-                        self.__setdates(event["date"], node)
-                        self.pauses[node][event["date"]].append(event["duration"])
-                        self.gc_types[event["gc_type"]] += 1
+        if self.checkpoint:
+            checkpoint.resume(
+                self,
+                self.checkpoint,
+                ("gcinspector", self.start_time, self.end_time),
+                (
+                    "pauses",
+                    "pause_times",
+                    "gc_types",
+                    "start",
+                    "end",
+                    "starts",
+                    "ends",
+                ),
+                lambda file, lines, notes: read_pauses(
+                    lines, self.start_time, self.end_time
+                ),
+                self.add_pauses,
+            )
+            self.analyzed = True
+            return
+        target = self.targets()
+        parse = functools.partial(
+            parse_pauses, start=self.start_time, end=self.end_time
+        )
+        for file, pauses in zip(target, map_files(parse, target)):
+            self.add_pauses(file, pauses)
         self.analyzed = True
 
+    def add_pauses(self, file, pauses):
+        """adds the pauses parsed from the file"""
+        node = extract_node_name(file, ignore_missing_nodes=True)
+        for date, duration, gc_type in pauses:
+            self.__setdates(date, node)
+            self.pauses[node].append(duration)
+            self.pause_times[node].append(date.timestamp())
+            self.gc_types[gc_type] += 1
+
+    def follow(self, report, interval=follow.INTERVAL, ticks=None):
+        """reads what is appended to the logs, calling report every interval seconds"""
+        self.analyzed = True
+        follow.follow(
+            self.targets(),
+            lambda file, lines: read_pauses(lines, self.start_time, self.end_time),
+            self.add_pauses,
+            report,
+            interval=interval,
+            ticks=ticks,
+        )
+
     def __setdates(self, date, node):
         """track start/end times"""
         # global
@@ -94,13 +166,21 @@ class GCInspector:
         if date < self.starts[node]:
             self.starts[node] = date
 
+    def node_pauses(self, node):
+        """(date, duration) of each pause of the node in time order"""
+        times = self.pause_times[node]
+        durations = self.pauses[node]
+        for i in sorted(range(len(times)), key=times.__getitem__):
+            yield (
+                datetime.datetime.fromtimestamp(times[i], datetime.timezone.utc),
+                durations[i],
+            )
+
     def all_pauses(self):
-        """get pauses for all nodes"""
-        pauses = OrderedDefaultDict(list)
-        for pausedata in self.pauses.values():
-            for time, pause in pausedata.items():
-                pauses[time].extend(pause)
-        return pauses
+        """(date, duration) of the pauses of all nodes in time order"""
+        return heapq.merge(
+            *[self.node_pauses(node) for node in self.pauses], key=lambda p: p[0]
+        )
 
     def print_report(self, interval=3600, by_node=False, top=3):
         """print gc report"""
@@ -112,19 +192,10 @@ class GCInspector:
             print("No pauses found")
             return
         if not by_node:
-            pauses = self.all_pauses()
-            self.__print_gc(
-                sorted(
-                    bucketize(
-                        pauses, start=self.start, end=self.end, seconds=interval
-                    ).items(),
-                    key=lambda t: t[0],
-                )
+            self.__print_gc(self.all_pauses(), self.start, self.end, interval)
+            worst_k = heapq.nlargest(
+                top, (pause for pauses in self.pauses.values() for pause in pauses)
             )
-            plist = []
-            for time in pauses:
-                plist.extend(pauses[time])
-            worst_k = heapq.nlargest(top, plist)
             print("Worst pauses in ms:")
             print(worst_k)
 
@@ -132,20 +203,12 @@ class GCInspector:
             for node in self.pauses:
                 print(node)
                 self.__print_gc(
-                    sorted(
-                        bucketize(
-                            self.pauses[node],
-                            start=self.starts[node],
-                            end=self.ends[node],
-                            seconds=interval,
-                        ).items(),
-                        key=lambda t: t[0],
-                    )
+                    self.node_pauses(node),
+                    self.starts[node],
+                    self.ends[node],
+                    interval,
                 )
-                plist = []
-                for time, pauses in self.pauses[node].items():
-                    plist.extend(pauses)
-                worst_k = heapq.nlargest(top, plist)
+                worst_k = heapq.nlargest(top, self.pauses[node])
                 print("Worst pauses in ms:")
                 print(worst_k)
                 print("")
@@ -156,27 +219,44 @@ class GCInspector:
             print("* %s: %s" % (collection, count))
         print("")
 
-    def __print_gc(self, data):
-        """print data to the user, expecting datetime keys and list(int) values"""
+    def __print_gc(self, pauses, start, end, seconds):
+        """print a line for each bucket of seconds from start to end with a symbol for
+        each of its pauses, expecting (date, duration) pauses in time order"""
         print(". <300ms + 301-500ms ! >500ms")
         print("-" * 30)
+        last = max(int((end - start).total_seconds() // seconds), 0)
+        # bucket index -> [count, total, (symbol, count) runs]
+        buckets = {}
+        sketch = perc.Sketch()
+        for time, pause in pauses:
+            index = min(max(int((time - start).total_seconds() // seconds), 0), last)
+            bucket = buckets.get(index)
+            if bucket is None:
+                bucket = buckets[index] = [0, 0, []]
+            bucket[0] += 1
+            bucket[1] += pause
+            c = "."
+            if pause > 300:
+                c = "+"
+            if pause > 500:
+                c = "!"
+            runs = bucket[2]
+            if runs and runs[-1][0] == c:
+                runs[-1][1] += 1
+            else:
+                runs.append([c, 1])
+            sketch.add(pause)
         busiest = None
-        for time, pauses in data:
-            total = sum(pauses)
+        for index in range(last + 1):
+            time = start + datetime.timedelta(seconds=index * seconds)
+            count, total, runs = buckets.get(index, (0, 0, []))
             if not busiest:
                 busiest = (time, total)
             elif total > busiest[1]:
                 busiest = (time, total)
             print(time.strftime("%Y-%m-%d %H:%M:%S"), end=" ")
-            print(len(pauses), end=" ")
-            for pause in pauses:
-                c = "."
-                if pause > 300:
-                    c = "+"
-                if pause > 500:
-                    c = "!"
-                print(c, end="")
-            print("")
+            print(count, end=" ")
+            print("".join(c * run for c, run in runs))
         print("")
         print(
             "busiest period: %s (%sms)"
@@ -188,13 +268,7 @@ class GCInspector:
         header = [""]
         header.extend(["---" for i in range(6)])
         percentiles.append(header)
-        percentiles.append(
-            get_percentiles(
-                "ms",
-                list(itertools.chain.from_iterable(pauses for time, pauses in data)),
-                strformat="%i",
-            )
-        )
+        percentiles.append(get_percentiles("ms", sketch, strformat="%i"))
         pad_table(percentiles, min_width=11, extra_pad=2)
         for line in percentiles:
             print("".join(line))
@@ -15,14 +15,25 @@
 """analyzes debug.logs for slow queries"""
 
 import re
+import heapq
+import functools
 from collections import OrderedDict
-from pysper.diag import find_logs, FileWithProgress
+from pysper.diag import (
+    find_logs,
+    map_files,
+    range_start_offset,
+    FileWithProgress,
+    OVERLAP_SLACK,
+)
 from pysper.parser.rules import date
-from pysper.util import bucketize
+from pysper.util import bucketize, extract_node_name
 from pysper.dates import date_parse
-from pysper import VERSION, perc
+from pysper import VERSION, checkpoint, perc
 from pysper.core import OrderedDefaultDict
 
+# a timeline writes runs of the same symbol longer than this as the symbol and a count
+RUN_LENGTH = 100
+
 
 class SlowQueryParser:
     """parses logs for slow queries"""
@@ -52,47 +63,153 @@ class SlowQueryParser:
     )
 
     def parse(self, logfile):
-        """parses a debug log for slow queries"""
-        ret = OrderedDict()
+        """parses a debug log for slow queries. Only a line starting with < can be
+        a query and each query regex is only tried on lines holding its literal"""
+        block = OrderedDict()
+        parse_date = date()
+        query_matches = (
+            (", time ", self.slow_match, "slow"),
+            ("msec - timeout", self.fail_match, "fail"),
+            (", was slow ", self.slow_match_multiple, "slow"),
+            (", timed out ", self.fail_match_multiple, "fail"),
+            ("msec, timeout", self.timed_out_match, "timed_out"),
+        )
         for line in logfile:
-            m = self.begin_match.match(line)
-            time_match = self.begin_timed_out.match(line)
-            if m:
-                ret["numslow"] = int(m.group("numslow"))
-                ret["date"] = date()(m.group("date"))
-            elif time_match:
-                ret["numslow"] = int(time_match.group("numslow"))
-                ret["date"] = date()(time_match.group("date"))
-            else:
-                for match in [
-                    self.slow_match,
-                    self.fail_match,
-                    self.slow_match_multiple,
-                    self.fail_match_multiple,
-                    self.timed_out_match,
-                ]:
-                    m = match.match(line)
-                    if m:
-                        ret.update(m.groupdict())
-                        if match in [self.fail_match, self.fail_match_multiple]:
-                            ret["type"] = "fail"
-                        elif match == self.timed_out_match:
-                            ret["type"] = "timed_out"
-                        else:
-                            ret["type"] = "slow"
-                        yield ret
-                        break
+            if not line.startswith("<"):
+                if "operations were slow" in line:
+                    m = self.begin_match.match(line)
+                elif "operations timed out" in line:
+                    m = self.begin_timed_out.match(line)
+                else:
+                    continue
+                if m:
+                    block["numslow"] = int(m.group("numslow"))
+                    block["date"] = parse_date(m.group("date"))
+                continue
+            for literal, match, query_type in query_matches:
+                if literal not in line:
+                    continue
+                m = match.match(line)
+                if m:
+                    # a fresh dict so fields of a repeated query do not leak
+                    ret = OrderedDict(block)
+                    ret.update(m.groupdict())
+                    ret["type"] = query_type
+                    yield ret
+                    break
+
+
+def parse_queries(filepath, start=None, end=None):
+    """returns a copy of each slow query found in the log, can run in a worker process"""
+    offset = range_start_offset(filepath, start, end)
+    if offset is None:
+        return []
+    with FileWithProgress(filepath) as log:
+        if offset:
+            log.seek(offset)
+        return read_queries(log, start, end)
+
+
+def read_queries(lines, start=None, end=None):
+    """returns a copy of each slow query found in the lines"""
+    queries = []
+    for query in SlowQueryParser().parse(lines):
+        if "date" not in query:
+            # the lines start after the header of the block, it was read before
+            continue
+        if start and query["date"] < start:
+            continue
+        if end and query["date"] > end:
+            if query["date"] > end + OVERLAP_SLACK:
+                break
+            continue
+        queries.append(query)
+    return queries
+
+
+# quoted strings, uuids (which may start with a letter), blobs, booleans, and numbers
+# and token values (they start with a digit or a minus sign, which identifiers never do)
+LITERALS = re.compile(
+    r"'(?:[^']|'')*'"
+    r"|(?<![\w.])(?:"
+    r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}"
+    r"|0[xX][0-9a-fA-F]+"
+    r"|(?i:true|false)"
+    r"|-?\d[\w.]*(?:-[0-9a-fA-F]+)*"
+    r")(?![\w.])"
+)
+# lists of bind markers left over from IN clauses
+MARKER_LISTS = re.compile(r"\?(?:\s*,\s*\?)+")
+SPACES = re.compile(r"\s+")
+
+
+def fingerprint(query):
+    """the shape of the query, literals, token ranges and limits are replaced by ?"""
+    shape = LITERALS.sub("?", query)
+    shape = MARKER_LISTS.sub("?", shape)
+    return SPACES.sub(" ", shape).strip()
+
+
+class QueryShape:
+    """totals for every query with the same fingerprint"""
+
+    def __init__(self, shape):
+        self.shape = shape
+        self.count = 0
+        self.total = 0
+        self.max = -1
+        self.slowest = None
+        self.cross = 0
+        self.timeouts = 0
+        self.nodes = set()
+
+    def add(self, query, node):
+        """counts a parsed query, repeated queries count every repeat"""
+        time = int(query["time"])
+        weight = repeats(query)
+        self.count += weight
+        self.total += int(query.get("avg") or time) * weight
+        if time > self.max:
+            self.max = time
+            self.slowest = query["query"]
+        if query.get("cross") is not None:
+            self.cross += 1
+        if query.get("type") == "timed_out":
+            self.timeouts += weight
+        self.nodes.add(node)
+
+
+def repeats(query):
+    """how many times the query was reported, a repeated query is logged once"""
+    if "count" in query:
+        return int(query["count"])
+    if "avg" in query:
+        return int(query["numslow"])
+    return 1
+
+
+def timeline(runs):
+    """writes (symbol, count) runs, long runs are written as the symbol and the count"""
+    return "".join(
+        c * count if count <= RUN_LENGTH else "%s(%i)" % (c, count) for c, count in runs
+    )
 
 
 class SlowQueryAnalyzer:
     """analyzes results from parsing slow queries"""
 
-    def __init__(self, diag_dir, files=None, start=None, end=None):
+    def __init__(self, diag_dir, files=None, start=None, end=None, checkpoint=None):
         self.diag_dir = diag_dir
         self.files = files
+        # file the state is saved to, when it exists only new log lines are read
+        self.checkpoint = checkpoint
         self.parser = SlowQueryParser()
+        # date -> (time, weight) pairs, a line reporting repeats is stored once
         self.querytimes = OrderedDefaultDict(list)
-        self.queries = []
+        self.timings = perc.Sketch()
+        # fingerprint -> QueryShape, only distinct query shapes are kept
+        self.shapes = OrderedDict()
+        self.total = 0
         self.analyzed = False
         self.start = None
         self.end = None
@@ -105,38 +222,68 @@ class SlowQueryAnalyzer:
         if end:
             self.end_time = date_parse(end)
 
+    def targets(self):
+        """logs to read"""
+        if self.files:
+            return self.files
+        return find_logs(self.diag_dir, "debug.log")
+
     def analyze(self):
         """analyze slow queries"""
-        parser = SlowQueryParser()
-        target = find_logs(self.diag_dir, "debug.log")
-        if self.files:
-            target = self.files
-        for f in target:
-            with FileWithProgress(f) as log:
-                for query in parser.parse(log):
-                    if self.start_time and query["date"] < self.start_time:
-                        continue
-                    if self.end_time and query["date"] > self.end_time:
-                        continue
-                    if not self.start:
-                        self.start = query["date"]
-                        self.end = query["date"]
-                    if query["date"] > self.end:
-                        self.end = query["date"]
-                    if query["date"] < self.start:
-                        self.start = query["date"]
-                    if "avg" in query:
-                        for x in range(query["numslow"]):
-                            self.querytimes[query["date"]].append(int(query["time"]))
-                    else:
-                        self.querytimes[query["date"]].append(int(query["time"]))
-                    self.queries.append((query["query"], int(query["time"])))
-                    if "type" in query and query["type"] == "timed_out":
-                        self.timedout += 1 * int(query["numslow"])
-                    if query["cross"] is not None:
-                        self.cross += 1
+        if self.checkpoint:
+            checkpoint.resume(
+                self,
+                self.checkpoint,
+                ("slowquery", self.start_time, self.end_time),
+                (
+                    "querytimes",
+                    "timings",
+                    "shapes",
+                    "total",
+                    "start",
+                    "end",
+                    "cross",
+                    "timedout",
+                ),
+                lambda filepath, lines, notes: read_queries(
+                    lines, self.start_time, self.end_time
+                ),
+                self.add_queries,
+            )
+            self.analyzed = True
+            return
+        target = self.targets()
+        parse = functools.partial(
+            parse_queries, start=self.start_time, end=self.end_time
+        )
+        for filepath, queries in zip(target, map_files(parse, target)):
+            self.add_queries(filepath, queries)
         self.analyzed = True
 
+    def add_queries(self, filepath, queries):
+        """adds the queries parsed from the log"""
+        node = extract_node_name(filepath, ignore_missing_nodes=True)
+        for query in queries:
+            if not self.start:
+                self.start = query["date"]
+                self.end = query["date"]
+            if query["date"] > self.end:
+                self.end = query["date"]
+            if query["date"] < self.start:
+                self.start = query["date"]
+            weight = repeats(query)
+            self.querytimes[query["date"]].append((int(query["time"]), weight))
+            self.timings.add(int(query["time"]))
+            self.total += 1
+            shape = fingerprint(query["query"])
+            if shape not in self.shapes:
+                self.shapes[shape] = QueryShape(shape)
+            self.shapes[shape].add(query, node)
+            if "type" in query and query["type"] == "timed_out":
+                self.timedout += weight
+            if query.get("cross") is not None:
+                self.cross += 1
+
     def print_report(self, command_name, interval=3600, top=3):
         """print the report"""
         if not self.analyzed:
@@ -148,7 +295,7 @@ class SlowQueryAnalyzer:
         )
         print("")
 
-        if not self.queries:
+        if not self.total:
             if self.files:
                 print("no queries found the files provided")
                 for file_name in self.files:
@@ -167,36 +314,47 @@ class SlowQueryAnalyzer:
         print("slow query breakdown")
         print("--------------------")
         print(
-            len(self.queries),
+            self.total,
             "total, %s cross-node, %s timeouts" % (self.cross, self.timedout),
         )
         print()
         print("Top %s slow queries:" % top)
         print("-" * 30)
-        for query, time in sorted(
-            self.queries, key=lambda t: (t[1], t[0]), reverse=True
-        )[0:top]:
-            print("%sms: %s" % (time, query))
+        for query in heapq.nlargest(
+            top, self.shapes.values(), key=lambda q: (q.max, q.shape)
+        ):
+            print("%sms: %s" % (query.max, query.shape))
+            print(
+                "%s times, avg %sms, %s cross-node, %s timeouts, nodes: %s"
+                % (
+                    query.count,
+                    query.total // query.count,
+                    query.cross,
+                    query.timeouts,
+                    ", ".join(sorted(query.nodes)),
+                )
+            )
+            print("slowest: %s" % query.slowest)
             print("")
 
     def __print_query_times(self, data):
-        """print data to the user, expecting datetime keys and list(int) values"""
-        timings = perc.Stats([q[1] for q in self.queries])
-        window = timings.percentile(25) - 1
-        window2 = timings.percentile(50) - 1
-        window3 = timings.percentile(75) - 1
-        window4 = timings.percentile(99) - 1
+        """print data to the user, expecting datetime keys and lists of (time, weight)"""
+        timings = self.timings
+        window = int(timings.percentile(25)) - 1
+        window2 = int(timings.percentile(50)) - 1
+        window3 = int(timings.percentile(75)) - 1
+        window4 = int(timings.percentile(99)) - 1
         print(". <%sms + >%sms ! >%sms X >%sms" % (window, window2, window3, window4))
         print("-" * 30)
         worst = None
         for time, qtimes in data:
-            total = sum(qtimes)
+            total = sum(qtime * weight for qtime, weight in qtimes)
             if not worst:
                 worst = (time, total)
             elif total > worst[1]:
                 worst = (time, total)
-            print(time, " ", end="")
-            for qtime in qtimes:
+            runs = []
+            for qtime, weight in qtimes:
                 c = "."
                 if qtime > window2:
                     c = "+"
@@ -204,8 +362,12 @@ class SlowQueryAnalyzer:
                     c = "!"
                 if qtime > window4:
                     c = "X"
-                print(c, end="")
-            print("")
+                if runs and runs[-1][0] == c:
+                    runs[-1][1] += weight
+                else:
+                    runs.append([c, weight])
+            print(time, " ", end="")
+            print(timeline(runs))
         print("")
         print("worst period: %s (%sms)" % worst)
         print("")
@@ -14,17 +14,35 @@
 """pysper statuslogger module"""
 
 import re
+import functools
+from array import array
+from datetime import datetime, timezone
 from collections import OrderedDict
 from pysper import VERSION
 from pysper import env
+from pysper import archive
 from pysper import parser
+from pysper import follow
+from pysper import checkpoint
+from pysper import perc
 from pysper.diag import (
     find_logs,
+    map_files,
     UniqEventPerNodeFilter,
     UnknownStatusLoggerWriter,
     FileWithProgress,
+    event_digest,
+    event_fingerprint,
+    range_start_offset,
+    OVERLAP_SLACK,
+)
+from pysper.util import (
+    EPOCH,
+    Buckets,
+    get_percentiles,
+    get_percentile_headers,
+    extract_node_name,
 )
-from pysper.util import get_percentiles, get_percentile_headers, extract_node_name
 from pysper.humanize import format_seconds, format_bytes, format_num, pad_table
 from pysper.recs import Engine, Stage
 from pysper.dates import date_parse
@@ -49,8 +67,17 @@ class Node:
         self.start = None
         self.end = None
         self.tables = OrderedDefaultDict(Table)
-        self.stages = OrderedDefaultDict(lambda: OrderedDefaultDict(list))
-        self.pauses = []
+        # status -> pool -> samples, kept as machine ints with the epoch seconds
+        # each was logged at in a parallel array, partials so a checkpoint can pickle them
+        self.stages = OrderedDefaultDict(
+            functools.partial(OrderedDefaultDict, functools.partial(array, "q"))
+        )
+        self.stage_times = OrderedDefaultDict(
+            functools.partial(OrderedDefaultDict, functools.partial(array, "d"))
+        )
+        # status -> pool -> Buckets of sketches, only filled for a timeline report
+        self.timeline = OrderedDefaultDict(OrderedDict)
+        self.pauses = perc.Sketch()
         self.version = None
         self.lines = 0
         self.skipped_lines = 0
@@ -65,6 +92,22 @@ class Node:
             reverse=True,
         )
 
+    def add_stage(self, status, tpname, value, date):
+        """records a sample of the thread pool"""
+        self.stages[status][tpname].append(value)
+        self.stage_times[status][tpname].append(
+            date.timestamp() if date else float("nan")
+        )
+
+    def stage_samples(self, status, tpname):
+        """(date, value) of each sample of the thread pool in the order logged"""
+        values = self.stages.get(status, {}).get(tpname, ())
+        times = self.stage_times.get(status, {}).get(tpname, ())
+        return [
+            (datetime.fromtimestamp(t, timezone.utc) if t == t else None, v)
+            for t, v in zip(times, values)
+        ]
+
     def longest_tp_name_length(self):
         """find the length of the thread pool with the longest name"""
         longest = 0
@@ -79,7 +122,7 @@ class Node:
         longest = 0
         for stage in self.stages.values():
             for vals in stage.values():
-                vlen = len(max(map(str, vals), key=len))
+                vlen = max(len(str(max(vals))), len(str(min(vals))))
                 if vlen > longest:
                     longest = vlen
         return longest
@@ -133,9 +176,7 @@ class Summary:
         for name, node in self.nodes.items():
             for status, stage in node.stages.items():
                 for tp, vals in stage.items():
-                    allstages.append(
-                        [name, status, tp, next(iter(sorted(vals, reverse=True)))]
-                    )
+                    allstages.append([name, status, tp, max(vals)])
         return sorted(allstages, key=lambda x: x[3], reverse=True)
 
     def get_stages_in(self, status):
@@ -149,10 +190,133 @@ class Summary:
 
     def get_pauses(self):
         """get all gc pauses"""
-        pauses = []
+        pauses = perc.Sketch()
         for node in self.nodes.values():
-            pauses += node.pauses
-        return sorted(pauses, reverse=True)
+            pauses.merge(node.pauses)
+        return pauses
+
+
+# the only events the report reads and the fields it reads from them
+REPORTED_EVENTS = frozenset(
+    [
+        "server_version",
+        "memtable_status",
+        "pause",
+        "threadpool_header",
+        "threadpool_status",
+    ]
+)
+REPORTED_FIELDS = (
+    "event_type",
+    "date",
+    "version",
+    "cassandra_version",
+    "keyspace",
+    "table",
+    "ops",
+    "data",
+    "duration",
+    "pool_name",
+    "delayed",
+    "active",
+    "pending",
+    "blocked",
+    "all_time_blocked",
+)
+
+
+class ParsedLog:
+    """the events of a log with a known type as (id, date, rule type, event) records
+    for the StatusLogger to merge, the ids are used to drop the events already read
+    from another log of the node. The number of unknown events and the first and last
+    dates are complete once the records are read"""
+
+    def __init__(self):
+        self.unknown = 0
+        self.first = None
+        self.last = None
+        self.records = []
+
+
+def _reduce(event):
+    """record of an event kept after its log is parsed, with a digest that stays the
+    same once stored and only the fields of the events the report reads"""
+    fields = None
+    if event["event_type"] in REPORTED_EVENTS:
+        fields = {key: event[key] for key in REPORTED_FIELDS if key in event}
+    return event_digest(event), event.get("date"), event.get("rule_type"), fields
+
+
+def parse_log(filepath, start=None, end=None, stream=False):
+    """parses a single log into the partial result the StatusLogger merges,
+    can run in a worker process. Only events with a known type are kept, those are
+    the only ones that can be duplicated in other files from the same node.
+    With stream the log is read as the records are merged instead of here"""
+    parsed = ParsedLog()
+    offset = range_start_offset(filepath, start, end)
+    if offset is not None:
+        parsed.records = _read_log(filepath, offset, parsed, start, end, stream)
+        if not stream:
+            parsed.records = list(parsed.records)
+    return parsed
+
+
+def _read_log(filepath, offset, parsed, start, end, stream):
+    with FileWithProgress(filepath) as log:
+        if env.DEBUG:
+            print("parsing", filepath)
+        if offset:
+            log.seek(offset)
+        yield from read_records(log, parsed, start, end, stream=stream)
+
+
+def parse_lines(lines, start=None, end=None, statuslogger_fixer=None):
+    """parses log lines into the partial result the StatusLogger merges, which reads
+    them as it merges. Pass the same fixer to carry on from where the previous lines
+    of a log left off"""
+    parsed = ParsedLog()
+    parsed.records = read_records(lines, parsed, start, end, statuslogger_fixer)
+    return parsed
+
+
+def read_records(
+    lines, parsed, start=None, end=None, statuslogger_fixer=None, stream=True
+):
+    """yields a record for each event with a known type, counting the unknown events
+    and noting the first and last dates in parsed. Unless stream is set the
+    records are reduced to be kept"""
+    if statuslogger_fixer is None:
+        statuslogger_fixer = UnknownStatusLoggerWriter()
+    for event in parser.read_system_log(lines):
+        statuslogger_fixer.check(event)
+        event_date = event.get("date")
+        if start or end:
+            if event_date is None:
+                # rows of a dump read without the line that dated it
+                continue
+            if start and event_date < start:
+                continue
+            if end and event_date > end:
+                if event_date > end + OVERLAP_SLACK:
+                    break
+                continue
+        date = statuslogger_fixer.last_event_date
+        if date is not None:
+            if parsed.first is None or date < parsed.first:
+                parsed.first = date
+            if parsed.last is None or date > parsed.last:
+                parsed.last = date
+        if event["event_type"] == "unknown":
+            parsed.unknown += 1
+        elif stream:
+            yield (
+                event_fingerprint(event),
+                event.get("date"),
+                event.get("rule_type"),
+                event,
+            )
+        else:
+            yield _reduce(event)
 
 
 class StatusLogger:
@@ -168,8 +332,15 @@ class StatusLogger:
         command_name="sperf core statuslogger",
         syslog_prefix="system.log",
         dbglog_prefix="debug.log",
+        timeline=None,
+        checkpoint=None,
     ):
         self.diag_dir = diag_dir
+        # file the state is saved to, when it exists only new log lines are read
+        self.checkpoint = checkpoint
+        # seconds in each bucket of the timeline report, the stage samples are
+        # reduced into buckets as they are read instead of being kept
+        self.timeline = timeline
         self.files = files
         self.wanted_stages = wanted_stages
         if env.DEBUG:
@@ -188,96 +359,178 @@ class StatusLogger:
         if end:
             self.end = date_parse(end)
 
+    def targets(self):
+        """logs to read"""
+        if self.files:
+            return self.files
+        if self.diag_dir:
+            target_system = find_logs(self.diag_dir, file_to_find=self.syslog_prefix)
+            target_debug = find_logs(self.diag_dir, file_to_find=self.dbglog_prefix)
+            return target_system + target_debug
+        raise Exception("no diag dir and no files specified")
+
     def analyze(self):
         """analyze log files"""
         if self.analyzed:
             return
-        event_filter = UniqEventPerNodeFilter()
-        target = None
-        if self.files:
-            target = self.files
-        elif self.diag_dir:
-            target_system = find_logs(self.diag_dir, file_to_find=self.syslog_prefix)
-            target_debug = find_logs(self.diag_dir, file_to_find=self.dbglog_prefix)
-            target = target_system + target_debug
-        else:
-            raise Exception("no diag dir and no files specified")
-        for f in target:
-            nodename = extract_node_name(f, ignore_missing_nodes=True)
-            event_filter.set_node(nodename)
-            node = self.nodes[nodename]
-            if env.DEBUG:
-                print("parsing", f)
-            with FileWithProgress(f) as log:
-                statuslogger_fixer = UnknownStatusLoggerWriter()
-                for event in parser.read_system_log(log):
-                    statuslogger_fixer.check(event)
-                    if self.start and event["date"] < self.start:
-                        continue
-                    if self.end and event["date"] > self.end:
-                        continue
-                    self.__setdates(node, statuslogger_fixer.last_event_date)
-                    node.lines += 1
-                    if event_filter.is_duplicate(event):
-                        node.skipped_lines += 1
-                        continue
-                    if env.DEBUG:
-                        if "rule_type" in event:
-                            self.rule_types[event["rule_type"]] += 1
-                        elif event["event_type"] == "unknown":
-                            self.rule_types["unknown"] += 1
-                        else:
-                            self.rule_types["no type"] += 1
-                    if event["event_type"] == "server_version":
-                        if event.get("version"):
-                            node.version = event["version"]
-                            if node.version.startswith("6"):
-                                node.cassandra_version = "DSE Private Fork"
-                        elif event.get("cassandra_version"):
-                            node.cassandra_version = event["cassandra_version"]
-                        # skipping solr, spark etc as it maybe too much noise for statuslogger
-                    elif event["event_type"] == "memtable_status":
-                        tname = ".".join([event["keyspace"], event["table"]])
-                        if event["ops"] > node.tables[tname].ops:
-                            node.tables[tname].ops = event["ops"]
-                        try:
-                            if event["data"] > node.tables[tname].data:
-                                node.tables[tname].data = event["data"]
-                        except Exception as e:
-                            print(event)
-                            raise e
-                    elif event["event_type"] == "pause":
-                        node.pauses.append(event["duration"])
-                    elif event["event_type"] == "threadpool_header":
-                        node.dumps_analyzed += 1
-                        self.dumps_analyzed += 1
-                    elif event["event_type"] == "threadpool_status":
-                        if re.match(r"TPC/\d+$", event["pool_name"]):
-                            if not node.version:
-                                node.version = "6.x"
-                            if "delayed" in event and event["delayed"]:
-                                val = event["delayed"]
-                                node.stages["local backpressure"][
-                                    event["pool_name"]
-                                ].append(val)
-                        else:
-                            for pool in [
-                                "active",
-                                "pending",
-                                "blocked",
-                                "all_time_blocked",
-                            ]:
-                                if pool in event and event[pool]:
-                                    if not self.wanted_stages or event[
-                                        "pool_name"
-                                    ].startswith(self.wanted_stages):
-                                        node.stages[pool][event["pool_name"]].append(
-                                            event[pool]
-                                        )
+        target = self.targets()
+        self.event_filter = UniqEventPerNodeFilter(files=target)
+        if self.checkpoint:
+            # events already read are not in the filter, a log only holds a
+            # duplicate of them if it was added after they were read
+            checkpoint.resume(
+                self,
+                self.checkpoint,
+                (
+                    "statuslogger",
+                    self.start,
+                    self.end,
+                    self.wanted_stages,
+                    self.timeline,
+                    self.syslog_prefix,
+                    self.dbglog_prefix,
+                ),
+                ("nodes", "dumps_analyzed", "rule_types"),
+                self.__resume_lines,
+                self.add_parsed,
+            )
+            self.analyzed = True
+            return
+        # read straight from the logs when the records are not needed afterwards,
+        # the logs in a tarball are read in tarball order instead
+        stream = (
+            env.JOBS <= 1
+            and not env.CACHE
+            and not any(archive.split_path(f)[0] for f in target)
+        )
+        parse = functools.partial(
+            parse_log, start=self.start, end=self.end, stream=stream
+        )
+        for f, parsed in zip(target, map_files(parse, target)):
+            self.add_parsed(f, parsed)
         self.analyzed = True
         if env.DEBUG:
             print(self.rule_types.items())
 
+    def __resume_lines(self, f, lines, notes):
+        """the rows of a StatusLogger dump cut by the previous run get the date the
+        fixer had then"""
+        fixer = notes.setdefault("statuslogger_fixer", UnknownStatusLoggerWriter())
+        return parse_lines(lines, self.start, self.end, fixer)
+
+    def add_parsed(self, f, parsed):
+        """adds the events parsed from the log"""
+        nodename = extract_node_name(f, ignore_missing_nodes=True)
+        self.event_filter.set_file(nodename, f)
+        node = self.nodes[nodename]
+        for event_id, date, rule_type, event in parsed.records:
+            node.lines += 1
+            if self.event_filter.is_seen(event_id, date, event):
+                node.skipped_lines += 1
+                continue
+            if env.DEBUG:
+                self.rule_types[rule_type or "no type"] += 1
+            if event is not None:
+                self.__add_event(node, event)
+        if parsed.first is not None:
+            self.__setdates(node, parsed.first)
+            self.__setdates(node, parsed.last)
+        # unknown events are never duplicates so they are only counted
+        node.lines += parsed.unknown
+        if env.DEBUG:
+            self.rule_types["unknown"] += parsed.unknown
+
+    def follow(self, report, interval=follow.INTERVAL, ticks=None):
+        """reads what is appended to the logs, calling report every interval seconds"""
+        target = self.targets()
+        self.event_filter = UniqEventPerNodeFilter(files=target)
+        self.analyzed = True
+        fixers = OrderedDefaultDict(UnknownStatusLoggerWriter)
+        follow.follow(
+            target,
+            lambda f, lines: parse_lines(lines, self.start, self.end, fixers[f]),
+            self.add_parsed,
+            report,
+            interval=interval,
+            ticks=ticks,
+        )
+
+    def __add_event(self, node, event):
+        if event["event_type"] == "server_version":
+            if event.get("version"):
+                node.version = event["version"]
+                if node.version.startswith("6"):
+                    node.cassandra_version = "DSE Private Fork"
+            elif event.get("cassandra_version"):
+                node.cassandra_version = event["cassandra_version"]
+            # skipping solr, spark etc as it maybe too much noise for statuslogger
+        elif event["event_type"] == "memtable_status":
+            tname = ".".join([event["keyspace"], event["table"]])
+            if event["ops"] > node.tables[tname].ops:
+                node.tables[tname].ops = event["ops"]
+            try:
+                if event["data"] > node.tables[tname].data:
+                    node.tables[tname].data = event["data"]
+            except Exception as e:
+                print(event)
+                raise e
+        elif event["event_type"] == "pause":
+            node.pauses.add(event["duration"])
+        elif event["event_type"] == "threadpool_header":
+            node.dumps_analyzed += 1
+            self.dumps_analyzed += 1
+        elif event["event_type"] == "threadpool_status":
+            if re.match(r"TPC/\d+$", event["pool_name"]):
+                if not node.version:
+                    node.version = "6.x"
+                if self.timeline:
+                    self.__add_timeline(
+                        node,
+                        "local backpressure",
+                        event["pool_name"],
+                        event.get("delayed") or 0,
+                        event.get("date"),
+                    )
+                elif "delayed" in event and event["delayed"]:
+                    val = event["delayed"]
+                    node.add_stage(
+                        "local backpressure", event["pool_name"], val, event.get("date")
+                    )
+            else:
+                if self.wanted_stages and not event["pool_name"].startswith(
+                    self.wanted_stages
+                ):
+                    return
+                for pool in [
+                    "active",
+                    "pending",
+                    "blocked",
+                    "all_time_blocked",
+                ]:
+                    if self.timeline:
+                        # all time blocked only ever grows so it has no place in a timeline
+                        if pool in event and pool != "all_time_blocked":
+                            self.__add_timeline(
+                                node,
+                                pool,
+                                event["pool_name"],
+                                event[pool] or 0,
+                                event.get("date"),
+                            )
+                    elif pool in event and event[pool]:
+                        node.add_stage(
+                            pool, event["pool_name"], event[pool], event.get("date")
+                        )
+
+    def __add_timeline(self, node, status, tpname, value, date):
+        if date is None:
+            return
+        pools = node.timeline[status]
+        if tpname not in pools:
+            # buckets start at the epoch so every pool and node line up
+            pools[tpname] = Buckets(EPOCH, seconds=self.timeline, reducer="sketch")
+        pools[tpname].add(date, value)
+
     def __setdates(self, node, date):
         if not node.start:
             node.start = date
@@ -410,6 +663,48 @@ class StatusLogger:
         for rec, reason in recs:
             print("* %s (%s)" % (rec, reason))
 
+    def print_timeline(self):
+        """prints the max and p99 of each busy pool per time bucket, analyzing if necessary"""
+        self.analyze()
+        print("%s version: %s" % (self.command_name, VERSION))
+        print("")
+        print("Timeline (%s buckets)" % format_seconds(self.timeline))
+        print("")
+        if not any(node.timeline for node in self.nodes.values()):
+            print("nodes: Nothing found!\n")
+            return
+        for name, node in self.nodes.items():
+            if not node.timeline:
+                continue
+            print(name)
+            print("-" * 30)
+            busy = OrderedDefaultDict(list)
+            for status, pools in node.timeline.items():
+                for tpname, buckets in pools.items():
+                    for time, sketch in buckets.items(sparse=True):
+                        if sketch.max():
+                            busy[time].append(
+                                (sketch.max(), sketch.percentile(99), status, tpname)
+                            )
+            if not busy:
+                print("no busy pools")
+                print("")
+                continue
+            table = [["", "", "", "max", "p99"]]
+            for time in sorted(busy):
+                label = time.strftime("%Y-%m-%d %H:%M:%S")
+                for high, p99, status, tpname in sorted(
+                    busy[time], key=lambda b: (-b[0], b[2], b[3])
+                ):
+                    table.append(
+                        [label, status.upper(), tpname, "%i" % high, "%i" % p99]
+                    )
+                    label = ""
+            pad_table(table, extra_pad=2)
+            for line in table:
+                print("".join(line))
+            print("")
+
     def print_summary(self):
         """prints a summary report"""
         self.analyze()
@@ -15,6 +15,7 @@
 """responsible for date parsing and format detection"""
 
 from datetime import datetime, timezone
+from collections import OrderedDict
 import json
 from pysper import env
 
@@ -50,9 +51,13 @@ def date_parse(date_string):
 
 class LogDateFormatParser:
     """LogDateFormatParser handles the particular format used in
-    DSE logs
+    DSE logs. Log lines come in bursts within the same second so the
+    datetime for each second is kept in a small LRU and only the
+    milliseconds are parsed for the lines that follow
     """
 
+    cache_size = 64
+
     def __init__(self):
         if env.IS_US_FMT:
             self.mp = 5
@@ -60,10 +65,26 @@ class LogDateFormatParser:
         else:
             self.mp = 8
             self.dp = 5
+        self.seconds = OrderedDict()
 
     def parse_timestamp(self, time_str):
         """ParseTimestamp creates a LogTimestamp based on the
         CASSANDRA_LOG_FORMAT and assumes UTC timezone always"""
+        second = time_str[:19]
+        base = self.seconds.get(second)
+        if base is not None:
+            self.seconds.move_to_end(second)
+            try:
+                return base.replace(microsecond=int(time_str[20:23]) * 1000)
+            except ValueError:
+                # bad milliseconds, let the full parse report it
+                pass
+        return self._parse(time_str)
+
+    def _parse(self, time_str):
+        """parses every field of the timestamp, remembering the second
+        when the timestamp is complete"""
+        complete = False
         parsed_hour = 0
         parsed_minute = 0
         parsed_second = 0
@@ -80,6 +101,7 @@ class LogDateFormatParser:
             parsed_minute = int(time_str[14:16])
             parsed_second = int(time_str[17:19])
             parsed_microsecond = int(time_str[20:23]) * 1000
+            complete = True
         except ValueError as e:
             if not env.PERMISSIVE_TIME:
                 msg = (
@@ -99,7 +121,7 @@ class LogDateFormatParser:
                 second=parsed_second,
                 microsecond=parsed_microsecond,
             )
-            return parsed.replace(tzinfo=timezone.utc)
+            parsed = parsed.replace(tzinfo=timezone.utc)
         except ValueError as e:
             fmt = "eu"
             fix = ""
@@ -112,3 +134,8 @@ class LogDateFormatParser:
                 % (fmt, fix, e)
             )
             raise Exception(msg)
+        if complete:
+            self.seconds[time_str[:19]] = parsed.replace(microsecond=0)
+            if len(self.seconds) > self.cache_size:
+                self.seconds.popitem(last=False)
+        return parsed
@@ -16,10 +16,18 @@
 
 import os
 import re
+import bisect
 import io
 import json
+import hashlib
+import functools
+import contextlib
+import zipfile
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
 from collections import namedtuple, OrderedDict
-from pysper import env, dates
+from pysper import env, dates, parser, util, cache, archive
+from pysper.core import OrderedDefaultDict
 
 
 class UnknownStatusLoggerWriter:
@@ -148,46 +156,279 @@ class UnableToReadDiagException(Exception):
 LogLine = namedtuple("LogLine", "level thread timestamp reporter raw_data")
 
 
+def event_fingerprint(event):
+    """hash of all the fields of the event, two events with the same fields have the
+    same fingerprint. Events with unhashable values (configuration maps and the like)
+    fall back to hashing their json"""
+    try:
+        return hash(frozenset(event.items()))
+    except TypeError:
+        return hash(
+            json.dumps(
+                dict(event.items()), cls=dates.DateTimeJSONEncoder, sort_keys=True
+            )
+        )
+
+
+def event_digest(event):
+    """like event_fingerprint but the same in every process, for events that are
+    stored or handed back by a worker. String hashes change with each interpreter"""
+    fields = repr(sorted(event.items(), key=lambda item: item[0]))
+    return hashlib.blake2b(fields.encode("utf-8"), digest_size=8).digest()
+
+
+_log_time_regex = re.compile(
+    rb" *[A-Z]* *\[[^\]]*\] (?P<date>[0-9]{4}-[0-9]{2}-[0-9]{2} .{12})"
+)
+
+# reading a few blocks too many is cheaper than more seeks
+_SEARCH_BLOCK = 64 * 1024
+
+
+def _line_time(date_parser, line):
+    """time of a log line read in binary mode, None when the line has no time"""
+    match = _log_time_regex.match(line)
+    if not match:
+        return None
+    try:
+        return date_parser.parse_timestamp(match.group("date").decode("ascii"))
+    except Exception:
+        return None
+
+
+# how far out of order lines of a log can be
+OVERLAP_SLACK = timedelta(minutes=1)
+
+
+def _file_range(filepath):
+    """first and last log time of the file, widened by OVERLAP_SLACK to allow for
+    lines logged slightly out of order. Only the first and last blocks of the file are
+    read, the full time range is returned when they have no lines with a time or the
+    file is compressed"""
+    if archive.is_archived(filepath):
+        return dates.min_utc_time(), dates.max_utc_time()
+    try:
+        with open(filepath, "rb") as file_handle:
+            head = file_handle.read(_SEARCH_BLOCK)
+            size = file_handle.seek(0, os.SEEK_END)
+            file_handle.seek(max(0, size - _SEARCH_BLOCK))
+            tail = file_handle.read()
+    except OSError:
+        return dates.min_utc_time(), dates.max_utc_time()
+    if not head:
+        # empty file, nothing can overlap with it
+        return dates.max_utc_time(), dates.min_utc_time()
+    date_parser = dates.LogDateFormatParser()
+    first = None
+    for line in head.splitlines():
+        first = _line_time(date_parser, line)
+        if first is not None:
+            break
+    last = None
+    for line in reversed(tail.splitlines()):
+        last = _line_time(date_parser, line)
+        if last is not None:
+            break
+    if first is None or last is None or first > last:
+        return dates.min_utc_time(), dates.max_utc_time()
+    return first - OVERLAP_SLACK, last + OVERLAP_SLACK
+
+
 class UniqEventPerNodeFilter:
     """previous processed events from other files will not be run
-    additional times. This is a per node limit"""
+    additional times. This is a per node limit.
 
-    def __init__(self):
+    When the files are passed in, an event is only remembered if its time falls in
+    the time range of another file of the same node, as rotated logs only overlap at
+    their boundaries. Otherwise every event is remembered"""
+
+    def __init__(self, files=None):
         self.current_node = None
         self.previous_files_events = OrderedDict()
         self.queued_events = set()
+        self.overlaps = {}
+        self.keep_ranges = None
+        if files:
+            ranges = OrderedDefaultDict(list)
+            for filepath in files:
+                node = util.extract_node_name(filepath, ignore_missing_nodes=True)
+                ranges[node].append((filepath, _file_range(filepath)))
+            for node_ranges in ranges.values():
+                for filepath, _ in node_ranges:
+                    self.overlaps[filepath] = [
+                        time_range
+                        for other, time_range in node_ranges
+                        if other != filepath
+                    ]
 
     def set_node(self, node):
         """adds existing events to a "seen filter" which is
         consulted for all other events"""
         # clear out all queued events and place into previous queue for previous node
-        for event_id in self.queued_events:
-            self.previous_files_events[self.current_node][event_id] = None
+        if self.queued_events:
+            self.previous_files_events[self.current_node].update(self.queued_events)
         # setup new node
         if node not in self.previous_files_events:
-            self.previous_files_events[node] = OrderedDict()
+            self.previous_files_events[node] = set()
         self.current_node = node
         # clear out all previous queued events
         self.queued_events = set()
+        self.keep_ranges = None
+
+    def set_file(self, node, filepath):
+        """same as set_node, when the file was passed in only the events that
+        overlap with the other files of the node are remembered"""
+        self.set_node(node)
+        self.keep_ranges = self.overlaps.get(filepath)
 
     def is_duplicate(self, event):
         """checked against previously processed files"""
         if event.get("event_type") == "unknown":
             return False
-        # event_id = hash(str(event))
-        event_id = hash(
-            json.dumps(event, cls=dates.DateTimeJSONEncoder, sort_keys=True)
-        )
+        return self.is_seen(event_fingerprint(event), event.get("date"), event)
+
+    def is_seen(self, event_id, event_date, event=None):
+        """same as is_duplicate for an event known by its fingerprint or digest and date,
+        the same kind of id has to be used for all the events"""
         if event_id in self.previous_files_events[self.current_node]:
             if env.DEBUG:
                 print(
-                    "duplicate event: node: %s, event: %s" % (self.current_node, event)
+                    "duplicate event: node: %s, event: %s"
+                    % (self.current_node, event if event is not None else event_id)
                 )
             return True
+        if self.keep_ranges is not None:
+            if isinstance(event_date, datetime) and not any(
+                first <= event_date <= last for first, last in self.keep_ranges
+            ):
+                # no other file covers this time so it cannot show up again
+                return False
         self.queued_events.add(event_id)
         return False
 
 
+class EventStream:
+    """parses each log file exactly once and hands every event to all subscribers
+    so several reports can be built from a single pass over the logs.
+
+    A subscriber provides set_file(node, filepath) which is called before the first
+    event of each file and add(event) which is called for every event in the file.
+    Subscribers are called in the order they subscribed and see the same event object
+    """
+
+    def __init__(self, read_func=parser.read_system_log, subscribers=None):
+        self.read_func = read_func
+        self.subscribers = []
+        if subscribers:
+            self.subscribers.extend(subscribers)
+
+    def subscribe(self, subscriber):
+        """adds a subscriber to the stream"""
+        self.subscribers.append(subscriber)
+
+    def run(self, files):
+        """reads all the files in order, returns a warning for each file that could not be read"""
+        warnings = []
+        if env.JOBS > 1:
+            # every event of a file is kept until it is published, so they are
+            # not worth storing in the cache
+            read = functools.partial(_read_events, self.read_func)
+            results = map_files(read, files, use_cache=False)
+            for filepath, (error, events) in zip(files, results):
+                if error:
+                    warnings.append(error)
+                    continue
+                self._publish(filepath, events)
+            return warnings
+        for filepath in files:
+            with FileWithProgress(filepath) as log:
+                if log.error:
+                    warnings.append(log.error)
+                    continue
+                if env.DEBUG:
+                    print("parsing", filepath)
+                self._publish(filepath, self.read_func(log))
+        return warnings
+
+    def _publish(self, filepath, events):
+        node = util.extract_node_name(filepath, ignore_missing_nodes=True)
+        for subscriber in self.subscribers:
+            subscriber.set_file(node, filepath)
+        for event in events:
+            for subscriber in self.subscribers:
+                subscriber.add(event)
+
+
+def _read_events(read_func, filepath):
+    """parses a whole file in a worker process, returns the read error if any and all the events"""
+    with FileWithProgress(filepath) as log:
+        if log.error:
+            return log.error, []
+        if env.DEBUG:
+            print("parsing", filepath)
+        return None, list(read_func(log))
+
+
+def _init_worker(settings, tarball_listings):
+    """copies the global flags and the tarball listings into the worker processes,
+    needed where processes are spawned"""
+    for key, value in settings.items():
+        setattr(env, key, value)
+    archive.restore(tarball_listings)
+
+
+def _in_order(results, order):
+    """yields the results computed in the order of the indexes in order by index,
+    keeping the ones that come back early until their turn"""
+    early = {}
+    expected = 0
+    for index, result in zip(order, results):
+        early[index] = result
+        while expected in early:
+            yield early.pop(expected)
+            expected += 1
+
+
+def map_files(func, files, use_cache=True):
+    """calls func on each file path, yielding the results in the same order as the files.
+    When env.JOBS is greater than 1 the files are handed out to a pool of env.JOBS processes,
+    so func has to be a module level function (or a partial of one) returning picklable results.
+    Merging the results in file order keeps reports identical to a serial run.
+    Files in a tarball are read in tarball order so it is only decompressed once,
+    their results are kept until the files before them are done.
+    When env.CACHE and use_cache are set the results are loaded from and stored in
+    the parse cache"""
+    files = list(files)
+    if env.CACHE and use_cache:
+        func = functools.partial(cache.cached, func)
+    order = sorted(range(len(files)), key=lambda i: archive.position(files[i]))
+    ordered = [files[i] for i in order]
+    if env.JOBS <= 1 or len(files) < 2:
+        yield from _in_order(map(func, ordered), order)
+        return
+    settings = {
+        key: getattr(env, key)
+        for key in (
+            "PROGRESS",
+            "DEBUG",
+            "IS_US_FMT",
+            "FILE_ENCODING",
+            "PERMISSIVE_TIME",
+            "CACHE",
+            "REBUILD_CACHE",
+            "CACHE_DIR",
+            "CACHE_SIZE",
+        )
+    }
+    workers = min(env.JOBS, len(files))
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(settings, archive.listings()),
+    ) as executor:
+        yield from _in_order(executor.map(func, ordered), order)
+
+
 def grep_date(log_string):
     """gets just the date from the log"""
     match = re.search(
@@ -203,6 +444,16 @@ def grep_date(log_string):
 
 def log_range(file_path):
     """gets timestamp of first log and last log"""
+    if archive.is_archived(file_path):
+        # no seeking back from the end, the whole file is read instead
+        with archive.open_binary(file_path) as file_handle:
+            first = file_handle.readline()
+            if not first:
+                return dates.max_utc_time(), dates.min_utc_time()
+            last = first
+            for last in file_handle:
+                pass
+        return grep_date(first), grep_date(last)
     with open(file_path, "rb") as file_handle:
         first = file_handle.readline()  # Read the first line.
         if not first:  # empty files are safe to not process
@@ -219,6 +470,123 @@ def log_range(file_path):
     return grep_date(first), grep_date(last)
 
 
+class LineRange:
+    """passes the lines through noting the first and the last, so the time range of
+    a compressed log is found while it is parsed instead of reading it twice"""
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.first = None
+        self.last = None
+
+    def __iter__(self):
+        for line in self.lines:
+            if self.first is None:
+                self.first = line
+            self.last = line
+            yield line
+
+    def range(self):
+        """same as log_range once the lines have been read"""
+        if self.first is None:
+            return dates.max_utc_time(), dates.min_utc_time()
+        return (
+            grep_date(self.first.encode(env.FILE_ENCODING)),
+            grep_date(self.last.encode(env.FILE_ENCODING)),
+        )
+
+
+def range_start_offset(filepath, start=None, end=None):
+    """returns None when the first and last log times of the file show it has no lines
+    between start and end, otherwise the byte offset of a log line from before start
+    (less OVERLAP_SLACK), so the lines in the range can be read without parsing the
+    whole file. The offset comes from the time index when the cache is enabled and
+    from a binary search otherwise. Returns 0 when the file should be read
+    from the beginning"""
+    if not start and not end:
+        return 0
+    if archive.is_archived(filepath):
+        # compressed files cannot be searched, they are read from the start
+        return 0
+    first, last = _file_range(filepath)
+    if (start and last < start) or (end and first > end):
+        return None
+    if not start or first >= start or "\n".encode(env.FILE_ENCODING) != b"\n":
+        return 0
+    target = start - OVERLAP_SLACK
+    if env.CACHE:
+        index = cache.cached(time_index, filepath)
+        times = [entry_time for entry_time, _ in index]
+        position = bisect.bisect_left(times, target)
+        if position == 0:
+            return 0
+        return index[position - 1][1]
+    return _search_offset(filepath, target)
+
+
+def _search_offset(filepath, target):
+    """binary search for the byte offset of a log line from before target"""
+    date_parser = dates.LogDateFormatParser()
+    with open(filepath, "rb") as file_handle:
+        low = 0
+        high = file_handle.seek(0, os.SEEK_END)
+        while high - low > _SEARCH_BLOCK:
+            middle = (low + high) // 2
+            file_handle.seek(middle)
+            file_handle.readline()  # skip the partial line
+            line_time = None
+            while line_time is None and file_handle.tell() < high:
+                line_time = _line_time(date_parser, file_handle.readline())
+            if line_time is None or line_time >= target:
+                high = middle
+            else:
+                low = middle
+        if low == 0:
+            return 0
+        return _next_log_line(file_handle, low, date_parser)[1]
+
+
+def _next_log_line(file_handle, position, date_parser):
+    """time and byte offset of the first line with a time after position, skipping
+    the partial line at position and lines without a time like stack traces, so
+    lines like statuslogger rows are never read without the line that dates them.
+    The time is None at the end of the file"""
+    file_handle.seek(position)
+    if position:
+        file_handle.readline()
+    while True:
+        offset = file_handle.tell()
+        line = file_handle.readline()
+        if not line:
+            return None, offset
+        line_time = _line_time(date_parser, line)
+        if line_time is not None:
+            return line_time, offset
+
+
+# one entry in the time index per block of this size
+INDEX_SPACING = 1024 * 1024
+
+
+def time_index(filepath):
+    """sparse index of a log with the time and byte offset of the first log line after
+    every INDEX_SPACING bytes. Only the start of each block is read so building it is
+    cheap, with the cache enabled it is kept with the parsed results"""
+    date_parser = dates.LogDateFormatParser()
+    index = []
+    with open(filepath, "rb") as file_handle:
+        size = file_handle.seek(0, os.SEEK_END)
+        for position in range(0, size, INDEX_SPACING):
+            if index and index[-1][1] >= position:
+                # a long run of lines without a time covered this block
+                continue
+            line_time, offset = _next_log_line(file_handle, position, date_parser)
+            if line_time is None:
+                break
+            index.append((line_time, offset))
+    return index
+
+
 def find_files(config, file_to_find, exact_filename=False):
     """finds all the files in config.diag_dir that matches the prefix or will use
     the config.files string (split on ,) if present and not use a prefix but a full
@@ -245,52 +613,185 @@ def find_files(config, file_to_find, exact_filename=False):
     return files
 
 
+# how the files in a diag tarball are classified, by file name prefix
+LOG_KINDS = OrderedDict(
+    [
+        ("system", "system.log"),
+        ("debug", "debug.log"),
+        ("output", "output.log"),
+        ("cfstats", "cfstats"),
+        ("blockdev", "blockdev_report"),
+        ("gc", "gc.log"),
+        ("iostat", "iostat"),
+        ("ttop", "ttop"),
+    ]
+)
+_KIND_OF_PREFIX = dict((prefix, kind) for kind, prefix in LOG_KINDS.items())
+
+# only the start of a file is checked for NUL bytes
+BINARY_SNIFF = archive.SNIFF
+
+
+def log_kind(filename):
+    """the LOG_KINDS entry the file name matches or None"""
+    for kind, prefix in LOG_KINDS.items():
+        if filename.startswith(prefix):
+            return kind
+    return None
+
+
+class Inventory:
+    """all the files in a diag directory or diag tarball, walked once and classified
+    by LOG_KINDS. The binary check is only done for the files that are asked for and
+    remembered"""
+
+    def __init__(self, diag_dir):
+        self.diag_dir = diag_dir
+        self.files = []
+        self.by_kind = OrderedDefaultDict(list)
+        self.binary = {}
+        for fullpath in self._walk(diag_dir):
+            filename = os.path.basename(fullpath)
+            self.files.append((filename, fullpath))
+            kind = log_kind(filename)
+            if kind:
+                self.by_kind[kind].append(fullpath)
+
+    @staticmethod
+    def _walk(diag_dir):
+        if archive.is_tarball(diag_dir):
+            yield from archive.list_files(diag_dir)
+            return
+        for dirpath, _, files in os.walk(diag_dir):
+            for filename in files:
+                yield os.path.join(dirpath, filename)
+
+    def _is_binary(self, fullpath):
+        if fullpath not in self.binary:
+            self.binary[fullpath] = is_binary(fullpath)
+        return self.binary[fullpath]
+
+    def find(self, file_to_find, use_as_prefix=True):
+        """files matching the prefix or exact name that are not binary, in walk order.
+        The prefixes of LOG_KINDS are looked up by kind"""
+        if use_as_prefix and file_to_find in _KIND_OF_PREFIX:
+            return self.logs(_KIND_OF_PREFIX[file_to_find])
+        return [
+            fullpath
+            for filename, fullpath in self.files
+            if (
+                filename.startswith(file_to_find)
+                if use_as_prefix
+                else filename == file_to_find
+            )
+            and not self._is_binary(fullpath)
+        ]
+
+    def node_names(self):
+        """names of the entries in the nodes directory"""
+        if not archive.is_tarball(self.diag_dir):
+            return os.listdir(os.path.join(self.diag_dir, "nodes"))
+        names = OrderedDict()
+        for _, fullpath in self.files:
+            tokens = os.path.relpath(fullpath, self.diag_dir).split(os.sep)
+            if "nodes" in tokens[:-2]:
+                names[tokens[tokens.index("nodes") + 1]] = None
+        if not names:
+            raise IOError("no nodes directory in %s" % self.diag_dir)
+        return list(names)
+
+    def logs(self, kind):
+        """text files of the LOG_KINDS kind"""
+        return [f for f in self.by_kind.get(kind, []) if not self._is_binary(f)]
+
+    def nodes(self, kind):
+        """text files of the LOG_KINDS kind grouped by node"""
+        grouped = OrderedDefaultDict(list)
+        for fullpath in self.logs(kind):
+            grouped[util.extract_node_name(fullpath, ignore_missing_nodes=True)].append(
+                fullpath
+            )
+        return grouped
+
+
+# diag dir -> Inventory, only while a command runs (see cached_inventories)
+_inventories = None
+
+
+@contextlib.contextmanager
+def cached_inventories():
+    """reuses the inventory of each diag dir until the block ends, so a command walks
+    its diag dir once. Outside of it every lookup walks the diag dir again, so callers
+    never get a listing from before the files changed"""
+    global _inventories
+    outer = _inventories
+    if outer is None:
+        _inventories = {}
+    try:
+        yield
+    finally:
+        _inventories = outer
+
+
+def inventory(diag_dir):
+    """the inventory of diag_dir, reused inside cached_inventories"""
+    if _inventories is None:
+        return Inventory(diag_dir)
+    key = os.path.abspath(diag_dir)
+    if key not in _inventories:
+        _inventories[key] = Inventory(diag_dir)
+    return _inventories[key]
+
+
+def clear_inventory():
+    """forget every cached inventory, for when the files on disk have changed"""
+    if _inventories is not None:
+        _inventories.clear()
+
+
 def find_logs(diag_dir, file_to_find="system.log", use_as_prefix=True):
     """will find all logs that match the prefix under diag_dir"""
-    matches = []
-    for dirpath, _, files in os.walk(diag_dir):
-        for filename in files:
-            if use_as_prefix and filename.startswith(file_to_find):
-                fullpath = os.path.join(dirpath, filename)
-                if not is_binary(fullpath):
-                    matches.append(fullpath)
-            elif not use_as_prefix and filename == file_to_find:
-                fullpath = os.path.join(dirpath, filename)
-                if not is_binary(fullpath):
-                    matches.append(fullpath)
-    return matches
+    return inventory(diag_dir).find(file_to_find, use_as_prefix)
 
 
 def is_binary(filename):
-    """Return true if the given filename is binary.
-    @raise EnvironmentError: if the file does not exist or cannot be accessed.
-    @attention: found @
-        http://bytes.com/topic/python/answers/21222-determine-file-type-binary-text on 6/08/2010
-    @author: Trent Mick <TrentM@ActiveState.com>
-    @author: Jorge Orpinel <jorge@orpinel.com>"""
-    fin = open(filename, "rb")
-    try:
-        chunk_size = 1024
-        while 1:
-            chunk = fin.read(chunk_size)
-            if b"\0" in chunk:  # found null byte
-                return True
-            if len(chunk) < chunk_size:
-                break  # done
-    finally:
-        fin.close()
-    return False
+    """Return true if the given filename has a null byte in the first BINARY_SNIFF bytes,
+    compressed files are checked after decompression and are binary when they cannot be
+    decompressed.
+    @raise EnvironmentError: if the file does not exist or cannot be accessed."""
+    sniffed = archive.sniffed_binary(filename)
+    if sniffed is not None:
+        return sniffed
+    if archive.is_archived(filename):
+        try:
+            with archive.open_binary(filename) as fin:
+                return b"\0" in fin.read(BINARY_SNIFF)
+        except FileNotFoundError:
+            raise
+        except (OSError, EOFError, zipfile.BadZipFile):
+            return True
+    with open(filename, "rb") as fin:
+        return b"\0" in fin.read(BINARY_SNIFF)
 
 
 class FileWithProgress:
-    """logs open, close if --progress is enabled only works with reads. will always log errors"""
+    """logs open, close if --progress is enabled only works with reads. will always log errors.
+    With binary set the file is read as bytes"""
 
-    def __init__(self, filepath):
+    def __init__(self, filepath, binary=False):
         self.filepath = filepath
         self.error = ""
+        self.binary = binary
         try:
-            self.file_desc = open(self.filepath, encoding=env.FILE_ENCODING)
-        except IOError as exception:
+            if binary and archive.is_archived(self.filepath):
+                self.file_desc = archive.open_read_ahead(self.filepath)
+            elif binary:
+                self.file_desc = open(self.filepath, "rb")
+            elif archive.is_archived(self.filepath):
+                self.file_desc = archive.open_text(self.filepath, env.FILE_ENCODING)
+            else:
+                self.file_desc = open(self.filepath, encoding=env.FILE_ENCODING)
+        except (IOError, EOFError, zipfile.BadZipFile) as exception:
             msg = "error opening: %s with %s" % (self.filepath, str(exception))
             if env.PROGRESS:
                 print("!", end="", flush=True)
@@ -317,9 +818,11 @@ class FileWithProgress:
             print(".", end="", flush=True)
         return self
 
-    def read(self):
-        """wrapper around file read"""
-        return self.file_desc.read()
+    def read(self, size=-1):
+        """wrapper around file read, nothing is read when the file could not be opened"""
+        if not self.file_desc:
+            return b"" if self.binary else ""
+        return self.file_desc.read(size)
 
     def readline(self):
         """wrapper around file readline"""
@@ -19,3 +19,9 @@ DEBUG = False
 IS_US_FMT = True
 FILE_ENCODING = "utf-8"
 PERMISSIVE_TIME = False
+JOBS = 1
+CACHE = False
+REBUILD_CACHE = False
+CACHE_DIR = None
+# bytes the parse cache may use before the least recently used entries are removed
+CACHE_SIZE = 512 * 1024 * 1024
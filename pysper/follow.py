@@ -0,0 +1,135 @@
+# Copyright 2020 DataStax, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""follows live logs, only the bytes appended since the last look are read"""
+
+import os
+import time
+from datetime import datetime
+from pysper import env
+
+# seconds between reports when following logs
+INTERVAL = 10
+
+
+class Tail:
+    """reads the complete lines appended to a log. A log that is rotated (a new file
+    with a different inode takes its name) is read to its end, when it was renamed in
+    the same directory, before the new file is read from the start, a log truncated in
+    place is read again from the start. The log is only open while it is read, so it
+    can be renamed between reads where open files cannot be, as on Windows"""
+
+    def __init__(self, path, from_start=False):
+        self.path = path
+        self.inode = None
+        self.offset = 0
+        self.partial = b""
+        try:
+            current = os.stat(path)
+        except FileNotFoundError:
+            return
+        self.inode = current.st_ino
+        if not from_start:
+            self.offset = current.st_size
+
+    def _rest_of_renamed(self):
+        """what was appended to the log after the last read and before it was renamed,
+        empty when it was moved out of the directory or removed"""
+        try:
+            with os.scandir(os.path.dirname(self.path) or os.curdir) as entries:
+                renamed = [
+                    entry.path
+                    for entry in entries
+                    if entry.is_file() and entry.inode() == self.inode
+                ]
+            if not renamed:
+                return b""
+            with open(renamed[0], "rb") as log:
+                log.seek(self.offset)
+                return log.read()
+        except OSError:
+            return b""
+
+    def read_lines(self):
+        """the complete lines appended since the last call, a line still being
+        written is kept until its newline arrives"""
+        data = self.partial
+        try:
+            log = open(self.path, "rb")
+        except FileNotFoundError:
+            # between the rename and the creation of the new file
+            log = None
+        try:
+            current = os.fstat(log.fileno()) if log else None
+            if self.inode is not None and (
+                current is None or current.st_ino != self.inode
+            ):
+                # rotated, what was left of the old file comes first
+                data += self._rest_of_renamed()
+                if data and not data.endswith(b"\n"):
+                    data += b"\n"
+                self.inode = None
+            if log:
+                if self.inode is None:
+                    self.inode = current.st_ino
+                    self.offset = 0
+                elif current.st_size < self.offset:
+                    # truncated in place
+                    data = b""
+                    self.offset = 0
+                log.seek(self.offset)
+                appended = log.read()
+                self.offset += len(appended)
+                data += appended
+        finally:
+            if log is not None:
+                log.close()
+        end = data.rfind(b"\n") + 1
+        self.partial = data[end:]
+        return (
+            data[:end]
+            .decode(env.FILE_ENCODING, errors="replace")
+            .splitlines(keepends=True)
+        )
+
+    def close(self):
+        """stops following the log, it is only open while it is read"""
+
+
+def follow(files, parse, merge, report, interval=INTERVAL, ticks=None):
+    """tails the files until interrupted, or for ticks reports. Every interval seconds
+    the lines appended to each file are passed to parse(filepath, lines), its result
+    to merge(filepath, parsed), and then report() prints the report again"""
+    tails = [Tail(filepath) for filepath in files]
+    tick = 0
+    try:
+        while True:
+            for tail in tails:
+                lines = tail.read_lines()
+                if lines:
+                    merge(tail.path, parse(tail.path, lines))
+            print("")
+            print("=" * 30)
+            print(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            print("=" * 30)
+            report()
+            tick += 1
+            if ticks is not None and tick >= ticks:
+                return
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        return
+    finally:
+        for tail in tails:
+            tail.close()
@@ -14,11 +14,30 @@
 
 """parses jars from the classpath and compares them"""
 
+import functools
 from pysper import env, diag, parser
 from pysper.humanize import pluralize
 from pysper.core import OrderedDefaultDict
 
 
+def read_jars(filepath, error_if_file_not_found=False):
+    """returns the jars found in the classpath of an output log, can run in a worker process.
+    The classpath is logged once on startup so the log is only read up to it"""
+    # to eliminate dupes within the same file, because java is crazy town
+    jars = OrderedDefaultDict(int)
+    with diag.FileWithProgress(filepath) as log:
+        if not log.file_desc and error_if_file_not_found:
+            raise FileNotFoundError(log.error)
+        for event in parser.read_output_log(log):
+            if event["event_type"] == "classpath":
+                for jar in event["classpath"].split(":"):
+                    j = jar.split("/")[-1]
+                    if j.endswith("jar"):
+                        jars[j] += 1
+                break
+    return list(jars.keys())
+
+
 class JarCheckParser:
     """class to parse and analyze the jars in the classpath of an outlog"""
 
@@ -40,21 +59,13 @@ class JarCheckParser:
         else:
             self.analyzed = True
             return
-        for file in target:
-            with diag.FileWithProgress(file) as log:
-                if not log.file_desc and error_if_file_not_found:
-                    raise FileNotFoundError(log.error)
-                for event in parser.read_output_log(log):
-                    if event["event_type"] == "classpath":
-                        thisjars = OrderedDefaultDict(int)
-                        for jar in event["classpath"].split(":"):
-                            j = jar.split("/")[-1]
-                            if j.endswith("jar"):
-                                # to eliminate dupes within the same file, because java is crazy town
-                                if j not in thisjars:
-                                    thisjars[j] += 1
-                                    self.jars[j] += 1
-                self.files_analyzed += 1
+        read = functools.partial(
+            read_jars, error_if_file_not_found=error_if_file_not_found
+        )
+        for jars in diag.map_files(read, target):
+            for j in jars:
+                self.jars[j] += 1
+            self.files_analyzed += 1
         self.analyzed = True
 
     def print_report(self, diff_only=False):
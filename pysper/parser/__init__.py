@@ -15,6 +15,7 @@
 """pysper parser top level."""
 
 from pysper.parser import systemlog, outputlog, block_dev
+from pysper.parser.rules import Event
 from pysper import env
 
 
@@ -39,16 +40,17 @@ def _default_capture(line):
         print(line)
 
 
-def read_log(lines, capture_line_func=_default_capture, **extras):
-    """parses an iterable set of lines yielding events"""
+def read_log(lines, capture_line_func=_default_capture, compact=False, **extras):
+    """parses an iterable set of lines yielding events. With compact the events are
+    Event records instead of dicts, for callers keeping many of them"""
     fields = None
     for line in lines:
         next_fields = capture_line_func(line)
         if next_fields is not None:
             if fields is not None:
                 fields.update(extras)
-                yield fields
+                yield Event.compact(fields) if compact else fields
             fields = next_fields
     # need to do this one last time to clear out the last update to next_fields
     if fields is not None:
-        yield fields
+        yield Event.compact(fields) if compact else fields
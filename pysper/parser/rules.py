@@ -18,7 +18,15 @@ parsing the lines in a log fil
 """
 
 import re
+import sys
+import operator
 from collections import OrderedDict
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # python < 3.11
+    import sre_parse
+    import sre_constants
 from datetime import timezone
 from pysper import dates
 from pysper.core import OrderedDefaultDict
@@ -66,6 +74,32 @@ class case:
         self.keys = keys
 
 
+class source_filter:
+    """
+    Tells whether a line can be captured by the rules in the given rule groups. Log lines
+    from a java source file none of the cases in the groups are for are skipped with
+    a substring check and without running any regex. Lines without a java source file,
+    like the rows of a StatusLogger table, are always kept.
+    """
+
+    def __init__(self, *rule_groups):
+        """
+        Constructor expects one or more functions returning a tuple of case and rule objects,
+        like gc_rules.
+        """
+        self.sources = set()
+        for rule_group in rule_groups:
+            for child in rule_group():
+                if isinstance(child, case):
+                    self.sources.update(child.keys)
+
+    def __call__(self, line):
+        end = line.find(".java")
+        if end == -1:
+            return True
+        return line[line.rfind(" ", 0, end) + 1 : end] in self.sources
+
+
 class rule:
     """
     Executes the condition, and optionally one or more actions. If the condition returns None,
@@ -90,28 +124,357 @@ class rule:
         return fields
 
 
+def _first_chars(items):
+    """returns the set of characters a match of the parsed regex items can start with
+    and whether the items can match an empty string. The set is None when any character
+    can start a match"""
+    chars = set()
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            chars.add(chr(av))
+            return chars, False
+        if op is sre_constants.IN:
+            for in_op, in_av in av:
+                if in_op is sre_constants.LITERAL:
+                    chars.add(chr(in_av))
+                elif in_op is sre_constants.RANGE and in_av[1] - in_av[0] < 256:
+                    chars.update(chr(c) for c in range(in_av[0], in_av[1] + 1))
+                else:
+                    return None, False
+            return chars, False
+        if op in (sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            # zero width, the next item decides the first character
+            continue
+        if op is sre_constants.SUBPATTERN:
+            if av[1] & sre_constants.SRE_FLAG_IGNORECASE:
+                return None, False
+            sub_chars, nullable = _first_chars(av[-1])
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            sub_chars, nullable = _first_chars(av[2])
+            nullable = nullable or av[0] == 0
+        elif op is sre_constants.BRANCH:
+            sub_chars, nullable = set(), False
+            for branch in av[1]:
+                branch_chars, branch_nullable = _first_chars(branch)
+                if branch_chars is None:
+                    return None, False
+                sub_chars.update(branch_chars)
+                nullable = nullable or branch_nullable
+        else:
+            return None, False
+        if sub_chars is None:
+            return None, False
+        chars.update(sub_chars)
+        if not nullable:
+            return chars, False
+    return chars, True
+
+
+def _literals(items, found, run):
+    """collects the runs of literal text every match of the parsed regex items contains"""
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            run.append(chr(av))
+            continue
+        if op is sre_constants.SUBPATTERN and not (
+            av[1] & sre_constants.SRE_FLAG_IGNORECASE
+        ):
+            # groups are always matched, so the literals carry on through them
+            run = _literals(av[-1], found, run)
+            continue
+        if run:
+            found.append("".join(run))
+        run = []
+    return run
+
+
+def prefilter(regex):
+    """returns the characters a match of the compiled regex can start with (None for any)
+    and the longest literal text any match has to contain ('' if there is none)"""
+    if regex.flags & re.IGNORECASE:
+        return None, ""
+    items = sre_parse.parse(regex.pattern, regex.flags)
+    chars, nullable = _first_chars(items)
+    if nullable:
+        chars = None
+    found = []
+    run = _literals(items, found, [])
+    if run:
+        found.append("".join(run))
+    return chars, max(found, key=len, default="")
+
+
+# fields every log line has, an Event keeps them in slots
+EVENT_FIELDS = (
+    "level",
+    "thread_name",
+    "thread_id",
+    "date",
+    "source_file",
+    "source_line",
+    "message",
+    "event_product",
+    "event_category",
+    "event_type",
+)
+_EVENT_SLOTS = frozenset(EVENT_FIELDS)
+_common_fields = operator.itemgetter(*EVENT_FIELDS)
+_common_values = operator.attrgetter(*EVENT_FIELDS)
+
+
+class Event:
+    """
+    A parsed log line that reads like the dict it replaces. The fields every line has are
+    kept in slots, the fields of a message in a dict only made for lines that have any,
+    so an event takes far less memory than a dict with the same fields. A field that was
+    never set is missing, a field set to None is not.
+    """
+
+    __slots__ = EVENT_FIELDS + ("extra",)
+
+    def __init__(self, fields=None):
+        extra = None
+        if fields:
+            for key, value in fields.items():
+                if key in _EVENT_SLOTS:
+                    setattr(self, key, value)
+                elif extra is None:
+                    extra = {key: value}
+                else:
+                    extra[key] = value
+        self.extra = extra
+
+    @classmethod
+    def compact(cls, fields):
+        """an event from the fields parsed from a line, interning the repeated ones.
+        Lines with every common field are copied in a single pass"""
+        try:
+            values = _common_fields(fields)
+        except KeyError:
+            # rows of the StatusLogger tables and the like
+            return cls(fields)
+        extra = None
+        if len(fields) > len(EVENT_FIELDS):
+            extra = {
+                key: value for key, value in fields.items() if key not in _EVENT_SLOTS
+            }
+        event = _with_common(cls.__new__(cls), values, extra)
+        if event.level:
+            event.level = sys.intern(event.level)
+        if event.thread_name:
+            event.thread_name = sys.intern(event.thread_name)
+        if event.source_file:
+            event.source_file = sys.intern(event.source_file)
+        return event
+
+    def __getitem__(self, key):
+        if key in _EVENT_SLOTS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self.extra is None:
+            raise KeyError(key)
+        return self.extra[key]
+
+    def __setitem__(self, key, value):
+        if key in _EVENT_SLOTS:
+            setattr(self, key, value)
+        elif self.extra is None:
+            self.extra = {key: value}
+        else:
+            self.extra[key] = value
+
+    def __contains__(self, key):
+        if key in _EVENT_SLOTS:
+            return hasattr(self, key)
+        return self.extra is not None and key in self.extra
+
+    def get(self, key, default=None):
+        """the field or default when it is missing"""
+        if key in _EVENT_SLOTS:
+            return getattr(self, key, default)
+        if self.extra is None:
+            return default
+        return self.extra.get(key, default)
+
+    def update(self, fields):
+        """sets the fields of a dict or another event"""
+        for key, value in fields.items():
+            self[key] = value
+
+    def keys(self):
+        """names of the fields that are set"""
+        return [key for key, _ in self.items()]
+
+    def values(self):
+        """values of the fields that are set"""
+        return [value for _, value in self.items()]
+
+    def items(self):
+        """(name, value) of the fields that are set"""
+        try:
+            items = list(zip(EVENT_FIELDS, _common_values(self)))
+        except AttributeError:
+            items = [
+                (key, getattr(self, key)) for key in EVENT_FIELDS if hasattr(self, key)
+            ]
+        if self.extra:
+            items.extend(self.extra.items())
+        return items
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, (Event, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    __hash__ = None
+
+    def __reduce__(self):
+        # events cross from the worker processes, a tuple pickles faster than the slots
+        try:
+            return _unpickle_event, (_common_values(self), self.extra)
+        except AttributeError:
+            return Event, (dict(self.items()),)
+
+    def __repr__(self):
+        return "Event(%r)" % dict(self.items())
+
+
+def _with_common(event, values, extra):
+    """sets every common field of the event from values, in EVENT_FIELDS order"""
+    (
+        event.level,
+        event.thread_name,
+        event.thread_id,
+        event.date,
+        event.source_file,
+        event.source_line,
+        event.message,
+        event.event_product,
+        event.event_category,
+        event.event_type,
+    ) = values
+    event.extra = extra
+    return event
+
+
+def _unpickle_event(values, extra):
+    return _with_common(Event.__new__(Event), values, extra)
+
+
 class capture:
     """
     Matches the input string against one or more regular expressions and returns a dictionary of
     values captured by regex's named capture groups. Returns None if none of the regular expressions
     match the input string. Returns an empty dict if the regular expression doesn't contains any
     named capture groups.
+
+    Each regular expression is only tried when the first character of the input string can
+    start a match and the input string contains the literal text every match contains.
     """
 
-    def __init__(self, *regex_strings):
-        "Constructor expects a list of one or more regular expression strings."
+    def __init__(self, *regex_strings, combined=False):
+        """
+        Constructor expects a list of one or more regular expression strings. With combined
+        set the regexes that can match a line are merged into one alternation so a line
+        is matched with a single call.
+        """
         self.regexes = []
         for regex in regex_strings:
             self.regexes.append(re.compile(regex))
+        filters = [prefilter(regex) for regex in self.regexes]
+        if combined:
+            filters = [(chars, "") for chars, _ in filters]
+        # regexes that can start with any character, for first characters not indexed
+        self.any_first = []
+        for regex, (chars, literal) in zip(self.regexes, filters):
+            if chars is None:
+                self.any_first.append((regex, literal))
+        self.by_first = {}
+        for char in set().union(*[f[0] for f in filters if f[0] is not None]):
+            self.by_first[char] = [
+                (regex, literal)
+                for regex, (chars, literal) in zip(self.regexes, filters)
+                if chars is None or char in chars
+            ]
+        if combined:
+            merged = {}
+            self.any_first = _combine(self.any_first, merged)
+            for char, candidates in self.by_first.items():
+                self.by_first[char] = _combine(candidates, merged)
 
     def __call__(self, string):
-        for regex in self.regexes:
+        for regex, literal in self.by_first.get(string[:1], self.any_first):
+            if literal not in string:
+                continue
             cap = regex.match(string)
             if cap:
                 return cap.groupdict()
         return None
 
 
+class _branches:
+    """
+    Alternation of several regexes, each wrapped in its own group with its capture groups
+    renamed so they are unique. Quacks like a compiled regex for capture, match returns
+    the groups of the branch that matched under their original names.
+    """
+
+    def __init__(self, regexes):
+        parts = []
+        self.fields = {}
+        for i, regex in enumerate(regexes):
+            prefix = "b%i_" % i
+            pattern = re.sub(
+                r"(?<!\\)\(\?P([<=])(\w+)",
+                lambda m, p=prefix: "(?P%s%s%s" % (m.group(1), p, m.group(2)),
+                regex.pattern,
+            )
+            names = sorted(regex.groupindex, key=regex.groupindex.get)
+            self.fields["b%i" % i] = (names, [prefix + name for name in names])
+            parts.append("(?P<b%i>%s)" % (i, pattern))
+        self.regex = re.compile("|".join(parts))
+
+    def match(self, string):
+        found = self.regex.match(string)
+        if found is None:
+            return None
+        names, groups = self.fields[found.lastgroup]
+        if not groups:
+            return _Groups()
+        if len(groups) == 1:
+            return _Groups({names[0]: found.group(groups[0])})
+        return _Groups(zip(names, found.group(*groups)))
+
+
+class _Groups(dict):
+    """the named groups of a match"""
+
+    def groupdict(self):
+        return self
+
+
+def _combine(candidates, merged):
+    """merges the candidate regexes into one, sharing the result across identical
+    lists of candidates. Regexes with flags are not merged"""
+    regexes = tuple(regex for regex, _ in candidates)
+    if len(regexes) < 2 or any(regex.flags & ~re.UNICODE for regex in regexes):
+        return candidates
+    if regexes not in merged:
+        try:
+            merged[regexes] = [(_branches(regexes), "")]
+        except re.error:
+            merged[regexes] = candidates
+    return merged[regexes]
+
+
 class convert:
     """
     Applies the specified conversion function against each of the named fields in the input dictionary.
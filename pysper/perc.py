@@ -13,6 +13,10 @@
 # limitations under the License.
 """percentile implementations"""
 
+import math
+from array import array
+from collections import Counter
+
 
 class Stats:
     """Stats is an array wrapper that provides min, max and percentiles"""
@@ -32,3 +36,151 @@ class Stats:
     def percentile(self, percentile):
         """provides a naive implemenation of percentiles"""
         return self.data[int(len(self.data) * (percentile / 100.0))]
+
+
+# distinct values a Sketch counts exactly before it switches to buckets
+EXACT_LIMIT = 4096
+
+
+class Sketch:
+    """mergeable streaming replacement for Stats. Values are counted exactly until
+    there are more than exact_limit distinct ones, which gives the same percentiles
+    as Stats. After that they are counted in logarithmic buckets (DDSketch) so memory
+    only grows with the log of the value range and every percentile is within
+    relative_accuracy of the value Stats would report, e.g. a p99 of 200ms with the
+    default 1% is reported between 198ms and 202ms. min and max are always exact"""
+
+    def __init__(self, relative_accuracy=0.01, exact_limit=EXACT_LIMIT):
+        self.relative_accuracy = relative_accuracy
+        self.exact_limit = exact_limit
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        # value -> count, None once the sketch has switched to buckets
+        self.exact = {}
+        # bucket index -> count, negative values are bucketed by their magnitude
+        self.positive = {}
+        self.negative = {}
+        self.zeros = 0
+        self.count = 0
+        self.low = None
+        self.high = None
+
+    def __len__(self):
+        return self.count
+
+    def add(self, value, count=1):
+        """adds value count times"""
+        self.count += count
+        if self.low is None or value < self.low:
+            self.low = value
+        if self.high is None or value > self.high:
+            self.high = value
+        if self.exact is None:
+            self._add_bucket(value, count)
+            return
+        self.exact[value] = self.exact.get(value, 0) + count
+        if len(self.exact) > self.exact_limit:
+            self._to_buckets()
+
+    def extend(self, values):
+        """adds every value"""
+        for value in values:
+            self.add(value)
+
+    def _add_bucket(self, value, count):
+        if value > 0:
+            key = math.ceil(math.log(value) / self.log_gamma)
+            self.positive[key] = self.positive.get(key, 0) + count
+        elif value < 0:
+            key = math.ceil(math.log(-value) / self.log_gamma)
+            self.negative[key] = self.negative.get(key, 0) + count
+        else:
+            self.zeros += count
+
+    def _to_buckets(self):
+        exact, self.exact = self.exact, None
+        for value, count in exact.items():
+            self._add_bucket(value, count)
+
+    def merge(self, other):
+        """adds every value counted by other"""
+        if not other.count:
+            return
+        if self.gamma != other.gamma:
+            raise ValueError("cannot merge sketches with different accuracy")
+        self.count += other.count
+        if self.low is None or other.low < self.low:
+            self.low = other.low
+        if self.high is None or other.high > self.high:
+            self.high = other.high
+        if self.exact is not None and other.exact is not None:
+            for value, count in other.exact.items():
+                self.exact[value] = self.exact.get(value, 0) + count
+            if len(self.exact) > self.exact_limit:
+                self._to_buckets()
+            return
+        if self.exact is not None:
+            self._to_buckets()
+        if other.exact is not None:
+            for value, count in other.exact.items():
+                self._add_bucket(value, count)
+            return
+        for key, count in other.positive.items():
+            self.positive[key] = self.positive.get(key, 0) + count
+        for key, count in other.negative.items():
+            self.negative[key] = self.negative.get(key, 0) + count
+        self.zeros += other.zeros
+
+    def _value(self, key):
+        """the value a bucket reports, no more than relative_accuracy from any value in it"""
+        return 2 * self.gamma**key / (self.gamma + 1)
+
+    def _ascending(self):
+        """value and count pairs from smallest to largest"""
+        if self.exact is not None:
+            for value in sorted(self.exact):
+                yield value, self.exact[value]
+            return
+        for key in sorted(self.negative, reverse=True):
+            yield -self._value(key), self.negative[key]
+        if self.zeros:
+            yield 0, self.zeros
+        for key in sorted(self.positive):
+            yield self._value(key), self.positive[key]
+
+    def max(self):
+        """max gets the largest element"""
+        if not self.count:
+            raise IndexError("empty sketch")
+        return self.high
+
+    def min(self):
+        """min gets the smallest element"""
+        if not self.count:
+            raise IndexError("empty sketch")
+        return self.low
+
+    def percentile(self, percentile):
+        """same rank as Stats.percentile"""
+        rank = int(self.count * (percentile / 100.0))
+        if rank >= self.count:
+            raise IndexError("percentile out of range")
+        seen = 0
+        for value, count in self._ascending():
+            seen += count
+            if seen > rank:
+                return min(max(value, self.low), self.high)
+        raise IndexError("percentile out of range")
+
+
+def stats(data):
+    """a sketch is used as is, typed arrays are counted into a sketch instead of
+    being sorted into a list of boxed values, anything else is sorted into Stats"""
+    if isinstance(data, Sketch):
+        return data
+    if isinstance(data, array):
+        sketch = Sketch()
+        for value, count in Counter(data).items():
+            sketch.add(value, count)
+        return sketch
+    return Stats(data)
@@ -18,8 +18,12 @@ import os
 import sys
 from collections import OrderedDict
 from operator import attrgetter, itemgetter
-from pysper import dates, diag, parser, util, humanize, recs
-from pysper.core import OrderedDefaultDict
+from pysper import archive, dates, diag, parser, util, humanize, recs
+from pysper.parser.cases import solr_rules
+from pysper.parser.rules import source_filter
+
+# only the solr rules produce the events used here
+keep_line = source_filter(solr_rules)
 
 
 def sort_evict_freq(first_block, second_block):
@@ -172,6 +176,30 @@ def calculate_eviction_stats(raw_events, after_time, before_time):
     return (item_eviction_stats, bytes_eviction_stats)
 
 
+def parse_evictions(log, after_time, before_time):
+    """parses the eviction stats and log range of a single log, can run in a worker process"""
+    archived = archive.is_archived(log)
+    if not archived:
+        start_log_time, last_log_time = diag.log_range(log)
+    with diag.FileWithProgress(log) as log_file:
+        # a compressed log is only read once, its range is noted on the way
+        lines = diag.LineRange(log_file) if archived else log_file
+        # the filter cache events are all kept until the log is read
+        raw_events = parser.read_system_log(filter(keep_line, lines), compact=True)
+        item_ev_stats, bytes_ev_stats = calculate_eviction_stats(
+            raw_events, after_time, before_time
+        )
+    if archived:
+        start_log_time, last_log_time = lines.range()
+    return OrderedDict(
+        [
+            ("evictions", (bytes_ev_stats, item_ev_stats)),
+            ("start", start_log_time),
+            ("end", last_log_time),
+        ]
+    )
+
+
 def parse(args):
     """parse entry point, generates a report object
     from a tarball or series of files"""
@@ -184,21 +212,12 @@ def parse(args):
     node_stats = OrderedDict()
     after_time = dates.date_parse(args.after)
     before_time = dates.date_parse(args.before)
-    for log in logs:
-        start_log_time, last_log_time = diag.log_range(log)
-        with diag.FileWithProgress(log) as log_file:
-            raw_events = parser.read_system_log(log_file)
-            item_ev_stats, bytes_ev_stats = calculate_eviction_stats(
-                raw_events, after_time, before_time
-            )
-            node = util.extract_node_name(log, True)
-            node_stats[node] = OrderedDict(
-                [
-                    ("evictions", (bytes_ev_stats, item_ev_stats)),
-                    ("start", start_log_time),
-                    ("end", last_log_time),
-                ]
-            )
+    parse_file = functools.partial(
+        parse_evictions, after_time=after_time, before_time=before_time
+    )
+    for log, stats in zip(logs, diag.map_files(parse_file, logs)):
+        node = util.extract_node_name(log, True)
+        node_stats[node] = stats
     return OrderedDict(
         [
             ("nodes", node_stats),
@@ -280,33 +299,30 @@ class TimeSeries:
         table.append("")
         table.append("filter cache evictions by hour")
         table.append("------------------------------")
-        events_by_datetime = OrderedDefaultDict(list)
-        start = dates.max_utc_time()
-        end = dates.min_utc_time()
-        for node, events in parsed["nodes"].items():
-            for info in events.get("evictions"):
-                # put into structure we can use for bucketize
-                for value in info.values():
-                    if value.time_stamp > end:
-                        end = value.time_stamp
-                    if value.time_stamp < start:
-                        start = value.time_stamp
-                    events_by_datetime[value.time_stamp].append(value)
-        buckets = sorted(
-            util.bucketize(events_by_datetime, start, end, 3600).items(),
-            key=lambda t: t[0],
-        )
-        maxval = len(max(buckets, key=lambda t: len(t[1]))[1])
-        for time, matches in buckets:
+
+        def eviction_times():
+            for events in parsed["nodes"].values():
+                for info in events.get("evictions"):
+                    for value in info.values():
+                        yield value.time_stamp
+
+        start = min(eviction_times(), default=dates.max_utc_time())
+        end = max(eviction_times(), default=dates.min_utc_time())
+        buckets = util.Buckets(start, end, 3600)
+        for time in eviction_times():
+            buckets.add(time)
+        buckets = buckets.items()
+        maxval = max(count for _, count in buckets)
+        for time, count in buckets:
             pad = ""
-            for x in range(len(str(maxval)) - len(str(len(matches)))):
+            for x in range(len(str(maxval)) - len(str(count))):
                 pad += " "
             table.append(
                 "%s %s %s"
                 % (
                     time.strftime("%Y-%m-%d %H:%M:%S") + pad,
-                    len(matches),
-                    util.textbar(maxval, len(matches)),
+                    count,
+                    util.textbar(maxval, count),
                 )
             )
         return "\n".join(table)
@@ -18,6 +18,8 @@ import math
 from collections import namedtuple, OrderedDict
 from operator import attrgetter
 from pysper import diag, util, parser
+from pysper.parser.cases import solr_rules
+from pysper.parser.rules import source_filter
 
 # QueryParams raw detail for query
 QueryParams = namedtuple(
@@ -43,21 +45,17 @@ Reason = namedtuple("Reason", ["text", "score"])
 Parsed = namedtuple("Parsed", "queries top_n_worst unique_reasons score_threshold")
 
 
+# only the solr rules produce the events used here
+keep_line = source_filter(solr_rules)
+
+
 def parse(args):
     """reads the args used in the command to determine what to parse
     and how to parse it. The returned object should be suitable for a report"""
     files = diag.find_files(args, args.log_prefix)
     queries = []
-    for filename in files:
-        with diag.FileWithProgress(filename) as log_file:
-            events = parser.read_system_log(log_file)
-            for event in events:
-                if (
-                    event.get("event_type", "") == "query_logs"
-                    and event.get("event_product", "") == "solr"
-                    and event.get("event_category", "") == "query_component"
-                ):
-                    queries.append(parse_event(event))
+    for file_queries in diag.map_files(parse_queries, files):
+        queries.extend(file_queries)
     return Parsed(
         queries=queries,
         top_n_worst=args.top,
@@ -66,6 +64,21 @@ def parse(args):
     )
 
 
+def parse_queries(filename):
+    """returns the solr queries found in a single log, can run in a worker process"""
+    queries = []
+    with diag.FileWithProgress(filename) as log_file:
+        events = parser.read_system_log(filter(keep_line, log_file))
+        for event in events:
+            if (
+                event.get("event_type", "") == "query_logs"
+                and event.get("event_product", "") == "solr"
+                and event.get("event_category", "") == "query_component"
+            ):
+                queries.append(parse_event(event))
+    return queries
+
+
 def parse_event(event):
     """parse the query"""
     query = event.get("query", "")
@@ -21,7 +21,6 @@ import re
 from pysper import humanize
 from pysper.core.diag import parse_diag
 from pysper import diag, env
-from pysper import parser, util
 from pysper.core.diag.reporter import (
     format_gc,
     format_table_stat,
@@ -62,15 +61,21 @@ class PendingCoreMeasurement:
 
 def parse(args):
     """read diag tarball"""
-    res = parse_diag(args, lambda n: [calculate(n)])
+    system_logs = diag.find_logs(args.diag_dir, args.system_log_prefix)
     # use debug logs for statuslogger output on 5.1.17+, 6.0.10+, 6.7.5+ and 6.8+
     debug_logs = diag.find_logs(args.diag_dir, args.debug_log_prefix)
+    rec_events = RecommendationEvents(files=system_logs + debug_logs)
+    # the system logs are read once and shared with the recommendation events
+    res = parse_diag(args, lambda n: [calculate(n)], subscribers=[rec_events])
+    warnings = res.get("warnings")
+    warnings.extend(diag.EventStream(subscribers=[rec_events]).run(debug_logs))
     parsed = OrderedDict()
     parsed["diag_dir"] = args.diag_dir
-    parsed["warnings"] = res.get("warnings")
+    parsed["warnings"] = warnings
     parsed["configs"] = res.get("original_configs")
     parsed["summary"] = res.get("configs")[0]
     parsed["rec_logs"] = res.get("system_logs") + debug_logs
+    parsed["rec_events"] = rec_events
     parsed["jvm_args"] = collect_gc_args(res)
     return parsed
 
@@ -247,6 +252,133 @@ def _status_logger_counter(event, counter):
             counter.blocked += 1
 
 
+class RecommendationEvents:
+    """event stream subscriber that collects everything the recommendations are
+    based on from the system and debug logs. Duplicate events found on the same node
+    in different logs are only counted once, passing in all the files up front keeps
+    the duplicate check to the times where the files overlap"""
+
+    tpc_event_types = ["6.8", "new"]
+    pool_name_pattern = re.compile(r"TPC\/(?P<core>[0-9]+)$")
+
+    def __init__(self, files=None):
+        self.tombstone_errors = 0
+        self.tombstone_warns = 0
+        # we do not know the gc target until the configuration is read so keep the pauses
+        self.gc_pauses = []
+        self.counter = StatusLoggerCounter()
+        self.solr_index_backoff = OrderedDict()
+        self.solr_index_restore = OrderedDict()
+        self.zero_copy_errors = 0
+        self.drops_remote_only = 0
+        self.rejected = 0
+        self.drop_sums = 0
+        self.drop_types = set()
+        self.bp = BackpressureStats(local_backpressure_active={}, per_core_bp={})
+        self.core_balance = {}
+        self.event_filter = diag.UniqEventPerNodeFilter(files=files)
+        self.statuslogger_fixer = None
+        self.node = None
+
+    def gc_over_target(self, gc_target):
+        """number of gc pauses that were over the gc_target"""
+        return len([pause for pause in self.gc_pauses if pause > gc_target])
+
+    def set_file(self, node, filepath):
+        """each new file gets a new statuslogger fixer"""
+        self.node = node
+        self.event_filter.set_file(node, filepath)
+        self.statuslogger_fixer = diag.UnknownStatusLoggerWriter()
+
+    def add(self, event):
+        """counts the event if it is useful for recommendations"""
+        if self.event_filter.is_duplicate(event):
+            return
+        node = self.node
+        # statuslogger_fixer.check(event) HAS to run first before any code below or statuslogger events will get tossed.
+        self.statuslogger_fixer.check(event)
+        event_type = event.get("event_type")
+        event_category = event.get("event_category")
+        event_product = event.get("event_product")
+        rule_type = event.get("rule_type")
+        if event_type == "unknown":
+            return
+        if event_type == "pause" and event_category == "garbage_collection":
+            self.gc_pauses.append(event.get("duration"))
+        elif event_product == "tombstone":
+            if event_type == "scan_error":
+                self.tombstone_errors += event.get("tombstones")
+            elif event_type == "tpc_scan_warn" or event_type == "seda_scan_warn":
+                self.tombstone_warns += event.get("tombstones")
+        elif event_type == "threadpool_status" and rule_type in self.tpc_event_types:
+            pool_name = event.get("pool_name")
+            if env.DEBUG:
+                print("detected pool name is %s" % pool_name)
+            match = self.pool_name_pattern.match(pool_name)
+            if match:
+                core = int(match.group(1))
+                if env.DEBUG:
+                    print("detected core is %i" % core)
+                pending = event.get("pending")
+                if node in self.core_balance:
+                    self.core_balance[node].append(
+                        PendingCoreMeasurement(core, pending)
+                    )
+                else:
+                    self.core_balance[node] = [PendingCoreMeasurement(core, pending)]
+        elif (
+            event_category == "streaming"
+            and event_product == "zcs"
+            and event_type == "bloom_filter"
+        ):
+            self.zero_copy_errors += 1
+        elif event_type == "core_backpressure":
+            if node in self.bp.per_core_bp.keys():
+                self.bp.per_core_bp[node].cores.append(event.get("core_num"))
+                self.bp.per_core_bp[node].total_bp_events += 1
+            else:
+                self.bp.per_core_bp[node] = CoreBackpressureStats(
+                    cores=[event.get("core_num")], total_bp_events=1
+                )
+        elif event_type == "core_backpressure_local":
+            if node in self.bp.local_backpressure_active:
+                self.bp.local_backpressure_active[node] += 1
+            else:
+                self.bp.local_backpressure_active[node] = 1
+        elif event_category == "indexing":
+            core_name = event.get("core_name")
+            d = event.get("date")
+            if event.get("event_type") == "increase_soft_commit":
+                if core_name in self.solr_index_backoff:
+                    self.solr_index_backoff[core_name]["count"] += 1
+                    self.solr_index_backoff[core_name]["dates"].append(d)
+                else:
+                    self.solr_index_backoff[core_name] = {
+                        "count": 1,
+                        "dates": [event.get("date")],
+                    }
+            elif event_type == "restore_soft_commit":
+                if core_name in self.solr_index_restore:
+                    self.solr_index_restore[core_name]["count"] += 1
+                    self.solr_index_restore[core_name]["dates"].append(d)
+                else:
+                    self.solr_index_restore[core_name] = {
+                        "count": 1,
+                        "dates": [event.get("date")],
+                    }
+        elif event_type == "network_backpressure":
+            self.rejected += event.get("total_dropped")
+        elif event_type == "drops":
+            local = event.get("localCount")
+            remote = event.get("remoteCount")
+            drop_type = event.get("messageType")
+            self.drop_types.add(drop_type)
+            self.drop_sums += local + remote
+            if remote > 0 and local == 0:
+                self.drops_remote_only += 1
+        _status_logger_counter(event, self.counter)
+
+
 def generate_recommendations(parsed):
     """generate recommendations off the parsed data"""
     gc_target = 0
@@ -277,142 +409,32 @@ def generate_recommendations(parsed):
             "WARN cannot find -XX:MaxGCPauseMillis in the logs setting common default of 500ms"
         )
         gc_target = 500
-    tombstone_errors = 0
-    tombstone_warns = 0
-    gc_over_target = 0
-    counter = StatusLoggerCounter()
-    solr_index_backoff = OrderedDict()
-    solr_index_restore = OrderedDict()
-    zero_copy_errors = 0
-    drops_remote_only = 0
-    rejected = 0
-    drop_sums = 0
-    drop_types = set()
-    event_filter = diag.UniqEventPerNodeFilter()
-    bp = BackpressureStats(local_backpressure_active={}, per_core_bp={})
-    core_balance = {}
-    tpc_event_types = ["6.8", "new"]
-    pool_name_pattern = re.compile(r"TPC\/(?P<core>[0-9]+)$")
-    for rec_log in parsed["rec_logs"]:
-        node = util.extract_node_name(rec_log)
-        event_filter.set_node(node)
-        with diag.FileWithProgress(rec_log) as rec_log_file:
-            if rec_log_file.error:
-                parsed["warnings"].append(
-                    "%s failed with error %s" % (rec_log, rec_log_file.error)
-                )
-            else:
-                statuslogger_fixer = diag.UnknownStatusLoggerWriter()
-                if env.DEBUG:
-                    print("parsing", rec_log_file.filepath)
-                events = parser.read_system_log(rec_log_file)
-                for event in [e for e in events if not event_filter.is_duplicate(e)]:
-                    # statuslogger_fixer.check(event) HAS to run first before any code below or statuslogger events will get tossed.
-                    statuslogger_fixer.check(event)
-                    event_type = event.get("event_type")
-                    event_category = event.get("event_category")
-                    event_product = event.get("event_product")
-                    rule_type = event.get("rule_type")
-                    if event_type == "unknown":
-                        continue
-                    if event_type == "pause" and event_category == "garbage_collection":
-                        if event.get("duration") > gc_target:
-                            gc_over_target += 1
-                    elif event_product == "tombstone":
-                        if event_type == "scan_error":
-                            tombstone_errors += event.get("tombstones")
-                        elif (
-                            event_type == "tpc_scan_warn"
-                            or event_type == "seda_scan_warn"
-                        ):
-                            tombstone_warns += event.get("tombstones")
-                    elif (
-                        event_type == "threadpool_status"
-                        and rule_type in tpc_event_types
-                    ):
-                        pool_name = event.get("pool_name")
-                        if env.DEBUG:
-                            print("detected pool name is %s" % pool_name)
-                        match = pool_name_pattern.match(pool_name)
-                        if match:
-                            core = int(match.group(1))
-                            if env.DEBUG:
-                                print("detected core is %i" % core)
-                            pending = event.get("pending")
-                            if node in core_balance:
-                                core_balance[node].append(
-                                    PendingCoreMeasurement(core, pending)
-                                )
-                            else:
-                                core_balance[node] = [
-                                    PendingCoreMeasurement(core, pending)
-                                ]
-                    elif (
-                        event_category == "streaming"
-                        and event_product == "zcs"
-                        and event_type == "bloom_filter"
-                    ):
-                        zero_copy_errors += 1
-                    elif event_type == "core_backpressure":
-                        if node in bp.per_core_bp.keys():
-                            bp.per_core_bp[node].cores.append(event.get("core_num"))
-                            bp.per_core_bp[node].total_bp_events += 1
-                        else:
-                            bp.per_core_bp[node] = CoreBackpressureStats(
-                                cores=[event.get("core_num")], total_bp_events=1
-                            )
-                    elif event_type == "core_backpressure_local":
-                        if node in bp.local_backpressure_active:
-                            bp.local_backpressure_active[node] += 1
-                        else:
-                            bp.local_backpressure_active[node] = 1
-                    elif event_category == "indexing":
-                        core_name = event.get("core_name")
-                        d = event.get("date")
-                        if event.get("event_type") == "increase_soft_commit":
-                            if core_name in solr_index_backoff:
-                                solr_index_backoff[core_name]["count"] += 1
-                                solr_index_backoff[core_name]["dates"].append(d)
-                            else:
-                                solr_index_backoff[core_name] = {
-                                    "count": 1,
-                                    "dates": [event.get("date")],
-                                }
-                        elif event_type == "restore_soft_commit":
-                            if core_name in solr_index_restore:
-                                solr_index_restore[core_name]["count"] += 1
-                                solr_index_restore[core_name]["dates"].append(d)
-                            else:
-                                solr_index_restore[core_name] = {
-                                    "count": 1,
-                                    "dates": [event.get("date")],
-                                }
-                    elif event_type == "network_backpressure":
-                        rejected += event.get("total_dropped")
-                    elif event_type == "drops":
-                        local = event.get("localCount")
-                        remote = event.get("remoteCount")
-                        drop_type = event.get("messageType")
-                        drop_types.add(drop_type)
-                        drop_sums += local + remote
-                        if remote > 0 and local == 0:
-                            drops_remote_only += 1
-                    _status_logger_counter(event, counter)
+    rec_events = parsed.get("rec_events")
+    if rec_events is None:
+        rec_events = RecommendationEvents(files=parsed["rec_logs"])
+        parsed["warnings"].extend(
+            diag.EventStream(subscribers=[rec_events]).run(parsed["rec_logs"])
+        )
+    gc_over_target = rec_events.gc_over_target(gc_target)
     recommendations = []
-    _recs_on_stages(recommendations, gc_over_target, gc_target, counter)
+    _recs_on_stages(recommendations, gc_over_target, gc_target, rec_events.counter)
     _recs_on_configs(recommendations, parsed["configs"])
-    _recs_on_solr(recommendations, solr_index_backoff, solr_index_restore)
+    _recs_on_solr(
+        recommendations, rec_events.solr_index_backoff, rec_events.solr_index_restore
+    )
     _recs_on_drops(
         recommendations,
-        drops_remote_only,
-        sorted(list(drop_types), reverse=True),
-        drop_sums,
+        rec_events.drops_remote_only,
+        sorted(list(rec_events.drop_types), reverse=True),
+        rec_events.drop_sums,
+    )
+    _recs_on_zero_copy(recommendations, rec_events.zero_copy_errors)
+    _recs_on_rejects(recommendations, rec_events.rejected)
+    _recs_on_bp(recommendations, rec_events.bp, gc_over_target)
+    _recs_on_core_balance(recommendations, rec_events.core_balance)
+    _recs_on_tombstones(
+        recommendations, rec_events.tombstone_errors, rec_events.tombstone_warns
     )
-    _recs_on_zero_copy(recommendations, zero_copy_errors)
-    _recs_on_rejects(recommendations, rejected)
-    _recs_on_bp(recommendations, bp, gc_over_target)
-    _recs_on_core_balance(recommendations, core_balance)
-    _recs_on_tombstones(recommendations, tombstone_errors, tombstone_warns)
     return recommendations
 
 
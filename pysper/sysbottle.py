@@ -17,7 +17,7 @@
 from datetime import datetime
 from collections import OrderedDict
 from pysper.core import OrderedDefaultDict
-from pysper import VERSION, env, humanize, diag
+from pysper import VERSION, env, humanize, diag, perc
 from pysper.util import get_percentiles, get_percentile_headers
 
 
@@ -115,8 +115,8 @@ class SysbottleReport:
         self.count = 0
         self.cpu_exceeded = 0
         self.iowait_exceeded = 0
-        self.devices = OrderedDefaultDict(lambda: OrderedDefaultDict(list))
-        self.cpu_stats = OrderedDefaultDict(list)
+        self.devices = OrderedDefaultDict(lambda: OrderedDefaultDict(perc.Sketch))
+        self.cpu_stats = OrderedDefaultDict(perc.Sketch)
         self.queuedepth = OrderedDefaultDict(int)
         self.start = None
         self.end = None
@@ -166,7 +166,7 @@ class SysbottleReport:
             if self.__want_disk(disk):
                 for col in self.device_index:
                     val = values[self.device_index[col]]
-                    self.devices[disk][col].append(val)
+                    self.devices[disk][col].add(val)
                     if "qu" in col and val >= self.conf["queue_threshold"]:
                         self.queuedepth[disk] += 1
                         self.recs.add("* decrease activity on %s" % disk)
@@ -175,13 +175,13 @@ class SysbottleReport:
         total = 0
         for cpu in ["system", "user", "nice", "steal"]:
             total += stat["cpu"]["stat"][self.cpu_index["%" + cpu]]
-        self.cpu_stats["total"].append(total)
+        self.cpu_stats["total"].add(total)
         if total > self.conf["cpu_threshold"]:
             self.cpu_exceeded += 1
             self.recs.add("* tune for less CPU usage")
         for col in self.cpu_index:
             val = stat["cpu"]["stat"][self.cpu_index[col]]
-            self.cpu_stats[col].append(val)
+            self.cpu_stats[col].add(val)
         if (
             stat["cpu"]["stat"][self.cpu_index["%iowait"]]
             > self.conf["iowait_threshold"]
@@ -15,8 +15,6 @@
 """pysper utilities"""
 
 import os
-import itertools
-import bisect
 import datetime
 from collections import OrderedDict
 from pysper import perc
@@ -33,8 +31,8 @@ def print_percentiles(
     reverse=False,
     percentiles=(99, 75, 50, 25),
 ):
-    """prints formatted percentiles using numpy from data in a list"""
-    np_array = perc.Stats(data_list)
+    """prints formatted percentiles using numpy from data in a list or a sketch"""
+    np_array = perc.stats(data_list)
     printables = [label.ljust(indent)]
     if pmax:
         printables.append((strformat % np_array.max()).ljust(width))
@@ -66,8 +64,8 @@ def get_percentiles(
     reverse=False,
     percentiles=(99, 75, 50, 25),
 ):
-    """gets formatted percentiles using numpy from data in a list"""
-    np_array = perc.Stats(data_list)
+    """gets formatted percentiles using numpy from data in a list or a sketch"""
+    np_array = perc.stats(data_list)
     printables = [label]
     if pmax:
         printables.append((strformat % np_array.max()))
@@ -106,6 +104,94 @@ def extract_node_name(path, ignore_missing_nodes=False):
         raise "there is nothing after the 'nodes' entry of '%s'" % path
 
 
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def _add_list(values, value, weight):
+    values.extend([value] * weight)
+    return values
+
+
+def _add_sketch(sketch, value, weight):
+    sketch.add(value, weight)
+    return sketch
+
+
+# name -> (empty bucket, function folding a weighted value into a bucket)
+REDUCERS = {
+    "count": (int, lambda count, value, weight: count + weight),
+    "sum": (int, lambda total, value, weight: total + value * weight),
+    "max": (
+        lambda: None,
+        lambda m, value, weight: value if m is None else max(m, value),
+    ),
+    "sketch": (perc.Sketch, _add_sketch),
+    "list": (list, _add_list),
+}
+
+
+class Buckets:
+    """time buckets of seconds counted from start. The bucket of a time is worked out
+    from its offset to start so times can be added in any order without sorting, and
+    each bucket only keeps what the reducer needs: a count, a sum, a max, a sketch or
+    the list of values. Times after end go into the last bucket, times before start
+    into the first"""
+
+    def __init__(self, start, end=None, seconds=3600, reducer="count"):
+        if start is None:
+            raise ValueError("pysper.util.Buckets cannot work without a start time")
+        self.start = start
+        self.seconds = seconds
+        self.last = None
+        if end is not None:
+            self.last = max(int((end - start).total_seconds() // seconds), 0)
+        self.reducer = reducer
+        self.empty, self.fold = REDUCERS[reducer]
+        self.buckets = {}
+
+    def __getstate__(self):
+        # the reducers are looked up again by name, some are lambdas
+        state = dict(self.__dict__)
+        del state["empty"]
+        del state["fold"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.empty, self.fold = REDUCERS[self.reducer]
+
+    def add(self, time, value=1, weight=1):
+        """adds value to the bucket of time, weight times"""
+        index = max(int((time - self.start).total_seconds() // self.seconds), 0)
+        if self.last is not None and index > self.last:
+            index = self.last
+        bucket = self.buckets.get(index)
+        if bucket is None:
+            bucket = self.empty()
+        self.buckets[index] = self.fold(bucket, value, weight)
+
+    def time(self, index):
+        """start time of the bucket"""
+        return self.start + datetime.timedelta(seconds=index * self.seconds)
+
+    def items(self, sparse=False):
+        """sorted (bucket start, reduced value) pairs including the empty buckets, from
+        start to end or without an end from the first to the last bucket added to.
+        With sparse only the buckets that were added to"""
+        if sparse:
+            indexes = sorted(self.buckets)
+        elif self.last is not None:
+            indexes = range(self.last + 1)
+        else:
+            indexes = range(
+                min(self.buckets, default=0), max(self.buckets, default=-1) + 1
+            )
+        return [
+            (self.time(i), self.buckets[i] if i in self.buckets else self.empty())
+            for i in indexes
+        ]
+
+
 def bucketize(data, start, end, seconds=3600):
     """split the data into time-based buckets determined by seconds.
     Expects data to be a dict of datetime keys with list values"""
@@ -113,20 +199,12 @@ def bucketize(data, start, end, seconds=3600):
         raise ValueError("pysper.util.bucketize cannot work without a start time")
     if end is None:
         raise ValueError("pysper.util.bucketize cannot work without an end time")
-    interval = datetime.timedelta(seconds=seconds)
-    numbuckets = int((end - start).total_seconds() / seconds)
-    # a calendar of sorts, made up of the desired intervals
-    grid = [start + n * interval for n in range(numbuckets + 1)]
-    if not grid:
-        # bucket too big, throw everything in a single
-        return {start: list(itertools.chain.from_iterable(data.values()))}
-    # build with empty lists instead of defaultdict so we cover empty intervals
-    buckets = OrderedDict((time, []) for time in grid)
+    buckets = Buckets(start, end, seconds, reducer="list")
+    # timelines print the values of a bucket in time order
     for time, values in sorted(data.items(), key=lambda t: t[0]):
-        # find the closest period in the 'calendar' and put everything there
-        idx = bisect.bisect(grid, time)
-        buckets[grid[idx - 1]].extend(values)
-    return buckets
+        for value in values:
+            buckets.add(time, value)
+    return OrderedDict(buckets.items())
 
 
 def write_underline(s):
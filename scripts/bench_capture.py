@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# Copyright 2020 DataStax, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""bench_capture.py measures how many log lines per second the capture rules
+can match, trying every regex in order versus using the prefilter index and
+versus merging the regexes into one alternation (combined mode).
+Run from the root of the repo, optionally passing the log files to read"""
+
+import os
+import sys
+import glob
+import time
+import functools
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+
+from pysper.parser.rules import capture  # noqa: E402
+from pysper.parser.captures import (  # noqa: E402
+    system_capture_rule,
+    output_capture_rule,
+)
+
+
+def match_in_order(cap, string):
+    """how capture matched before the prefilter index"""
+    for regex in cap.regexes:
+        found = regex.match(string)
+        if found:
+            return found.groupdict()
+    return None
+
+
+def read_lines(files):
+    """all the lines of the files"""
+    lines = []
+    for filepath in files:
+        with open(filepath, encoding="utf-8", errors="replace") as log:
+            lines.extend(line.rstrip("\n") for line in log)
+    return lines
+
+
+def lines_per_sec(func, lines, rounds=3):
+    """best of a few rounds"""
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for line in lines:
+            func(line)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(lines) / best
+
+
+def main():
+    files = sys.argv[1:] or glob.glob(
+        os.path.join("tests", "testdata", "**", "*.log"), recursive=True
+    )
+    lines = read_lines(files)
+    print("%i lines from %i files" % (len(lines), len(files)))
+    for name, cap in (
+        ("system_capture_rule", system_capture_rule),
+        ("output_capture_rule", output_capture_rule),
+    ):
+        before = lines_per_sec(functools.partial(match_in_order, cap), lines)
+        after = lines_per_sec(cap, lines)
+        combined = capture(*[r.pattern for r in cap.regexes], combined=True)
+        merged = lines_per_sec(combined, lines)
+        print(
+            "%s: in order %.0f lines/sec, indexed %.0f lines/sec (%.2fx), "
+            "combined %.0f lines/sec (%.2fx)"
+            % (name, before, after, after / before, merged, merged / before)
+        )
+
+
+if __name__ == "__main__":
+    main()
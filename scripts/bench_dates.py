@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# Copyright 2020 DataStax, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""bench_dates.py measures how many log timestamps per second can be parsed.
+Pass a log file to use its timestamps, otherwise 1M timestamps are generated
+with bursts of lines in the same second like a busy system.log"""
+
+import os
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+
+from pysper.dates import LogDateFormatParser  # noqa: E402
+from pysper.parser.rules import date  # noqa: E402
+
+
+def generate(count, per_second=50):
+    """timestamps in the log format, per_second lines in each second"""
+    start = datetime(2020, 1, 1)
+    stamps = []
+    for i in range(count):
+        stamp = start + timedelta(
+            seconds=i // per_second, milliseconds=(i % per_second) * 7
+        )
+        stamps.append(stamp.strftime("%Y-%m-%d %H:%M:%S,%f")[:23])
+    return stamps
+
+
+def read_stamps(filepath):
+    """timestamps of the log lines in the file"""
+    stamp = re.compile(r".*?\] (?P<date>.{10} .{12})")
+    stamps = []
+    with open(filepath, encoding="utf-8", errors="replace") as log:
+        for line in log:
+            found = stamp.match(line)
+            if found:
+                stamps.append(found.group("date"))
+    return stamps
+
+
+def per_sec(func, stamps):
+    """timestamps parsed per second"""
+    start = time.perf_counter()
+    for stamp in stamps:
+        func(stamp)
+    return len(stamps) / (time.perf_counter() - start)
+
+
+def main():
+    stamps = read_stamps(sys.argv[1]) if len(sys.argv) > 1 else generate(1000000)
+    print("%i timestamps" % len(stamps))
+    new_each = per_sec(lambda stamp: date()(stamp), stamps)
+    print("new parser per line %.0f/sec" % new_each)
+    every_field = per_sec(LogDateFormatParser()._parse, stamps)
+    print("every field parsed %.0f/sec" % every_field)
+    cached = per_sec(date(), stamps)
+    print(
+        "reused parser with second cache %.0f/sec (%.2fx, %.2fx)"
+        % (cached, cached / new_each, cached / every_field)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# Copyright 2020 DataStax, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""bench_slowquery.py measures how fast the slow query parser reads a debug.log,
+trying every regex on every line versus dispatching on the line's literals.
+Pass a debug.log to read it, otherwise a synthetic one of --size MB (default 2048)
+is written to a temporary file, made of the debug.logs in tests/testdata"""
+
+import os
+import sys
+import glob
+import time
+import argparse
+import tempfile
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+
+from pysper.core.slowquery import SlowQueryParser  # noqa: E402
+from pysper.parser.rules import date  # noqa: E402
+
+
+def parse_in_order(parser, logfile):
+    """how SlowQueryParser.parse matched before dispatching on literals"""
+    block = OrderedDict()
+    parse_date = date()
+    for line in logfile:
+        m = parser.begin_match.match(line)
+        time_match = parser.begin_timed_out.match(line)
+        if m:
+            block["numslow"] = int(m.group("numslow"))
+            block["date"] = parse_date(m.group("date"))
+        elif time_match:
+            block["numslow"] = int(time_match.group("numslow"))
+            block["date"] = parse_date(time_match.group("date"))
+        else:
+            for match in [
+                parser.slow_match,
+                parser.fail_match,
+                parser.slow_match_multiple,
+                parser.fail_match_multiple,
+                parser.timed_out_match,
+            ]:
+                m = match.match(line)
+                if m:
+                    ret = OrderedDict(block)
+                    ret.update(m.groupdict())
+                    yield ret
+                    break
+
+
+def generate(filepath, size_mb):
+    """repeats the test debug.logs until the file is size_mb"""
+    sample = []
+    for source in glob.glob(
+        os.path.join("tests", "testdata", "**", "debug.log"), recursive=True
+    ):
+        with open(source, encoding="utf-8", errors="replace") as log:
+            sample.append(log.read())
+    chunk = "".join(sample).encode("utf-8")
+    with open(filepath, "wb") as log:
+        for _ in range(size_mb * 1024 * 1024 // len(chunk) + 1):
+            log.write(chunk)
+
+
+def timed(parse, filepath):
+    """queries found and MB read per second"""
+    start = time.perf_counter()
+    with open(filepath, encoding="utf-8", errors="replace") as log:
+        found = sum(1 for _ in parse(log))
+    elapsed = time.perf_counter() - start
+    return found, os.path.getsize(filepath) / 1024 / 1024 / elapsed, elapsed
+
+
+def main():
+    args = argparse.ArgumentParser(description=__doc__)
+    args.add_argument("debug_log", nargs="?")
+    args.add_argument("--size", type=int, default=2048, help="synthetic log MB")
+    opts = args.parse_args()
+    filepath = opts.debug_log
+    if not filepath:
+        handle, filepath = tempfile.mkstemp(suffix="debug.log")
+        os.close(handle)
+        generate(filepath, opts.size)
+    try:
+        print("%s: %i MB" % (filepath, os.path.getsize(filepath) // 1024 // 1024))
+        parser = SlowQueryParser()
+        before = timed(lambda log: parse_in_order(parser, log), filepath)
+        print("every regex: %i queries, %.1f MB/sec, %.1fs" % before)
+        after = timed(parser.parse, filepath)
+        print(
+            "literal dispatch: %i queries, %.1f MB/sec, %.1fs (%.2fx)"
+            % (after + (before[2] / after[2],))
+        )
+    finally:
+        if not opts.debug_log:
+            os.remove(filepath)
+
+
+if __name__ == "__main__":
+    main()
@@ -35,6 +35,26 @@ class TestSperfCommands(unittest.TestCase):
         self.assertTrue(hasattr(args, "debug"))
         self.assertTrue(hasattr(args, "noprogress"))
 
+    def test_sperf_jobs_flag(self):
+        """tests the number of parsing processes is wired up"""
+        parser = sperf.build_parser()
+        args = parser.parse_args(["-j", "4"])
+        self.assertEqual(args.jobs, 4)
+        args = parser.parse_args([])
+        self.assertEqual(args.jobs, 1)
+
+    def test_sperf_cache_flags(self):
+        """tests the parse cache flags are wired up"""
+        parser = sperf.build_parser()
+        args = parser.parse_args([])
+        self.assertFalse(args.cache)
+        self.assertFalse(args.rebuild_cache)
+        self.assertEqual(args.cache_size, 512)
+        args = parser.parse_args(["--cache", "--rebuild-cache", "--cache-size", "64"])
+        self.assertTrue(args.cache)
+        self.assertTrue(args.rebuild_cache)
+        self.assertEqual(args.cache_size, 64)
+
     def test_sperf_will_break_if_incorrect_comamnd_is_used(self):
         """this is here so we can rely on the parser tests
         for subcommands tests being accurate"""
@@ -16,10 +16,21 @@
 
 import unittest
 import os
+import shutil
+import tempfile
+from pysper import diag
 from pysper.core.diag import node_env
 from tests import get_test_dse_tarball
 
 
+def read_configs(configs, output_logs, system_logs):
+    """reads the configurations the way parse_diag does, returns the collector"""
+    collector = node_env.read_output_logs(configs, output_logs, system_logs)
+    diag.EventStream(subscribers=[collector]).run(system_logs)
+    collector.apply()
+    return collector
+
+
 class TestNodeEnv(unittest.TestCase):
     """test node env module"""
 
@@ -72,7 +83,7 @@ class TestNodeEnv(unittest.TestCase):
                 "system.log",
             )
         ]
-        node_env.find_config_in_logs(configs, output_logs, system_logs)
+        read_configs(configs, output_logs, system_logs)
         self.assertEqual(configs[node1]["memtable_cleanup_threshold"], "default")
 
     def test_read_systemlog_when_outputlog_is_empty(self):
@@ -106,7 +117,60 @@ class TestNodeEnv(unittest.TestCase):
                 "system.log.2",
             ),
         ]
-        node_env.find_config_in_logs(configs, output_logs, system_logs)
+        read_configs(configs, output_logs, system_logs)
         self.assertEqual(
             configs["10.101.33.205"]["memtable_cleanup_threshold"], "default"
         )
+
+    def test_read_systemlog_stops_at_last_startup(self):
+        """only the most recent startup is used and older logs are not collected"""
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            logs = os.path.join(tmp_dir, "nodes", "node1", "logs", "cassandra")
+            os.makedirs(logs)
+            line = "INFO  [main] 2020-01-%02i %s,000  %s - %s\n"
+
+            def startup(day, mode, version):
+                return [
+                    line % (day, "10:00:00", "DatabaseDescriptor.java:1", mode),
+                    line % (day, "10:00:01", "StorageService.java:1", version),
+                    line % (day, "10:00:02", "Gossiper.java:1", "not configuration"),
+                    line
+                    % (day, "10:00:03", "Server.java:1", node_env.STARTUP_COMPLETE[0]),
+                    line
+                    % (
+                        day,
+                        "10:00:04",
+                        "DseDaemon.java:1",
+                        node_env.STARTUP_COMPLETE[1],
+                    ),
+                ]
+
+            disk = "DiskAccessMode is %s, indexAccessMode is mmap, commitlogAccessMode is mmap"
+            old = startup(1, disk % "standard", "Cassandra version: 3.0.1")
+            new = startup(2, disk % "mmap", "Cassandra version: 3.0.2")
+            # a startup that never completed is ignored
+            crashed = [
+                line % (3, "10:00:00", "DatabaseDescriptor.java:1", disk % "auto")
+            ]
+            files = []
+            for name, lines in [("system.log.1", old), ("system.log", new + crashed)]:
+                files.append(os.path.join(logs, name))
+                with open(files[-1], "w") as log:
+                    log.writelines(lines)
+            configs = {"node1": {}}
+            collector = read_configs(configs, [], list(reversed(files)))
+            # once the newest startup completed the older log is only read for the
+            # other subscribers, none of its events are kept
+            self.assertEqual(
+                set(e["date"].day for e in collector.events["node1"]), set([2, 3])
+            )
+            self.assertEqual(configs["node1"]["logged_disk_access_mode"], "mmap")
+            self.assertEqual(configs["node1"]["cassandra_version"], "3.0.2")
+            # the most recent startup is also found when the older log comes first
+            configs = {"node1": {}}
+            read_configs(configs, [], files)
+            self.assertEqual(configs["node1"]["logged_disk_access_mode"], "mmap")
+            self.assertEqual(configs["node1"]["cassandra_version"], "3.0.2")
+        finally:
+            shutil.rmtree(tmp_dir)
@@ -27,7 +27,7 @@ class TestCoreGC(unittest.TestCase):
         g = GCInspector(get_test_dse_tarball())
         g.analyze()
         self.assertEqual(len(g.pauses), 3)
-        self.assertEqual(len(g.all_pauses()), 236)
+        self.assertEqual(len(list(g.all_pauses())), 236)
         output = steal_output(g.print_report)
         self.assertIn(
             "!!++.+.+.!++.+.+...+.+..+.+.+.+..+++....++..+++....+..++.+++.+!+..+.+.+.+!......+++....+",
@@ -14,9 +14,13 @@
 
 """tests for slow query"""
 
+import os
+import shutil
+import tempfile
 import unittest
 from datetime import datetime, timezone
 from pysper.core import slowquery
+from tests import steal_output
 
 
 class TestSlowQueryRegex(unittest.TestCase):
@@ -144,3 +148,74 @@ class TestSlowQueryLineParse(unittest.TestCase):
         self.assertEqual(ret["query"], "SELECT * FROM keyspace1.standard1 WHERE key= 1")
         self.assertEqual(ret["time"], "10058")
         self.assertEqual(ret["threshold"], "10000")
+
+
+class TestSlowQueryAnalyzer(unittest.TestCase):
+    """test the analyzer keeps repeated queries as weights"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_repeats_are_weighted(self):
+        log = os.path.join(self.tmp_dir, "debug.log")
+        with open(log, "w") as log_file:
+            log_file.write(
+                "DEBUG [ScheduledTasks:1] 2020-01-10 17:01:56,039  MonitoringTask.java:172 - 5000 operations were slow in the last 5001 msecs:\n"
+                "<SELECT * FROM ks.a>, was slow 4999 times: avg/min/max 600/501/700 msec - slow timeout 500 msec\n"
+                "<SELECT * FROM ks.b>, time 900 msec - slow timeout 500 msec\n"
+            )
+        analyzer = slowquery.SlowQueryAnalyzer(self.tmp_dir, files=[log])
+        analyzer.analyze()
+        self.assertEqual(list(analyzer.querytimes.values()), [[(700, 4999), (900, 1)]])
+        shape = analyzer.shapes["SELECT * FROM ks.a"]
+        self.assertEqual((shape.count, shape.total, shape.max), (4999, 2999400, 700))
+        output = steal_output(analyzer.print_report, "sperf core slowquery")
+        # the percentiles take one time per logged line, as they always have
+        self.assertIn("2020-01-10 17:01:56.039000+00:00  .(4999)X\n", output)
+        self.assertIn("(3500200ms)", output)
+        self.assertEqual(slowquery.timeline([[".", 3], ["!", 101]]), "...!(101)")
+
+    def test_timeouts_count_each_query(self):
+        log = os.path.join(self.tmp_dir, "debug.log")
+        with open(log, "w") as log_file:
+            log_file.write(
+                "DEBUG [ScheduledTasks:1] 2020-01-10 17:01:56,039  MonitoringTask.java:173 - 5 operations timed out in the last 5001 msecs:\n"
+                "<SELECT * FROM ks.a>, total time 5001 msec, timeout 5000 msec\n"
+                "<SELECT * FROM ks.a>, total time 5002 msec, timeout 5000 msec\n"
+            )
+        analyzer = slowquery.SlowQueryAnalyzer(self.tmp_dir, files=[log])
+        analyzer.analyze()
+        # the count in the block header is not counted again for every query
+        self.assertEqual(analyzer.timedout, 2)
+        self.assertEqual(analyzer.shapes["SELECT * FROM ks.a"].timeouts, 2)
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            slowquery.fingerprint(
+                "SELECT * FROM ks.t WHERE id = 00000000-0041-d584-0000-0000004956fd AND"
+                " token(k) > -9223372036854775808 AND n = 'it''s'  AND b = 0xcafe"
+                " AND c IN (1, 2.5, 3) AND v = 3078ab LIMIT 5000"
+            ),
+            "SELECT * FROM ks.t WHERE id = ? AND token(k) > ? AND n = ? AND b = ?"
+            " AND c IN (?) AND v = ? LIMIT ?",
+        )
+        # uuids starting with a letter, blobs and booleans are literals too
+        shapes = set(
+            slowquery.fingerprint(
+                "SELECT * FROM ks.t WHERE id = %s AND b = %s AND f = %s" % literals
+            )
+            for literals in [
+                ("c5f0a1e2-1234-4abc-9def-0123456789ab", "0xCAFE", "true"),
+                ("0a5f0a1e-1234-4abc-9def-0123456789ab", "0x01", "FALSE"),
+            ]
+        )
+        self.assertEqual(
+            shapes, {"SELECT * FROM ks.t WHERE id = ? AND b = ? AND f = ?"}
+        )
+        self.assertEqual(
+            slowquery.fingerprint("SELECT c3 FROM keyspace1.standard1"),
+            "SELECT c3 FROM keyspace1.standard1",
+        )
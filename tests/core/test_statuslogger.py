@@ -16,8 +16,15 @@
 
 import unittest
 import os
-from pysper.core.statuslogger import StatusLogger, Summary
-from tests import get_test_dse_tarball, get_current_dir
+from pysper import env
+from pysper.core.statuslogger import (
+    StatusLogger,
+    Summary,
+    parse_log,
+    REPORTED_EVENTS,
+    REPORTED_FIELDS,
+)
+from tests import get_test_dse_tarball, get_current_dir, steal_output
 
 
 class TestStatusLogger(unittest.TestCase):
@@ -58,6 +65,57 @@ class TestStatusLogger(unittest.TestCase):
             ],
         )
 
+    def test_skip_duplicate_events_diag_in_parallel(self):
+        """parsing in a process pool should merge to the same result"""
+        env.JOBS = 2
+        try:
+            sl = StatusLogger(get_test_dse_tarball())
+            sl.analyze()
+        finally:
+            env.JOBS = 1
+        s = Summary(sl.nodes)
+        self.assertEqual(s.lines, 22055)
+        self.assertEqual(s.skipped_lines, 445)
+        self.assertEqual(
+            s.get_busiest_stages()[0],
+            [
+                "10.101.35.102",
+                "active",
+                "CompactionExecutor",
+                1,
+            ],
+        )
+
+    def test_kept_records_are_reduced(self):
+        """records kept for a worker or the cache only hold the fields reported on
+        and read the same as the streamed events"""
+        log = os.path.join(
+            get_current_dir(__file__),
+            "..",
+            "testdata",
+            "dse68",
+            "nodes",
+            "172.17.0.2",
+            "logs",
+            "cassandra",
+            "system.log",
+        )
+        kept = parse_log(log)
+        streamed = parse_log(log, stream=True)
+        streamed_records = list(streamed.records)
+        self.assertEqual(len(kept.records), len(streamed_records))
+        self.assertEqual(
+            (kept.unknown, kept.first, kept.last),
+            (streamed.unknown, streamed.first, streamed.last),
+        )
+        for record, (_, date, rule_type, event) in zip(kept.records, streamed_records):
+            self.assertEqual(record[1:3], (date, rule_type))
+            if record[3] is None:
+                self.assertNotIn(event["event_type"], REPORTED_EVENTS)
+            else:
+                self.assertTrue(set(record[3]) <= set(REPORTED_FIELDS))
+                self.assertEqual(record[3]["event_type"], event["event_type"])
+
     def test_db2552_debug_log_format(self):
         """should work with new statuslogger files"""
         files = [
@@ -129,3 +187,39 @@ class TestStatusLogger(unittest.TestCase):
         self.assertEqual(stage, "TPC/all/WRITE_REMOTE")
         self.assertEqual(status, "pending")
         self.assertEqual(value, 13094)
+
+    def test_stage_samples_keep_their_dates(self):
+        """stage samples are stored in arrays alongside the time they were logged"""
+        files = [
+            os.path.join(
+                get_current_dir(__file__), "..", "testdata", "statuslogger_68.log"
+            )
+        ]
+        sl = StatusLogger(None, files=files)
+        sl.analyze()
+        node = sl.nodes[files[0]]
+        values = node.stages["pending"]["TPC/all/WRITE_REMOTE"]
+        self.assertEqual(values.typecode, "q")
+        samples = node.stage_samples("pending", "TPC/all/WRITE_REMOTE")
+        self.assertEqual([v for _, v in samples], list(values))
+        self.assertTrue(all(node.start <= d <= node.end for d, _ in samples))
+        self.assertEqual(node.stage_samples("pending", "missing"), [])
+
+    def test_timeline(self):
+        """stage samples are reduced into time buckets instead of being kept"""
+        files = [
+            os.path.join(
+                get_current_dir(__file__), "..", "testdata", "statuslogger_68.log"
+            )
+        ]
+        sl = StatusLogger(None, files=files, timeline=60)
+        output = steal_output(sl.print_timeline)
+        node = sl.nodes[files[0]]
+        self.assertFalse(node.stages)
+        ((time, sketch),) = node.timeline["pending"]["TPC/all/WRITE_REMOTE"].items()
+        self.assertEqual((time.minute, time.second), (10, 0))
+        self.assertEqual(sketch.max(), 13094)
+        self.assertIn(
+            "2020-07-21 07:10:00  PENDING  TPC/all/WRITE_REMOTE          13094  13094",
+            output,
+        )
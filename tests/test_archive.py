@@ -0,0 +1,126 @@
+# Copyright 2020 DataStax, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""tests reading logs from tarballs and compressed files"""
+
+import io
+import os
+import gzip
+import shutil
+import tarfile
+import zipfile
+import tempfile
+import unittest
+from unittest import mock
+from pysper import archive, diag
+from pysper.core.diag import node_env
+
+LOG = "".join(
+    "INFO  [main] 2020-01-10 16:%02i:00,000  Gossiper.java:1 - line %i\n" % (i, i)
+    for i in range(60)
+)
+
+
+class TestArchive(unittest.TestCase):
+    """archive tests"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.logs = os.path.join(self.tmp_dir, "nodes", "node1", "logs", "cassandra")
+        os.makedirs(self.logs)
+        with open(os.path.join(self.logs, "system.log"), "w") as log:
+            log.write(LOG)
+        with gzip.open(os.path.join(self.logs, "system.log.1.gz"), "wt") as log:
+            log.write(LOG)
+        with zipfile.ZipFile(os.path.join(self.logs, "system.log.2.zip"), "w") as log:
+            log.writestr("system.log.2", LOG)
+        with open(os.path.join(self.logs, "system.log.3.gz"), "wb") as log:
+            log.write(b"not gzip")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_compressed_rotated_logs(self):
+        """gz and zip logs are found and read, broken ones are skipped"""
+        logs = diag.find_logs(self.tmp_dir)
+        self.assertEqual(
+            sorted(os.path.basename(log) for log in logs),
+            ["system.log", "system.log.1.gz", "system.log.2.zip"],
+        )
+        for log in logs:
+            with diag.FileWithProgress(log) as log_file:
+                self.assertEqual(log_file.read(), LOG)
+        first, last = diag.log_range(os.path.join(self.logs, "system.log.1.gz"))
+        self.assertEqual(first.minute, 0)
+        self.assertEqual(last.minute, 59)
+
+    def test_diag_tarball(self):
+        """a diag tarball is read like the directory it was made from"""
+        tarball = os.path.join(self.tmp_dir, "diag.tar.gz")
+        with tarfile.open(tarball, "w:gz") as tar:
+            tar.add(os.path.join(self.tmp_dir, "nodes"), arcname="cluster/nodes")
+        logs = diag.find_logs(tarball)
+        self.assertEqual(len(logs), 3)
+        self.assertTrue(all(log.startswith(tarball + os.sep) for log in logs))
+        self.assertEqual(archive.source(logs[0]), tarball)
+        self.assertEqual(list(node_env.initialize_node_configs(tarball)), ["node1"])
+        # members are read in any order from the shared tarball handle
+        for log in reversed(logs):
+            with diag.FileWithProgress(log) as log_file:
+                self.assertEqual(list(log_file), LOG.splitlines(keepends=True))
+        with diag.FileWithProgress(os.path.join(tarball, "missing.log")) as log_file:
+            self.assertTrue(log_file.error)
+
+    def test_uncompressed_tarball(self):
+        """members of an uncompressed tarball share one handle and are read in place"""
+        tarball = os.path.join(self.tmp_dir, "diag.tar")
+        with tarfile.open(tarball, "w") as tar:
+            tar.add(os.path.join(self.tmp_dir, "nodes"), arcname="cluster/nodes")
+        # no member is kept in memory, so all are read through the tarball handle
+        with mock.patch.object(archive, "SMALL_MEMBER", 0):
+            logs = sorted(diag.find_logs(tarball))
+        self.assertEqual(len(logs), 3)
+        streams = [archive.open_binary(log) for log in reversed(logs)]
+        self.assertIsInstance(
+            archive._tarball(tarball).open(archive.split_path(logs[0])[1]).raw,
+            archive._Member,
+        )
+        # interleaved reads through the shared handle each keep their own offset
+        chunks = [[] for _ in streams]
+        while True:
+            read = [stream.read(100) for stream in streams]
+            if not any(read):
+                break
+            for chunk, data in zip(chunks, read):
+                chunk.append(data)
+        for stream in streams:
+            stream.close()
+        for chunk in chunks:
+            self.assertEqual(b"".join(chunk), LOG.encode())
+        # the members are mapped in tarball order and the results come back in file order
+        self.assertEqual(
+            list(diag.map_files(os.path.basename, reversed(logs))),
+            [os.path.basename(log) for log in reversed(logs)],
+        )
+        self.assertFalse(diag.is_binary(logs[0]))
+
+    def test_read_ahead(self):
+        """small chunks from the reader thread are joined back together"""
+        data = os.urandom(100000)
+        with archive.ReadAhead(io.BytesIO(data), chunk_size=999, depth=2) as stream:
+            self.assertEqual(stream.read(), data)
+        stream = archive.ReadAhead(io.BytesIO(data), chunk_size=10, depth=1)
+        self.assertEqual(stream.read(5), data[:5])
+        stream.close()
+        self.assertFalse(stream.thread.is_alive())
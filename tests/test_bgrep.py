@@ -15,8 +15,10 @@
 """validates the basic logline function works correctly"""
 
 import unittest
+from unittest import mock
 import os
-from pysper.bgrep import BucketGrep
+from pysper import bgrep
+from pysper.bgrep import BucketGrep, Reservoir
 from tests import get_current_dir
 
 
@@ -68,3 +70,75 @@ class TestBgrep(unittest.TestCase):
         )
         b.analyze()
         self.assertEqual(len(b.matches), 1)
+
+    def test_bgrep_time_range(self):
+        """stray lines are only counted inside the time range"""
+        b = BucketGrep(
+            "flush",
+            diag_dir=os.path.join(get_current_dir(__file__), "testdata", "diag"),
+            start="2020-01-10 16:50:00,000",
+            end="2020-01-10 17:00:00,000",
+        )
+        b.analyze()
+        self.assertEqual(b.count, 335)
+        self.assertGreaterEqual(min(b.matches), b.start_time)
+        self.assertLessEqual(max(b.matches), b.end_time)
+
+    def test_bgrep_stream(self):
+        """streaming counts the same matches into buckets from the start time"""
+        diag_dir = os.path.join(get_current_dir(__file__), "testdata", "diag")
+        b = BucketGrep("flush", diag_dir=diag_dir)
+        b.analyze()
+        streamed = BucketGrep(
+            "flush",
+            diag_dir=diag_dir,
+            start="2020-01-10 16:00:00,000",
+            interval=600,
+            stream=True,
+            samples=5,
+        )
+        streamed.analyze()
+        self.assertEqual(len(streamed.samples.items), 5)
+        self.assertEqual(streamed.samples.seen, streamed.count)
+        for bucket in streamed.matches:
+            self.assertEqual(bucket.minute % 10, 0)
+            self.assertEqual(bucket.second, 0)
+        in_range = sum(c for dt, c in b.matches.items() if dt >= streamed.start_time)
+        self.assertEqual(streamed.count, in_range)
+        buckets = streamed.buckets(streamed.matches, 600)
+        self.assertEqual(sum(c for _, c in buckets), streamed.count)
+        with self.assertRaises(ValueError):
+            streamed.buckets(streamed.matches, 60)
+
+    def test_bgrep_raw(self):
+        """matching the raw bytes finds the same matches, also across small blocks"""
+        diag_dir = os.path.join(get_current_dir(__file__), "testdata", "diag")
+        traceback = os.path.join(get_current_dir(__file__), "testdata", "traceback.log")
+        for regex, kwargs in [
+            ("flush", {"diag_dir": diag_dir}),
+            ("at ", {"diag_dir": diag_dir, "end": "2020-01-10 16:00:00,000"}),
+            ("No such file", {"files": [traceback]}),
+        ]:
+            b = BucketGrep(regex, **kwargs)
+            b.analyze()
+            with mock.patch.object(bgrep, "RAW_BLOCK", 1000):
+                raw = BucketGrep(regex, raw=True, **kwargs)
+                raw.analyze()
+            self.assertTrue(b.count)
+            self.assertEqual(raw.matches, b.matches)
+            self.assertEqual(raw.unknown, b.unknown)
+            self.assertEqual((raw.start, raw.end), (b.start, b.end))
+            self.assertEqual(raw.last_time, b.last_time)
+
+    def test_reservoir_merge(self):
+        """merged samples stay within the size and keep the total seen"""
+        first = Reservoir(3)
+        for i in range(10):
+            first.add(i)
+        second = Reservoir(3)
+        for i in range(100, 102):
+            second.add(i)
+        first.merge(second.items, second.seen)
+        self.assertEqual(first.seen, 12)
+        self.assertEqual(len(first.items), 3)
+        self.assertEqual(len(set(first.items)), 3)
@@ -0,0 +1,119 @@
+# Copyright 2020 DataStax, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""tests the parsed log cache"""
+
+import os
+import re
+import functools
+import shutil
+import tempfile
+import unittest
+from pysper import cache, env
+
+CALLS = []
+
+
+def count_lines(filepath):
+    """parse function that records each time it is called"""
+    CALLS.append(filepath)
+    with open(filepath) as log:
+        return len(log.readlines())
+
+
+class TestCache(unittest.TestCase):
+    """tests the cache module"""
+
+    def setUp(self):
+        del CALLS[:]
+        self.tmp_dir = tempfile.mkdtemp()
+        self.log = os.path.join(self.tmp_dir, "system.log")
+        with open(self.log, "w") as log:
+            log.write("one\ntwo\n")
+        env.CACHE_DIR = os.path.join(self.tmp_dir, "cache")
+        env.REBUILD_CACHE = False
+
+    def tearDown(self):
+        env.CACHE_DIR = None
+        env.REBUILD_CACHE = False
+        shutil.rmtree(self.tmp_dir)
+
+    def test_second_read_uses_cache(self):
+        """the file is only parsed once"""
+        self.assertEqual(cache.cached(count_lines, self.log), 2)
+        self.assertEqual(cache.cached(count_lines, self.log), 2)
+        self.assertEqual(CALLS, [self.log])
+
+    def test_changed_file_is_parsed_again(self):
+        """a new size or mtime invalidates the entry"""
+        self.assertEqual(cache.cached(count_lines, self.log), 2)
+        with open(self.log, "a") as log:
+            log.write("three\n")
+        self.assertEqual(cache.cached(count_lines, self.log), 3)
+        self.assertEqual(len(CALLS), 2)
+
+    def test_rebuild_ignores_stored_entry(self):
+        """rebuilding parses again and replaces the entry"""
+        cache.cached(count_lines, self.log)
+        env.REBUILD_CACHE = True
+        cache.cached(count_lines, self.log)
+        self.assertEqual(len(CALLS), 2)
+        env.REBUILD_CACHE = False
+        cache.cached(count_lines, self.log)
+        self.assertEqual(len(CALLS), 2)
+
+    def test_key_includes_bound_arguments(self):
+        """different time windows do not share an entry"""
+        first = cache.cache_key(functools.partial(count_lines, start=1), self.log)
+        second = cache.cache_key(functools.partial(count_lines, start=2), self.log)
+        self.assertNotEqual(first, second)
+        self.assertIsNone(cache.cache_key(count_lines, self.log + ".missing"))
+
+    def test_key_includes_whole_pattern(self):
+        """long regexes differing only past the cut off repr do not share an entry"""
+        first = re.compile("." * 200)
+        second = re.compile("." * 200 + "ZZZNOTHERE")
+        self.assertNotEqual(
+            cache.cache_key(functools.partial(count_lines, first), self.log),
+            cache.cache_key(functools.partial(count_lines, second), self.log),
+        )
+        self.assertNotEqual(
+            cache.cache_key(functools.partial(count_lines, first), self.log),
+            cache.cache_key(
+                functools.partial(count_lines, re.compile(first.pattern, re.I)),
+                self.log,
+            ),
+        )
+
+    def test_least_recently_used_entries_are_evicted(self):
+        """the cache is kept under its size by removing the oldest entries"""
+        other = os.path.join(self.tmp_dir, "debug.log")
+        with open(other, "w") as log:
+            log.write("one\n")
+        cache.cached(count_lines, self.log)
+        entry_size = os.path.getsize(
+            os.path.join(env.CACHE_DIR, os.listdir(env.CACHE_DIR)[0])
+        )
+        # older than the entry of the other log
+        for name in os.listdir(env.CACHE_DIR):
+            os.utime(os.path.join(env.CACHE_DIR, name), (0, 0))
+        env.CACHE_SIZE = entry_size
+        try:
+            cache.cached(count_lines, other)
+            self.assertEqual(len(os.listdir(env.CACHE_DIR)), 1)
+            cache.cached(count_lines, other)
+            cache.cached(count_lines, self.log)
+        finally:
+            env.CACHE_SIZE = 512 * 1024 * 1024
+        self.assertEqual(CALLS, [self.log, other, self.log])
@@ -0,0 +1,149 @@
+# Copyright 2020 DataStax, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""tests resuming analyzers from a checkpoint"""
+
+import os
+import gzip
+import shutil
+import tempfile
+import unittest
+from pysper.bgrep import BucketGrep
+from pysper.core.gcinspector import GCInspector
+from pysper.core.slowquery import SlowQueryAnalyzer
+from pysper.core.statuslogger import StatusLogger
+from tests import get_test_dir, steal_output
+
+LOGS = os.path.join(get_test_dir(), "dse68", "nodes", "172.17.0.2", "logs", "cassandra")
+
+
+def read_lines(name):
+    """lines of the test log, a last line without a newline would still be being
+    written and is not read from a checkpoint"""
+    with open(os.path.join(LOGS, name), encoding="utf-8") as log:
+        return [line.rstrip("\n") + "\n" for line in log]
+
+
+class TestCheckpoint(unittest.TestCase):
+    """checkpoint tests"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.logs = os.path.join(self.tmp_dir, "nodes", "node1", "logs", "cassandra")
+        os.makedirs(self.logs)
+        self.checkpoint = os.path.join(self.tmp_dir, "checkpoint")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, name, text, mode="w"):
+        path = os.path.join(self.logs, name)
+        with open(path, mode, encoding="utf-8") as log:
+            log.write(text)
+        return path
+
+    def test_appended_and_rotated_logs(self):
+        """a resumed run reads the rest of a line being written, a rotated log
+        is not read twice, and the result is the one of a single run"""
+        lines = read_lines("system.log")
+        # with pauses on both sides
+        half = 900
+        whole = self.write("whole.log", "".join(lines))
+        partial = lines[half][:10]
+        log = self.write("system.log", "".join(lines[:half]) + partial)
+
+        def resumed():
+            gc = GCInspector(files=[log], checkpoint=self.checkpoint)
+            gc.analyze()
+            return gc
+
+        first = resumed()
+        self.write("system.log", lines[half][10:], mode="a")
+        # rotated and compressed, the new log holds the rest of the lines
+        with open(log, "rb") as plain, gzip.open(log + ".1.gz", "wb") as rotated:
+            shutil.copyfileobj(plain, rotated)
+        self.write("system.log", "".join(lines[half + 1 :]))
+        gc = GCInspector(files=[log + ".1.gz", log], checkpoint=self.checkpoint)
+        gc.analyze()
+        expected = GCInspector(files=[whole])
+        expected.analyze()
+        self.assertEqual(first.gc_types, {"G1 Young": 4})
+        self.assertEqual(gc.gc_types, expected.gc_types)
+        self.assertEqual(list(gc.all_pauses()), list(expected.all_pauses()))
+
+    def test_resumed_reports(self):
+        """every analyzer reports the same after resuming as after a single run"""
+        for name, make, report in [
+            (
+                "system.log",
+                lambda files, checkpoint: StatusLogger(
+                    None, files=files, checkpoint=checkpoint
+                ),
+                lambda analyzer: analyzer.print_summary(),
+            ),
+            (
+                "debug.log",
+                lambda files, checkpoint: SlowQueryAnalyzer(
+                    None, files=files, checkpoint=checkpoint
+                ),
+                lambda analyzer: analyzer.print_report("slowquery"),
+            ),
+            (
+                "debug.log",
+                lambda files, checkpoint: BucketGrep(
+                    "compaction", files=files, checkpoint=checkpoint
+                ),
+                lambda analyzer: analyzer.print_report(),
+            ),
+        ]:
+            lines = read_lines(name)
+            half = len(lines) // 2
+            log = self.write(name, "".join(lines[:half]))
+            steal_output(report, make([log], self.checkpoint))
+            self.write(name, "".join(lines[half:]), mode="a")
+            resumed = steal_output(report, make([log], self.checkpoint))
+            self.assertEqual(resumed, steal_output(report, make([log], None)), name)
+            os.remove(self.checkpoint)
+
+    def test_resumed_status_dump(self):
+        """rows of a status dump cut by the previous run keep the date of the dump"""
+        with open(
+            os.path.join(get_test_dir(), "statusloggernew_debug.log"), encoding="utf-8"
+        ) as log:
+            lines = log.readlines()
+        whole = self.write("whole.log", "".join(lines))
+        log = self.write("debug.log", "".join(lines[:20]))
+        start = "2020-01-09 16:00:00,000"
+
+        def summary(files, path):
+            analyzer = StatusLogger(None, files=files, start=start, checkpoint=path)
+            return steal_output(analyzer.print_summary)
+
+        summary([log], self.checkpoint)
+        self.write("debug.log", "".join(lines[20:]), mode="a")
+        resumed = summary([log], self.checkpoint)
+        self.assertEqual(resumed, summary([whole], None))
+        self.assertIn("CompactionExecutor", resumed)
+
+    def test_other_settings(self):
+        """a checkpoint saved with other settings is not used"""
+        log = self.write("debug.log", "".join(read_lines("debug.log")))
+        BucketGrep("compaction", files=[log], checkpoint=self.checkpoint).analyze()
+        other = BucketGrep("flush", files=[log], checkpoint=self.checkpoint)
+        output = steal_output(other.analyze)
+        self.assertIn("other settings", output)
+        expected = BucketGrep("flush", files=[log])
+        steal_output(expected.analyze)
+        self.assertEqual(other.count, expected.count)
+        self.assertTrue(other.count > 0)
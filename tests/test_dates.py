@@ -14,6 +14,7 @@
 """tests the dates.py module"""
 
 import unittest
+from datetime import timedelta
 from pysper import dates
 from pysper import env
 
@@ -128,3 +129,31 @@ class TestDates(unittest.TestCase):
         finally:
             env.IS_US_FMT = orig
             env.PERMISSIVE_TIME = orig_pt
+
+    def test_same_second_uses_cache(self):
+        """later lines in the same second only parse the milliseconds"""
+        orig = env.IS_US_FMT
+        try:
+            env.IS_US_FMT = True
+            parser = dates.LogDateFormatParser()
+            first = parser.parse_timestamp("2018-10-23 15:50:01,123")
+            self.assertEqual(list(parser.seconds), ["2018-10-23 15:50:01"])
+            second = parser.parse_timestamp("2018-10-23 15:50:01,456")
+            self.assertEqual(second - first, timedelta(milliseconds=333))
+            self.assertEqual(second.tzinfo, first.tzinfo)
+            with self.assertRaises(Exception):
+                parser.parse_timestamp("2018-10-23 15:50:01,abc")
+        finally:
+            env.IS_US_FMT = orig
+
+    def test_second_cache_is_bounded(self):
+        """the least recently used seconds are dropped"""
+        parser = dates.LogDateFormatParser()
+        parser.cache_size = 2
+        parser.parse_timestamp("2018-10-23 15:50:01,000")
+        parser.parse_timestamp("2018-10-23 15:50:02,000")
+        parser.parse_timestamp("2018-10-23 15:50:01,500")
+        parser.parse_timestamp("2018-10-23 15:50:03,000")
+        self.assertEqual(
+            list(parser.seconds), ["2018-10-23 15:50:01", "2018-10-23 15:50:03"]
+        )
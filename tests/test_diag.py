@@ -15,15 +15,31 @@
 """'cass diag' parsing and report writing tests"""
 
 import os
+import shutil
+import tempfile
 import types
+from datetime import datetime, timedelta, timezone
 import unittest
+from unittest import mock
 from tests import get_current_dir, steal_output, make_67_diag_args
-from pysper import env, VERSION
+from pysper import dates, diag, env, parser, sperf_default, VERSION
 from pysper.core.diag import parse_diag
-from pysper.diag import find_files
+from pysper.diag import find_files, map_files, EventStream
 from pysper.commands.core import diag as diag_cmd
 
 
+def write_log(log_path, start, seconds=20000):
+    """writes a log line every second, each followed by a stack trace line"""
+    with open(log_path, "w") as log:
+        for i in range(seconds):
+            stamp = start + timedelta(seconds=i)
+            log.write(
+                "INFO  [main] %s,000  Gossiper.java:1 - line %i\n"
+                % (stamp.strftime("%Y-%m-%d %H:%M:%S"), i)
+            )
+            log.write("\tat stack.trace.Frame(Frame.java:1)\n")
+
+
 class TestDiagModule(unittest.TestCase):
     """tests the diag module"""
 
@@ -73,6 +89,223 @@ class TestDiagModule(unittest.TestCase):
             os.path.join(test_dir, "nodes", "node2", "debug.log") not in files
         )
 
+    def test_event_stream_shares_events(self):
+        """every subscriber sees the same events from a single read"""
+
+        class Recorder:
+            def __init__(self):
+                self.files = []
+                self.events = []
+
+            def set_file(self, node, filepath):
+                self.files.append((node, filepath))
+
+            def add(self, event):
+                self.events.append(event)
+
+        first = Recorder()
+        second = Recorder()
+        log = os.path.join(get_current_dir(__file__), "testdata", "simple.log")
+        missing = os.path.join(get_current_dir(__file__), "testdata", "missing.log")
+        warnings = EventStream(subscribers=[first, second]).run([log, missing])
+        self.assertEqual(len(warnings), 1)
+        self.assertTrue(missing in warnings[0])
+        self.assertEqual(first.files, [(log, log)])
+        self.assertEqual(first.files, second.files)
+        self.assertTrue(first.events)
+        self.assertEqual(len(first.events), len(second.events))
+        for a, b in zip(first.events, second.events):
+            self.assertIs(a, b)
+
+    def test_map_files_keeps_file_order(self):
+        """results from the process pool are returned in file order"""
+        files = ["c", "a", "b", "d"]
+        self.assertEqual(list(map_files(str.upper, files)), ["C", "A", "B", "D"])
+        env.JOBS = 2
+        try:
+            self.assertEqual(list(map_files(str.upper, files)), ["C", "A", "B", "D"])
+        finally:
+            env.JOBS = 1
+
+    def test_event_fingerprint(self):
+        """events with the same fields have the same fingerprint"""
+        event = {"event_type": "pause", "duration": 100, "date": dates.max_utc_time()}
+        self.assertEqual(
+            diag.event_fingerprint(event), diag.event_fingerprint(dict(event))
+        )
+        self.assertNotEqual(
+            diag.event_fingerprint(event),
+            diag.event_fingerprint(dict(event, duration=101)),
+        )
+        config = {"event_type": "node_configuration", "node_configuration": {"a": 1}}
+        self.assertEqual(
+            diag.event_fingerprint(config), diag.event_fingerprint(dict(config))
+        )
+
+    def test_uniq_filter_only_remembers_overlapping_events(self):
+        """events outside of the time range of the other files are not kept"""
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            log_dir = os.path.join(tmp_dir, "nodes", "node1", "logs", "cassandra")
+            os.makedirs(log_dir)
+            line = "INFO  [main] 2020-01-09 16:%s,000  Gossiper.java:1 - %s\n"
+            newest = os.path.join(log_dir, "system.log")
+            with open(newest, "w") as log:
+                log.write(line % ("10:00", "a"))
+                log.write(line % ("20:00", "b"))
+            oldest = os.path.join(log_dir, "system.log.1")
+            with open(oldest, "w") as log:
+                log.write(line % ("00:00", "c"))
+                log.write(line % ("10:00", "a"))
+            event_filter = diag.UniqEventPerNodeFilter(files=[newest, oldest])
+            events = []
+            for filepath in [newest, oldest]:
+                event_filter.set_file("node1", filepath)
+                with open(filepath) as log:
+                    for event in parser.read_system_log(log):
+                        event["event_type"] = "test"
+                        events.append(event_filter.is_duplicate(event))
+            event_filter.set_node("node1")
+            self.assertEqual(events, [False, False, False, True])
+            # only the event at 16:10 is inside the range of the other file
+            self.assertEqual(len(event_filter.previous_files_events["node1"]), 1)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_range_start_offset(self):
+        """files outside of the range are skipped, others start just before it"""
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            log_path = os.path.join(tmp_dir, "system.log")
+            start = datetime(2020, 1, 10, tzinfo=timezone.utc)
+            write_log(log_path, start)
+            window_start = start + timedelta(hours=4)
+            offset = diag.range_start_offset(log_path, window_start)
+            self.assertGreater(offset, 0)
+            with open(log_path) as log:
+                log.seek(offset)
+                first = next(parser.read_system_log(log))
+            self.assertLess(first["date"], window_start - diag.OVERLAP_SLACK)
+            self.assertGreater(first["date"], window_start - timedelta(minutes=30))
+            self.assertEqual(diag.range_start_offset(log_path), 0)
+            self.assertEqual(diag.range_start_offset(log_path, end=window_start), 0)
+            self.assertIsNone(
+                diag.range_start_offset(log_path, start + timedelta(days=1))
+            )
+            self.assertIsNone(
+                diag.range_start_offset(log_path, end=start - timedelta(days=1))
+            )
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_time_index(self):
+        """the time index points at log lines and is used with the cache enabled"""
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            log_path = os.path.join(tmp_dir, "system.log")
+            start = datetime(2020, 1, 10, tzinfo=timezone.utc)
+            write_log(log_path, start)
+            with mock.patch.object(diag, "INDEX_SPACING", 64 * 1024):
+                index = diag.time_index(log_path)
+                self.assertGreater(len(index), 20)
+                self.assertEqual(index[0], (start, 0))
+                with open(log_path, "rb") as log:
+                    for entry_time, offset in index:
+                        log.seek(offset)
+                        self.assertTrue(log.readline().startswith(b"INFO  [main]"))
+                self.assertEqual(index, sorted(index))
+                env.CACHE = True
+                env.CACHE_DIR = os.path.join(tmp_dir, "cache")
+                try:
+                    window_start = start + timedelta(hours=4)
+                    offset = diag.range_start_offset(log_path, window_start)
+                    self.assertIn(offset, [offset for _, offset in index])
+                    self.assertTrue(os.listdir(env.CACHE_DIR))
+                    with open(log_path) as log:
+                        log.seek(offset)
+                        first = next(parser.read_system_log(log))
+                    self.assertLess(first["date"], window_start - diag.OVERLAP_SLACK)
+                    self.assertGreater(
+                        first["date"], window_start - timedelta(minutes=30)
+                    )
+                finally:
+                    env.CACHE = False
+                    env.CACHE_DIR = None
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_inventory(self):
+        """the diag dir is walked once per command, files are classified and binaries skipped"""
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            for node in ["node1", "node2"]:
+                logs = os.path.join(tmp_dir, "nodes", node, "logs", "cassandra")
+                os.makedirs(logs)
+                for name in ["system.log", "system.log.1", "debug.log", "gc.log.0"]:
+                    with open(os.path.join(logs, name), "w") as log:
+                        log.write("text\n")
+            binary = os.path.join(tmp_dir, "nodes", "node2", "logs", "system.log.zip")
+            with open(binary, "wb") as log:
+                log.write(b"PK\0\3")
+            walk = mock.Mock(wraps=os.walk)
+            with mock.patch.object(diag.os, "walk", walk):
+                with diag.cached_inventories():
+                    system_logs = diag.find_logs(tmp_dir)
+                    debug_logs = diag.find_logs(tmp_dir, "debug.log")
+                    gc_logs = diag.find_logs(tmp_dir, "gc.log.0", use_as_prefix=False)
+                    inventory = diag.inventory(tmp_dir)
+                self.assertEqual(walk.call_count, 1)
+                # outside of a command the files are listed again
+                os.remove(os.path.join(logs, "debug.log"))
+                self.assertEqual(len(diag.find_logs(tmp_dir, "debug.log")), 1)
+                self.assertEqual(walk.call_count, 2)
+            self.assertEqual(len(system_logs), 4)
+            self.assertNotIn(binary, system_logs)
+            self.assertEqual(len(debug_logs), 2)
+            self.assertEqual(len(gc_logs), 2)
+            self.assertEqual(sorted(inventory.logs("system")), sorted(system_logs))
+            self.assertEqual(len(inventory.logs("gc")), 2)
+            self.assertEqual(inventory.logs("ttop"), [])
+            nodes = inventory.nodes("system")
+            self.assertEqual(sorted(nodes), ["node1", "node2"])
+            self.assertEqual(len(nodes["node2"]), 2)
+            self.assertEqual(sorted(inventory.node_names()), ["node1", "node2"])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_is_binary_only_reads_the_start(self):
+        """a NUL byte past the sniffed block is not looked for"""
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, "late.log")
+            with open(path, "wb") as log:
+                log.write(b"a" * diag.BINARY_SNIFF + b"\0")
+            self.assertFalse(diag.is_binary(path))
+            with open(path, "wb") as log:
+                log.write(b"a\0")
+            self.assertTrue(diag.is_binary(path))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_sperf_default_reads_each_log_once(self):
+        """the default sperf command should only open each system.log once"""
+        opened = []
+        real_file_with_progress = diag.FileWithProgress
+
+        def tracked(filepath):
+            opened.append(filepath)
+            return real_file_with_progress(filepath)
+
+        with mock.patch("pysper.diag.FileWithProgress", side_effect=tracked):
+            parsed = sperf_default.parse(make_67_diag_args())
+        system_logs = [f for f in opened if "system.log" in os.path.basename(f)]
+        self.assertTrue(system_logs)
+        self.assertEqual(len(system_logs), len(set(system_logs)))
+        self.assertEqual(
+            sorted(system_logs),
+            sorted(f for f in parsed["rec_logs"] if "system.log" in f),
+        )
+
     def test_parse_diag(self):
         """happy path test for parsing a diag tarball"""
         config = types.SimpleNamespace()
@@ -0,0 +1,84 @@
+# Copyright 2020 DataStax, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""tests following live logs"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from pysper import follow
+from pysper.core.gcinspector import GCInspector
+from tests import steal_output
+
+PAUSE = (
+    "INFO  [GCInspector:1] 2020-01-10 17:13:%02i,847  GCInspector.java:313 - "
+    "G1 Young Generation GC in %ims.  G1 Old Gen: 907701344 -> 1310700136\n"
+)
+
+
+class TestFollow(unittest.TestCase):
+    """follow tests"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.log = os.path.join(self.tmp_dir, "system.log")
+        with open(self.log, "w") as log:
+            log.write("old line\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def append(self, text):
+        with open(self.log, "a") as log:
+            log.write(text)
+
+    def test_tail(self):
+        """only complete appended lines are read, across rotation and truncation"""
+        tail = follow.Tail(self.log)
+        self.assertEqual(tail.read_lines(), [])
+        self.append("one\ntw")
+        self.assertEqual(tail.read_lines(), ["one\n"])
+        self.append("o\nthr")
+        self.assertEqual(tail.read_lines(), ["two\n"])
+        # rotated: the end of the old file comes before the new one
+        self.append("ee")
+        os.rename(self.log, self.log + ".1")
+        self.assertEqual(tail.read_lines(), ["three\n"])
+        self.append("four\n")
+        self.assertEqual(tail.read_lines(), ["four\n"])
+        # truncated in place
+        with open(self.log, "w") as log:
+            log.write("5\n")
+        self.assertEqual(tail.read_lines(), ["5\n"])
+        # removed between reads, the log is not held open so it can be on any platform
+        os.remove(self.log)
+        self.assertEqual(tail.read_lines(), [])
+        self.append("6\n")
+        self.assertEqual(tail.read_lines(), ["6\n"])
+        tail.close()
+
+    def test_follow_gc(self):
+        """each report includes the pauses appended since the last one"""
+        inspector = GCInspector(files=[self.log])
+        reports = []
+
+        def report():
+            reports.append(steal_output(inspector.print_report))
+            self.append(PAUSE % (len(reports), 200 * len(reports)))
+
+        steal_output(inspector.follow, report, interval=0, ticks=3)
+        self.assertIn("No pauses found", reports[0])
+        self.assertIn("[200]", reports[1])
+        self.assertIn("[400, 200]", reports[2])
@@ -16,7 +16,17 @@
 
 import unittest
 import os
-from pysper.parser.rules import capture, default, rule
+import pickle
+from pysper.parser.rules import (
+    capture,
+    default,
+    rule,
+    prefilter,
+    source_filter,
+    Event,
+)
+from pysper.parser.cases import gc_rules, status_rules
+from pysper.parser.captures import system_capture_rule
 from pysper import parser
 from tests import get_current_dir
 
@@ -42,3 +52,111 @@ class TestParser(unittest.TestCase):
         self.assertEqual(rows[0]["level"], line1)
         line2 = "ERROR"
         self.assertEqual(rows[1]["level"], line2)
+
+    def test_prefilter(self):
+        """validates the first characters and required literal of a regex"""
+        chars, literal = prefilter(capture(r" *(?P<level>[A-Z]*) \[x").regexes[0])
+        self.assertEqual(len(chars), 27)
+        self.assertNotIn("[", chars)
+        self.assertEqual(literal, " [x")
+        chars, literal = prefilter(capture(r"(?P<header>.*) Name +Active").regexes[0])
+        self.assertIsNone(chars)
+        self.assertEqual(literal, "Active")
+        chars, literal = prefilter(capture(r"(?i)heap").regexes[0])
+        self.assertIsNone(chars)
+        self.assertEqual(literal, "")
+        chars, literal = prefilter(capture(r"(a|b)?").regexes[0])
+        self.assertIsNone(chars)
+
+    def test_capture_index_keeps_regex_order(self):
+        """the first regex in order still wins when several can match"""
+        cap = capture(r"(?P<first>a.*)", r"(?P<any>.*)b", r"(?P<second>ab)")
+        self.assertEqual(cap("ab"), {"first": "ab"})
+        self.assertEqual(cap("cb"), {"any": "c"})
+        self.assertIsNone(cap("c"))
+        self.assertEqual(
+            system_capture_rule("\tat org.apache.cassandra.Foo(Foo.java:1)"), None
+        )
+
+    def test_source_filter(self):
+        """log lines from other java sources are skipped, other lines are kept"""
+        keep = source_filter(gc_rules, status_rules)
+        self.assertEqual(keep.sources, {"GCInspector", "StatusLogger"})
+        self.assertTrue(
+            keep(
+                "INFO  [Service Thread] 2020-01-10 16:00:00,000  GCInspector.java:258 - x"
+            )
+        )
+        self.assertTrue(
+            keep(
+                "INFO  [ScheduledTasks:1] 2020-01-10 16:00:00,000 StatusLogger.java (line 1) x"
+            )
+        )
+        self.assertFalse(
+            keep("INFO  [main] 2020-01-10 16:00:00,000  CassandraDaemon.java:1 - x")
+        )
+        self.assertFalse(keep("\tat org.apache.cassandra.Foo(Foo.java:1)"))
+        self.assertTrue(keep("ReadStage                         0         0        1"))
+        log = os.path.join(get_current_dir(__file__), "testdata", "diag", "DSE_CLUSTER")
+        log = os.path.join(
+            log, "nodes", "10.101.33.205", "logs", "cassandra", "system.log"
+        )
+        with open(log) as lines:
+            everything = [
+                e for e in parser.read_system_log(lines) if e["event_type"] == "pause"
+            ]
+        with open(log) as lines:
+            filtered = [
+                e
+                for e in parser.read_system_log(filter(keep, lines))
+                if e["event_type"] == "pause"
+            ]
+        self.assertTrue(filtered)
+        self.assertEqual(filtered, everything)
+
+    def test_combined_capture(self):
+        """the combined mode returns the same fields as trying each regex"""
+        patterns = [r.pattern for r in system_capture_rule.regexes]
+        combined = capture(*patterns, combined=True)
+        lines = [
+            "INFO  [main] 2019-06-21 02:59:14,304  DatabaseDescriptor.java:418 - msg",
+            "ReadStage                         0         0        4248543         0      0",
+            "Pool Name                    Active   Pending      Completed   Blocked  All Time Blocked",
+            "KeyCache                  100 200 all",
+            "\tat org.apache.cassandra.Foo(Foo.java:1)",
+            "",
+        ]
+        for line in lines:
+            self.assertEqual(combined(line), system_capture_rule(line))
+        fields = combined(lines[0])
+        self.assertEqual(list(fields), list(system_capture_rule(lines[0])))
+        self.assertEqual(fields["source_line"], "418")
+
+    def test_event(self):
+        """a compact event reads like the dict of its fields, a field set to None is
+        not missing and the fields of the message are kept apart"""
+        line = "INFO  [CompactionExecutor:12] 2020-01-10 16:00:00,000  GCInspector.java:313 - G1 Young Generation GC in 237ms.  G1 Eden Space: 1 -> 0;"
+        fields = parser.systemlog.capture_line(line)
+        (event,) = parser.read_system_log([line], compact=True)
+        self.assertIsInstance(event, Event)
+        self.assertEqual(event, fields)
+        self.assertEqual(event["thread_name"], "CompactionExecutor")
+        self.assertEqual(event.get("duration"), 237)
+        self.assertEqual(event.extra["gc_type"], "G1 Young")
+        self.assertIsNone(event["oldgen_before"])
+        self.assertIn("oldgen_before", event)
+        self.assertNotIn("pool_name", event)
+        self.assertEqual(event.get("pool_name", "none"), "none")
+        with self.assertRaises(KeyError):
+            event["pool_name"]
+        other = Event.compact(parser.systemlog.capture_line(line.replace("12]", "13]")))
+        self.assertIs(other["thread_name"], event["thread_name"])
+        self.assertEqual(event, dict(event))
+        self.assertEqual(pickle.loads(pickle.dumps(event)), event)
+        row = Event.compact(
+            parser.systemlog.capture_line("ReadStage   0   1   4248543   0   0")
+        )
+        self.assertNotIn("date", row)
+        row["date"] = event["date"]
+        self.assertEqual(pickle.loads(pickle.dumps(row)), row)
+        self.assertEqual(row["pending"], "1")
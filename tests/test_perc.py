@@ -0,0 +1,101 @@
+# Copyright 2020 DataStax, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""validate percentile sketches against sorted stats"""
+
+import random
+from array import array
+import unittest
+from pysper import perc
+
+PERCENTILES = (0, 1, 25, 50, 75, 90, 99, 99.9)
+
+
+class TestSketch(unittest.TestCase):
+    """test the sketch module"""
+
+    def test_exact_matches_stats(self):
+        """small inputs give the same answers as sorting them"""
+        rand = random.Random(1)
+        data = [rand.randint(-50, 500) for _ in range(10000)]
+        sketch = perc.Sketch()
+        sketch.extend(data)
+        stats = perc.Stats(data)
+        self.assertEqual(len(sketch), len(data))
+        self.assertEqual(sketch.max(), stats.max())
+        self.assertEqual(sketch.min(), stats.min())
+        for p in PERCENTILES:
+            self.assertEqual(sketch.percentile(p), stats.percentile(p))
+
+    def test_bucket_error_bound(self):
+        """past the exact limit every percentile is within the relative accuracy"""
+        rand = random.Random(2)
+        data = [rand.lognormvariate(4, 2) for _ in range(50000)] + [0.0, -3.5]
+        sketch = perc.Sketch(relative_accuracy=0.01, exact_limit=100)
+        sketch.extend(data)
+        self.assertIsNone(sketch.exact)
+        self.assertLess(len(sketch.positive), 2000)
+        stats = perc.Stats(data)
+        self.assertEqual(sketch.max(), stats.max())
+        self.assertEqual(sketch.min(), stats.min())
+        for p in PERCENTILES:
+            expected = stats.percentile(p)
+            self.assertLessEqual(
+                abs(sketch.percentile(p) - expected), abs(expected) * 0.01 + 1e-9
+            )
+
+    def test_merge_and_weights(self):
+        """merged weighted sketches match sorting every value"""
+        exact = perc.Sketch(exact_limit=50)
+        bucketed = perc.Sketch(exact_limit=50)
+        expanded = []
+        for i in range(1, 200):
+            if i % 2:
+                exact.add(i % 20 + 1, count=3)
+                expanded += [i % 20 + 1] * 3
+            else:
+                bucketed.add(i, count=3)
+                expanded += [i] * 3
+        self.assertIsNotNone(exact.exact)
+        self.assertIsNone(bucketed.exact)
+        merged = perc.Sketch(exact_limit=50)
+        merged.merge(perc.Sketch())
+        merged.merge(exact)
+        self.assertEqual(
+            merged.percentile(50), perc.Stats(expanded[::6]).percentile(50)
+        )
+        merged.merge(bucketed)
+        stats = perc.Stats(expanded)
+        self.assertEqual(len(merged), len(expanded))
+        self.assertEqual(merged.max(), stats.max())
+        self.assertEqual(merged.min(), stats.min())
+        for p in PERCENTILES:
+            expected = stats.percentile(p)
+            self.assertLessEqual(abs(merged.percentile(p) - expected), expected * 0.01)
+        coarse = perc.Sketch(relative_accuracy=0.05)
+        coarse.add(1)
+        with self.assertRaises(ValueError):
+            merged.merge(coarse)
+
+    def test_typed_arrays_are_counted(self):
+        """typed arrays are counted into a sketch that answers like sorting them"""
+        rand = random.Random(3)
+        data = array("q", (rand.randint(0, 300) for _ in range(5000)))
+        counted = perc.stats(data)
+        self.assertIsInstance(counted, perc.Sketch)
+        stats = perc.Stats(data)
+        self.assertEqual(counted.max(), stats.max())
+        self.assertEqual(counted.min(), stats.min())
+        for p in PERCENTILES:
+            self.assertEqual(counted.percentile(p), stats.percentile(p))
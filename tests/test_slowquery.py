@@ -38,6 +38,7 @@ class TestSperfDefault(unittest.TestCase):
         args.interval = 3600
         args.start = None
         args.end = None
+        args.checkpoint = None
 
         def run():
             slowquery.run(args)
@@ -62,11 +63,9 @@ slow query breakdown
 
 Top 3 slow queries:
 ------------------------------
-1688ms: SELECT * FROM my_solr.my_table WHERE id = 00000000-0041-d584-0000-0000004956fd LIMIT 5000
-
-1535ms: SELECT * FROM my_solr.my_table WHERE id = 00000000-0047-87cc-0000-0000004e94af LIMIT 5000
-
-1522ms: SELECT * FROM my_solr.my_table WHERE id = 00000000-0008-b249-0000-00000044c1f3 LIMIT 5000""",
+1688ms: SELECT * FROM my_solr.my_table WHERE id = ? LIMIT ?
+75 times, avg 871ms, 48 cross-node, 0 timeouts, nodes: 10.101.33.205, 10.101.35.102
+slowest: SELECT * FROM my_solr.my_table WHERE id = 00000000-0041-d584-0000-0000004956fd LIMIT 5000""",
         )
 
     def test_sperf_68(self):
@@ -79,6 +78,7 @@ Top 3 slow queries:
         args.interval = 3600
         args.start = None
         args.end = None
+        args.checkpoint = None
 
         def run():
             slowquery.run(args)
@@ -103,9 +103,15 @@ slow query breakdown
 
 Top 3 slow queries:
 ------------------------------
-10058ms: SELECT * FROM keyspace1.standard1 WHERE key= 1
+10058ms: SELECT * FROM keyspace1.standard1 WHERE key= ?
+1 times, avg 10058ms, 0 cross-node, 1 timeouts, nodes: 172.17.0.2
+slowest: SELECT * FROM keyspace1.standard1 WHERE key= 1
 
-10006ms: SELECT * FROM keyspace1.standard1 WHERE C3 = 30783739393164656164636535346463653436633764343738393962313463616366396262623565643135366538613864386630396562336233343235623662373464386563 AND  LIMIT 1
+10006ms: SELECT * FROM keyspace1.standard1 WHERE C3 = ? AND LIMIT ?
+1 times, avg 10006ms, 0 cross-node, 1 timeouts, nodes: 172.17.0.2
+slowest: SELECT * FROM keyspace1.standard1 WHERE C3 = 30783739393164656164636535346463653436633764343738393962313463616366396262623565643135366538613864386630396562336233343235623662373464386563 AND  LIMIT 1
 
-10006ms: SELECT * FROM keyspace1.standard1 WHERE C2 = 307836313933373336353935666436333031643163 AND  LIMIT 1""",
+10006ms: SELECT * FROM keyspace1.standard1 WHERE C2 = ? AND LIMIT ?
+4 times, avg 10003ms, 0 cross-node, 4 timeouts, nodes: 172.17.0.2
+slowest: SELECT * FROM keyspace1.standard1 WHERE C2 = 307836313933373336353935666436333031643163 AND  LIMIT 1""",
         )
@@ -36,6 +36,9 @@ class TestSperf(unittest.TestCase):
         args.end = None
         args.debug_log_prefix = "debug.log"
         args.reporter = "summary"
+        args.timeline = None
+        args.follow = None
+        args.checkpoint = None
         args.system_log_prefix = "system.log"
         self.maxDiff = None
 
@@ -95,6 +98,9 @@ WARNING more than one version present assuming no version with recommendations""
         args.end = None
         args.stages = "all"
         args.reporter = "summary"
+        args.timeline = None
+        args.follow = None
+        args.checkpoint = None
         args.debug_log_prefix = "debug.log"
         args.system_log_prefix = "system.log"
         self.maxDiff = None
@@ -65,6 +65,33 @@ class TestUtil(unittest.TestCase):
             1,
         )
 
+    def test_buckets(self):
+        """times are bucketed in any order and reduced per bucket"""
+        start = datetime.datetime(2019, 5, 11)
+        minute = datetime.timedelta(minutes=1)
+        times = [start + 5 * minute, start + 200 * minute, start, start + 61 * minute]
+        for reducer, expected in (
+            ("count", [2, 1, 0, 1]),
+            ("sum", [20, 5, 0, 20]),
+            ("max", [10, 5, None, 20]),
+            ("list", [[10, 10], [5], [], [20]]),
+        ):
+            buckets = util.Buckets(start, start + 180 * minute, reducer=reducer)
+            for time, value in zip(times, (10, 20, 10, 5)):
+                buckets.add(time, value)
+            self.assertEqual(
+                buckets.items(),
+                [(start + n * 60 * minute, v) for n, v in enumerate(expected)],
+            )
+        buckets = util.Buckets(start, seconds=1, reducer="sketch")
+        buckets.add(start + 365 * 86400 * minute, 7, weight=3)
+        buckets.add(start - minute, 2)
+        (first, low), (last, high) = buckets.items(sparse=True)
+        self.assertEqual((first, low.max(), len(low)), (start, 2, 1))
+        self.assertEqual(
+            (last, high.max(), len(high)), (start + 365 * 86400 * minute, 7, 3)
+        )
+
     def test_get_percentiles(self):
         """happy path"""
         perc = util.get_percentiles(